@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Author, Publisher, Book, Student, Circulation, BookRequest, Penalty
+from .models import Author, Publisher, Book, Student, Circulation, BookRequest, Penalty, ScheduledJob, OutboundEmail, ReportJob, BookNeighbor
 
 admin.site.register(Author)
 admin.site.register(Publisher)
@@ -7,4 +7,8 @@ admin.site.register(Book)
 admin.site.register(Student)
 admin.site.register(Circulation)
 admin.site.register(BookRequest)
-admin.site.register(Penalty)
\ No newline at end of file
+admin.site.register(Penalty)
+admin.site.register(ScheduledJob)
+admin.site.register(OutboundEmail)
+admin.site.register(ReportJob)
+admin.site.register(BookNeighbor)
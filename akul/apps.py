@@ -1,110 +1,7 @@
 from django.apps import AppConfig
-import threading
-import time
-import os
-import datetime
 
 class AkulConfig(AppConfig):
     name = 'akul'
 
     def ready(self):
-        if os.environ.get('RUN_MAIN', None) != 'true':
-            return
-            
-        thread = threading.Thread(target=self.run_daily_overdue_checks, daemon=True)
-        thread.start()
-
-    def run_daily_overdue_checks(self):
-        from akul.models import Circulation, Penalty, LibrarySettings, Notification, EmailLog, Student
-        from django.core.mail import send_mail
-
-        while True:
-            try:
-                today = datetime.date.today()
-                tomorrow = today + datetime.timedelta(days=1)
-                lib_settings = LibrarySettings.objects.first() or LibrarySettings.objects.create()
-
-                approaching_due = Circulation.objects.filter(status='issued', due_date=tomorrow)
-                for circ in approaching_due:
-                    subject = "Library Reminder: Book Due Tomorrow"
-                    message = f"Dear {circ.student.name},\n\nThis is a friendly reminder that the book '{circ.book.title}' is due tomorrow ({circ.due_date}).\nPlease return it to avoid late fees.\n\nRegards,\n{lib_settings.library_name}"
-                    
-                    if getattr(lib_settings, 'enable_emails', True):
-                        send_mail(subject, message, None, [circ.student.email], fail_silently=True)
-                        try:
-                            EmailLog.objects.create(recipient=circ.student.email, subject=subject, message=message)
-                        except Exception:
-                            pass
-                        print(f"[BACKGROUND TASK] Reminder sent to {circ.student.email}")
-                    
-                    notif_msg = f"Reminder: '{circ.book.title}' issued to {circ.student.name} is due tomorrow."
-                    if not Notification.objects.filter(message=notif_msg, created_at__date=today).exists():
-                        Notification.objects.create(message=notif_msg)
-
-                overdue_circulations = Circulation.objects.filter(status='issued', due_date__lt=today)
-                for circ in overdue_circulations:
-                    days_overdue = (today - circ.due_date).days
-                    daily_fine = float(lib_settings.penalty_per_day)
-                    total_fine = days_overdue * daily_fine
-                    
-                    penalty, created = Penalty.objects.update_or_create(
-                        student=circ.student, book=circ.book, due_date=circ.due_date, status='unpaid',
-                        defaults={'days_overdue': days_overdue, 'amount': total_fine, 'reason': f"Overdue: {circ.book.title}"}
-                    )
-
-                    if created or days_overdue % 3 == 0:
-                        pay_link = f"http://127.0.0.1:8000/pay-penalty/{penalty.id}/"
-                        subject = f"Overdue Notice & Penalty Applied: {circ.book.title}"
-                        message = (
-                            f"Dear {circ.student.name},\n\n"
-                            f"Your borrowed book '{circ.book.title}' is now {days_overdue} days overdue.\n"
-                            f"A penalty of ₹{total_fine} has been applied.\n\n"
-                            f"Please return the book.\n\n"
-                            f"You can pay your fine online instantly here:\n{pay_link}\n\n"
-                            f"Regards,\n{lib_settings.library_name}"
-                        )
-                        
-                        if getattr(lib_settings, 'enable_emails', True):
-                            send_mail(subject, message, None, [circ.student.email], fail_silently=True)
-                            try:
-                                EmailLog.objects.create(recipient=circ.student.email, subject=subject, message=message)
-                            except Exception:
-                                pass
-                            print(f"[BACKGROUND TASK] Overdue notice sent to {circ.student.email}")
-                        
-                        notif_msg = f"Overdue: '{circ.book.title}' issued to {circ.student.name} is {days_overdue} days overdue."
-                        if not Notification.objects.filter(message=notif_msg, created_at__date=today).exists():
-                            Notification.objects.create(message=notif_msg)
-                            
-                # --- AI Recommendation Emails (Monthly) ---
-                if today.day == 1:
-                    rec_email_sent = EmailLog.objects.filter(
-                        subject="Your Monthly Book Recommendations",
-                        sent_at__date=today
-                    ).exists()
-
-                    if getattr(lib_settings, 'enable_emails', True) and not rec_email_sent:
-                        from akul.ml_utils import get_recommendations_for_student
-                        
-                        for student in Student.objects.all():
-                            recommendations = get_recommendations_for_student(student.id, limit=3)
-                            if recommendations.exists():
-                                rec_list = "\n".join([f"- {b.title} by {b.author.name if b.author else 'Unknown'}" for b in recommendations])
-                                subject = "Your Monthly Book Recommendations"
-                                message = f"Dear {student.name},\n\nBased on your reading history and our library's activity, we think you'll love these books:\n\n{rec_list}\n\nVisit {lib_settings.library_name} to check them out!\n\nHappy Reading,\nThe Library Team"
-                                
-                                send_mail(subject, message, None, [student.email], fail_silently=True)
-                                try:
-                                    EmailLog.objects.create(recipient=student.email, subject=subject, message=message)
-                                except Exception:
-                                    pass
-                        print(f"[BACKGROUND TASK] Monthly AI recommendation emails sent.")
-
-                count = Notification.objects.count()
-                if count > 50:
-                    last_ids = Notification.objects.order_by('-created_at').values_list('id', flat=True)[:50]
-                    Notification.objects.exclude(id__in=list(last_ids)).delete()
-            except Exception as e:
-                print(f"[BACKGROUND TASK] Error: {e}")
-
-            time.sleep(86400)
+        from . import signals  # noqa: F401
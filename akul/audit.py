@@ -0,0 +1,98 @@
+import atexit
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import DatabaseError, connection, transaction
+from django.utils import timezone
+
+from .models import AuditLog
+
+# A process writes its buffered entries once this many are waiting or the
+# oldest has waited FLUSH_INTERVAL seconds, and always at request end.
+BUFFER_SIZE = getattr(settings, 'AUDIT_BUFFER_SIZE', 100)
+FLUSH_INTERVAL = getattr(settings, 'AUDIT_FLUSH_INTERVAL', 5.0)
+# Entries kept for retry while the database is unreachable; the oldest are dropped beyond this.
+MAX_PENDING = BUFFER_SIZE * 50
+
+logger = logging.getLogger('akul.audit')
+
+# Verbs the views log with; the audit tab offers them as filters.
+VERBS = ('login', 'logout', 'create', 'update', 'delete', 'issue', 'return', 'pay', 'email', 'import', 'export')
+
+_buffer = []
+_oldest = None
+_lock = threading.Lock()
+
+
+def actor(request):
+    if request is not None and hasattr(request, 'user') and request.user.is_authenticated:
+        return request.user.username
+    return 'System'
+
+
+def record(username, action, verb='', obj=None, object_id=None):
+    """
+    Queues one audit entry. ``verb`` and ``obj`` fill the indexed columns the
+    audit tab filters on; pass ``object_id`` for an object already deleted.
+    With settings.AUDIT_STRICT the entry is written before returning.
+
+    Buffered entries are written outside the caller's transaction, so an
+    entry recorded in a transaction that later rolls back is still kept.
+    Use AUDIT_STRICT where the log must follow the transaction.
+    """
+    entry = AuditLog(
+        username=username[:150], action=action[:500], verb=verb, timestamp=timezone.now(),
+        object_type=obj._meta.model_name if obj is not None else '',
+        object_id=object_id if object_id is not None else getattr(obj, 'pk', None),
+    )
+    if getattr(settings, 'AUDIT_STRICT', False):
+        entry.save()
+        return
+
+    global _oldest
+    with _lock:
+        if not _buffer:
+            _oldest = time.monotonic()
+        _buffer.append(entry)
+        due = len(_buffer) >= BUFFER_SIZE or time.monotonic() - _oldest >= FLUSH_INTERVAL
+    if due:
+        # Inside a transaction the insert waits for the commit, so a rollback
+        # cannot take the buffered entries (other requests' included) with it.
+        # After a rollback they stay buffered for the next flush.
+        if connection.in_atomic_block:
+            transaction.on_commit(flush)
+        else:
+            flush()
+
+
+def pending():
+    return len(_buffer)
+
+
+def flush(**kwargs):
+    """
+    Writes every buffered entry with one bulk INSERT and returns how many.
+    If the write fails the entries go back into the buffer for the next
+    flush and the error is logged rather than raised.
+    """
+    global _buffer, _oldest
+    with _lock:
+        entries, _buffer = _buffer, []
+    if not entries:
+        return 0
+    try:
+        # A savepoint keeps a failed insert from breaking the caller's transaction.
+        with transaction.atomic():
+            AuditLog.objects.bulk_create(entries, batch_size=BUFFER_SIZE)
+    except DatabaseError:
+        logger.exception("Could not write %d audit entries; keeping them for the next flush", len(entries))
+        with _lock:
+            _buffer = (entries + _buffer)[-MAX_PENDING:]
+            _oldest = time.monotonic()
+        return 0
+    return len(entries)
+
+
+atexit.register(flush)
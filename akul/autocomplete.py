@@ -0,0 +1,167 @@
+import threading
+from bisect import bisect_left, insort
+
+from . import versions
+from .models import Book, Student
+from .search import tokenize
+
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 50
+
+
+class PrefixIndex:
+    """
+    Sorted array of (key, id) pairs. A prefix lookup is one bisect plus a
+    walk over the matching run, so it stays fast as the tables grow.
+    """
+
+    def __init__(self, documents=()):
+        self.entries = []
+        self.documents = {}
+        for object_id, label, texts in documents:
+            self.entries.extend((key, object_id) for key in self._keys(object_id, label, texts))
+        self.entries.sort()
+
+    def _keys(self, object_id, label, texts):
+        keys = set()
+        for text in texts:
+            tokens = tokenize(text)
+            if tokens:
+                # The whole value matches multi-word queries, each token matches a single word.
+                keys.add(' '.join(tokens))
+                keys.update(tokens)
+        self.documents[object_id] = (label, tuple(texts), sorted(keys))
+        return keys
+
+    def discard(self, object_id):
+        document = self.documents.pop(object_id, None)
+        if document is None:
+            return
+        for key in document[2]:
+            position = bisect_left(self.entries, (key, object_id))
+            if position < len(self.entries) and self.entries[position] == (key, object_id):
+                del self.entries[position]
+
+    def put(self, object_id, label, texts):
+        document = self.documents.get(object_id)
+        if document and document[:2] == (label, tuple(texts)):
+            return
+        self.discard(object_id)
+        for key in self._keys(object_id, label, texts):
+            insort(self.entries, (key, object_id))
+
+    def search(self, query, limit=DEFAULT_LIMIT):
+        query = ' '.join(tokenize(query))
+        if not query:
+            return []
+        results = []
+        seen = set()
+        for position in range(bisect_left(self.entries, (query,)), len(self.entries)):
+            key, object_id = self.entries[position]
+            if not key.startswith(query):
+                break
+            if object_id in seen:
+                continue
+            seen.add(object_id)
+            results.append({'id': object_id, 'label': self.documents[object_id][0]})
+            if len(results) >= limit:
+                break
+        return results
+
+
+def student_document(student_id, name, email):
+    return student_id, f"{name} ({email})", (name, email)
+
+
+def book_document(book_id, title, isbn):
+    return book_id, f"{title} ({isbn})" if isbn else title, (title, isbn)
+
+
+# kind -> (rows, document builder, names of the document texts returned with each result)
+SOURCES = {
+    'students': (
+        lambda: Student.objects.values_list('id', 'name', 'email'),
+        student_document,
+        ('name', 'email'),
+    ),
+    'books': (
+        lambda: Book.objects.values_list('id', 'title', 'isbn'),
+        book_document,
+        ('title', 'isbn'),
+    ),
+}
+
+# kind -> (shared version it was built from, PrefixIndex)
+_indexes = {}
+_lock = threading.Lock()
+
+
+def version_name(kind):
+    return f'autocomplete:{kind}'
+
+
+def get_index(kind):
+    # Saves in this process update the index in place; the shared version
+    # catches writes made by other worker processes.
+    version = versions.current(version_name(kind))
+    with _lock:
+        built = _indexes.get(kind)
+        if built is None or built[0] != version:
+            rows, document, _ = SOURCES[kind]
+            built = _indexes[kind] = (version, PrefixIndex(document(*row) for row in rows().iterator()))
+        return built[1]
+
+
+def suggest(kind, query, limit=DEFAULT_LIMIT, available_only=False):
+    index = get_index(kind)
+    fields = SOURCES[kind][2]
+    with _lock:
+        # Availability changes on every issue/return, so it is checked against the
+        # database for a bounded candidate set rather than kept in the index.
+        results = index.search(query, limit * 5 if available_only else limit)
+        for result in results:
+            result.update(zip(fields, index.documents[result['id']][1]))
+    if available_only:
+        available = set(Book.objects.filter(id__in=[r['id'] for r in results], available_quantity__gt=0)
+                        .values_list('id', flat=True))
+        results = [r for r in results if r['id'] in available][:limit]
+    return results
+
+
+def invalidate(kind=None):
+    # Used after bulk writes, which bypass the signal handlers below.
+    kinds = list(SOURCES) if kind is None else [kind]
+    versions.bump(*map(version_name, kinds))
+    with _lock:
+        for name in kinds:
+            _indexes.pop(name, None)
+
+
+def _update(kind, object_id, document=None):
+    versions.bump(version_name(kind))
+    with _lock:
+        built = _indexes.get(kind)
+        if built is None:
+            return
+        if document is None:
+            built[1].discard(object_id)
+        else:
+            built[1].put(*document)
+
+
+def student_saved(sender, instance, **kwargs):
+    if versions.changed(instance, 'name', 'email'):
+        _update('students', instance.id, student_document(instance.id, instance.name, instance.email))
+
+
+def student_deleted(sender, instance, **kwargs):
+    _update('students', instance.id)
+
+
+def book_saved(sender, instance, **kwargs):
+    if versions.changed(instance, 'title', 'isbn'):
+        _update('books', instance.id, book_document(instance.id, instance.title, instance.isbn))
+
+
+def book_deleted(sender, instance, **kwargs):
+    _update('books', instance.id)
@@ -0,0 +1,131 @@
+from datetime import date, datetime, timedelta
+
+from django.db.models import DateField, Sum
+from django.db.models.functions import TruncDay, TruncMonth, TruncWeek
+from django.utils.dateparse import parse_date
+
+from .models import DailyLibraryStats
+
+TRUNC_FUNCTIONS = {
+    'day': TruncDay,
+    'week': TruncWeek,
+    'month': TruncMonth,
+}
+
+# A chart never draws more points than this; longer custom ranges fall back to a
+# coarser granularity, and ranges too long even for months are refused.
+MAX_BUCKETS = 400
+
+
+class ChartRangeError(ValueError):
+    pass
+
+
+def month_start(d, months_back=0):
+    month = d.month - months_back
+    year = d.year
+    while month <= 0:
+        month += 12
+        year -= 1
+    return date(year, month, 1)
+
+
+def bucket_start(d, granularity):
+    if granularity == 'month':
+        return d.replace(day=1)
+    if granularity == 'week':
+        return d - timedelta(days=d.weekday())
+    return d
+
+
+def bucket_count(start, end, granularity):
+    if granularity == 'month':
+        return (end.year - start.year) * 12 + end.month - start.month + 1
+    if granularity == 'week':
+        return (end - bucket_start(start, 'week')).days // 7 + 1
+    return (end - start).days + 1
+
+
+def bucket_dates(start, end, granularity):
+    buckets = []
+    current = bucket_start(start, granularity)
+    while current <= end:
+        buckets.append(current)
+        if granularity == 'month':
+            current = date(current.year + (current.month == 12), current.month % 12 + 1, 1)
+        elif granularity == 'week':
+            current += timedelta(days=7)
+        else:
+            current += timedelta(days=1)
+    return buckets
+
+
+def to_date(value):
+    if isinstance(value, date):
+        return value
+    try:
+        return parse_date(value or '')
+    except ValueError:
+        return None
+
+
+def resolve_range(chart_range, start=None, end=None, granularity=None):
+    today = date.today()
+    if chart_range == 'last_week':
+        return today - timedelta(days=6), today, 'day'
+    if chart_range == 'last_year':
+        return month_start(today, 11), today, 'month'
+    if chart_range == 'custom':
+        start, end = to_date(start), to_date(end)
+        if start and end and start <= end:
+            if granularity not in TRUNC_FUNCTIONS:
+                span = (end - start).days
+                granularity = 'day' if span <= 31 else 'week' if span <= 182 else 'month'
+            for candidate in list(TRUNC_FUNCTIONS)[list(TRUNC_FUNCTIONS).index(granularity):]:
+                if bucket_count(start, end, candidate) <= MAX_BUCKETS:
+                    return start, end, candidate
+            raise ChartRangeError(f"Charts cover at most {MAX_BUCKETS} months.")
+    return month_start(today, 5), today, 'month'
+
+
+def grouped_series(start, end, granularity):
+    # One GROUP BY over the daily rollup; empty buckets are filled in by the caller.
+    trunc = TRUNC_FUNCTIONS[granularity]('date', output_field=DateField())
+    rows = (DailyLibraryStats.objects.filter(date__gte=start, date__lte=end)
+            .annotate(bucket=trunc).values('bucket')
+            .annotate(issues=Sum('issues'), new_students=Sum('new_students'), revenue=Sum('penalty_amount'))
+            .order_by('bucket'))
+    series = {}
+    for row in rows:
+        bucket = row.pop('bucket')
+        if isinstance(bucket, datetime):
+            bucket = bucket.date()
+        series[bucket] = row
+    return series
+
+
+def format_label(bucket, granularity, chart_range, spans_years):
+    if granularity == 'day':
+        return bucket.strftime('%a') if chart_range == 'last_week' else bucket.strftime('%b %d')
+    if granularity == 'week':
+        return bucket.strftime('Week of %b %d')
+    return bucket.strftime('%b %Y') if spans_years else bucket.strftime('%b')
+
+
+def build_chart_data(chart_range='6_months', start=None, end=None, granularity=None):
+    start, end, granularity = resolve_range(chart_range, start, end, granularity)
+    series = grouped_series(start, end, granularity)
+    empty = {'issues': 0, 'new_students': 0, 'revenue': 0}
+
+    buckets = bucket_dates(start, end, granularity)
+    spans_years = start.year != end.year
+    return {
+        'chart_range': chart_range,
+        'granularity': granularity,
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'chart_labels': [format_label(b, granularity, chart_range, spans_years) for b in buckets],
+        'issue_counts': [series.get(b, empty)['issues'] for b in buckets],
+        'student_counts': [series.get(b, empty)['new_students'] for b in buckets],
+        'revenue_data': [float(series.get(b, empty)['revenue'] or 0) for b in buckets],
+    }
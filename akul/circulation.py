@@ -0,0 +1,99 @@
+from datetime import date, timedelta
+
+from django.db import transaction
+from django.db.models import F
+
+from . import counters, recommendation_cache, stats
+from .library_settings import get_library_settings
+from .models import Book, Circulation, Penalty, Student
+from .penalties import penalty_amount
+
+
+class CirculationError(ValueError):
+    pass
+
+
+def _copies_changed(book_id, delta, available):
+    # Stock moves through queryset updates, which skip the Book signals, so the
+    # rollup, the counters and the recommendation cache are told here.
+    stats.record(available_copies=delta)
+    counters.adjust(available_copies=delta)
+    if available == 0 or (delta > 0 and available == delta):
+        recommendation_cache.invalidate_all()
+    else:
+        recommendation_cache.invalidate_book(book_id)
+
+
+def issue_book(student_id, book_id, issue_date=None, lib_settings=None):
+    """
+    Lends one copy of a book. The copy is taken with a conditional UPDATE so
+    two desks can never hand out the same last copy, and the student's loan
+    limit is checked under a row lock in the same transaction. Raises
+    CirculationError if the loan is not allowed.
+    """
+    lib_settings = lib_settings or get_library_settings()
+    issue_date = issue_date or date.today()
+    with transaction.atomic():
+        # Writing first also makes concurrent issues queue on SQLite's write lock.
+        taken = Book.objects.filter(id=book_id, available_quantity__gt=0).update(
+            available_quantity=F('available_quantity') - 1,
+        )
+        book = Book.objects.filter(id=book_id).only('id', 'title', 'available_quantity').first()
+        if book is None:
+            raise CirculationError("Book not found.")
+        if not taken:
+            raise CirculationError(f"No copies of '{book.title}' are available.")
+        # Recorded before the loan is created: the loan's own stats.record may
+        # seed today's row from a snapshot, which already includes this -1.
+        _copies_changed(book.id, -1, book.available_quantity)
+
+        student = Student.objects.select_for_update().filter(id=student_id).only('id', 'name').first()
+        if student is None:
+            raise CirculationError("Student not found.")
+        on_loan = Circulation.objects.filter(student_id=student.id, status='issued').count()
+        if on_loan >= lib_settings.max_books:
+            raise CirculationError(f"{student.name} already has {on_loan} books issued (limit {lib_settings.max_books}).")
+
+        circulation = Circulation.objects.create(
+            student=student, book=book, issue_date=issue_date,
+            due_date=issue_date + timedelta(days=lib_settings.loan_duration), status='issued',
+        )
+    return circulation
+
+
+def return_book(circulation_id, return_date=None, lib_settings=None):
+    """
+    Closes an open loan and puts the copy back on the shelf. Overdue returns
+    get their fine recorded on the loan and on the student's unpaid penalty.
+    Returns the closed Circulation; raises CirculationError if it is not open.
+    """
+    return_date = return_date or date.today()
+    with transaction.atomic():
+        circulation = (
+            Circulation.objects.select_for_update(of=('self',)).select_related('student', 'book')
+            .filter(id=circulation_id).first()
+        )
+        if circulation is None:
+            raise CirculationError("Loan not found.")
+        if circulation.status != 'issued':
+            raise CirculationError(f"'{circulation.book.title}' has already been returned.")
+
+        circulation.return_date = return_date
+        circulation.status = 'returned'
+        if return_date > circulation.due_date:
+            overdue_days = (return_date - circulation.due_date).days
+            circulation.fine_amount = penalty_amount(overdue_days, lib_settings or get_library_settings())
+            # The nightly penalty job may already have opened a penalty for this loan.
+            Penalty.objects.update_or_create(
+                student=circulation.student, book=circulation.book, due_date=circulation.due_date, status='unpaid',
+                defaults={'days_overdue': overdue_days, 'amount': circulation.fine_amount,
+                          'reason': f"Overdue: {circulation.book.title}"},
+            )
+        circulation.save(update_fields=['return_date', 'status', 'fine_amount'])
+        stats.record_return(circulation)
+
+        Book.objects.filter(id=circulation.book_id).update(available_quantity=F('available_quantity') + 1)
+        available = Book.objects.filter(id=circulation.book_id).values_list('available_quantity', flat=True).first()
+        circulation.book.available_quantity = available
+        _copies_changed(circulation.book_id, 1, available)
+    return circulation
@@ -0,0 +1,122 @@
+import math
+import threading
+from collections import defaultdict
+
+from . import versions
+from .models import Book
+from .search import tokenize
+
+# Relative weight of each field in a book's vector before normalisation.
+AUTHOR_WEIGHT = 2.0
+PUBLISHER_WEIGHT = 1.0
+TITLE_WEIGHT = 1.0
+# Candidates fetched per requested result before the availability check.
+CANDIDATE_FACTOR = 10
+
+VERSION_NAME = 'content'
+_index = None
+_index_version = None
+_index_lock = threading.Lock()
+
+
+def features(title, author_id, publisher_id):
+    """Weighted term counts of one book: its author, its publisher and its title tokens."""
+    terms = defaultdict(float)
+    if author_id:
+        terms[f'author:{author_id}'] += AUTHOR_WEIGHT
+    if publisher_id:
+        terms[f'publisher:{publisher_id}'] += PUBLISHER_WEIGHT
+    for token in tokenize(title):
+        terms[f'title:{token}'] += TITLE_WEIGHT
+    return terms
+
+
+class ContentIndex:
+    """
+    Unit-length TF-IDF vectors for every book plus an inverted list per
+    feature, so a profile is only compared with books sharing a feature.
+    """
+
+    def __init__(self, books=()):
+        self.documents = {}
+        raw = {}
+        document_frequency = defaultdict(int)
+        for book_id, title, author_id, publisher_id in books:
+            self.documents[book_id] = (title, author_id, publisher_id)
+            raw[book_id] = features(title, author_id, publisher_id)
+            for term in raw[book_id]:
+                document_frequency[term] += 1
+
+        total = len(raw)
+        self.vectors = {}
+        self.postings = defaultdict(dict)
+        for book_id, terms in raw.items():
+            vector = {term: weight * math.log((1 + total) / (1 + document_frequency[term])) for term, weight in terms.items()}
+            norm = math.sqrt(sum(value * value for value in vector.values()))
+            if not norm:
+                continue
+            vector = {term: value / norm for term, value in vector.items() if value}
+            self.vectors[book_id] = vector
+            for term, value in vector.items():
+                self.postings[term][book_id] = value
+
+    def profile(self, book_ids):
+        profile = defaultdict(float)
+        for book_id in book_ids:
+            for term, value in self.vectors.get(book_id, {}).items():
+                profile[term] += value
+        return profile
+
+    def rank(self, book_ids, exclude=(), available=None, limit=10):
+        """
+        Books most similar to the combined vector of ``book_ids``, best first
+        with ties broken by id. ``available`` optionally restricts the result.
+        """
+        scores = defaultdict(float)
+        for term, weight in self.profile(book_ids).items():
+            for other, value in self.postings[term].items():
+                scores[other] += weight * value
+        skip = set(book_ids) | set(exclude)
+        ranked = sorted(
+            (item for item in scores.items() if item[0] not in skip and (available is None or item[0] in available)),
+            key=lambda item: (-item[1], item[0]),
+        )
+        return [book_id for book_id, _ in ranked[:limit]]
+
+
+def get_index():
+    # The shared version makes every worker process rebuild after a catalog change.
+    global _index, _index_version
+    version = versions.current(VERSION_NAME)
+    with _index_lock:
+        if _index is None or _index_version != version:
+            books = Book.objects.values_list('id', 'title', 'author_id', 'publisher_id')
+            _index, _index_version = ContentIndex(books.iterator()), version
+        return _index
+
+
+def invalidate_index(**kwargs):
+    global _index
+    versions.bump(VERSION_NAME)
+    _index = None
+
+
+def book_saved(sender, instance, **kwargs):
+    # IDF weights depend on the whole catalog, so a changed book drops the index
+    # for a lazy rebuild. Stock edits leave the document unchanged.
+    if versions.changed(instance, 'title', 'author_id', 'publisher_id'):
+        invalidate_index()
+
+
+def similar_books(book_ids, limit=3, exclude=(), available=None):
+    """
+    Deterministic content-based recommendations for readers of ``book_ids``.
+    Without an ``available`` set, availability is checked in one query over a
+    bounded candidate list.
+    """
+    index = get_index()
+    if available is not None:
+        return index.rank(book_ids, exclude, available, limit)
+    candidates = index.rank(book_ids, exclude, limit=limit * CANDIDATE_FACTOR)
+    on_shelf = set(Book.objects.filter(id__in=candidates, available_quantity__gt=0).values_list('id', flat=True))
+    return [book_id for book_id in candidates if book_id in on_shelf][:limit]
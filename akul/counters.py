@@ -0,0 +1,128 @@
+from datetime import date
+
+from django.db import transaction
+from django.db.models import Case, Count, F, Q, Sum, Value, When
+
+from .models import Book, Circulation, SharedCounter, Student
+
+NAMES = ('total_books', 'total_copies', 'available_copies', 'total_students', 'issued_books', 'overdue_books')
+KEY_PREFIX = 'counters:'
+# Overdue counts change at midnight without any save, so the rows carry the day
+# (as an ordinal) they were computed for.
+DAY_KEY = KEY_PREFIX + 'day'
+
+
+def _key(name):
+    return KEY_PREFIX + name
+
+
+def compute():
+    """The counters straight from the database, in three queries."""
+    today = date.today()
+    books = Book.objects.aggregate(
+        total_books=Count('id'), total_copies=Sum('quantity'), available_copies=Sum('available_quantity'),
+    )
+    loans = Circulation.objects.aggregate(
+        issued_books=Count('id', filter=Q(status='issued')),
+        overdue_books=Count('id', filter=Q(status='issued', due_date__lt=today)),
+    )
+    values = {name: value or 0 for name, value in {**books, **loans}.items()}
+    values['total_students'] = Student.objects.count()
+    return values
+
+
+def reconcile():
+    """Overwrites the stored counters with fresh database values. Returns them."""
+    values = compute()
+    rows = {_key(name): value for name, value in values.items()}
+    rows[DAY_KEY] = date.today().toordinal()
+    SharedCounter.objects.bulk_create(
+        [SharedCounter(name=name, value=value) for name, value in rows.items()],
+        update_conflicts=True, unique_fields=['name'], update_fields=['value'],
+    )
+    return values
+
+
+def get_counters():
+    """
+    The dashboard summary counters. They are SharedCounter rows, so every
+    worker process reads the same values; in steady state this is one query.
+    Missing rows or a new day recompute them.
+    """
+    stored = dict(SharedCounter.objects.filter(name__in=[DAY_KEY, *map(_key, NAMES)]).values_list('name', 'value'))
+    if stored.get(DAY_KEY) != date.today().toordinal() or any(_key(name) not in stored for name in NAMES):
+        return reconcile()
+    return {name: stored[_key(name)] for name in NAMES}
+
+
+def invalidate():
+    SharedCounter.objects.filter(name__in=[DAY_KEY, *map(_key, NAMES)]).delete()
+
+
+def _increment(deltas):
+    # One UPDATE for every counter; missing rows are recomputed on the next read.
+    SharedCounter.objects.filter(name__in=[_key(name) for name in deltas]).update(
+        value=F('value') + Case(*[When(name=_key(name), then=Value(delta)) for name, delta in deltas.items()],
+                                default=Value(0)),
+    )
+
+
+def adjust(**deltas):
+    """
+    Applies ``deltas`` once the surrounding transaction commits, as a single
+    atomic UPDATE of the counter rows. Rolled back changes never reach them.
+    """
+    deltas = {name: delta for name, delta in deltas.items() if delta}
+    if deltas:
+        transaction.on_commit(lambda: _increment(deltas))
+
+
+def _book_state(quantity, available):
+    return {'total_books': 1, 'total_copies': int(quantity), 'available_copies': int(available)}
+
+
+def _loan_state(status, due_date):
+    issued = status == 'issued'
+    return {'issued_books': int(issued), 'overdue_books': int(issued and due_date < date.today())}
+
+
+def _apply_change(before, after):
+    adjust(**{name: after.get(name, 0) - before.get(name, 0) for name in {*before, *after}})
+
+
+def book_saved(sender, instance, created, **kwargs):
+    # _stats_available and _stats_quantity are read by the pre_save receiver in akul.signals.
+    if created:
+        before = {}
+    elif instance._stats_available is None:
+        return
+    else:
+        before = _book_state(instance._stats_quantity, instance._stats_available)
+    _apply_change(before, _book_state(instance.quantity, instance.available_quantity))
+
+
+def book_deleted(sender, instance, **kwargs):
+    _apply_change(_book_state(instance.quantity, instance.available_quantity), {})
+
+
+def student_saved(sender, instance, created, **kwargs):
+    if created:
+        adjust(total_students=1)
+
+
+def student_deleted(sender, instance, **kwargs):
+    adjust(total_students=-1)
+
+
+def circulation_saved(sender, instance, created, **kwargs):
+    if created:
+        before = {}
+    elif instance._counted_loan is None:
+        return
+    else:
+        before = _loan_state(*instance._counted_loan)
+    _apply_change(before, _loan_state(instance.status, instance.due_date))
+
+
+def circulation_deleted(sender, instance, **kwargs):
+    _apply_change(_loan_state(instance.status, instance.due_date), {})
@@ -0,0 +1,88 @@
+from datetime import datetime, timedelta
+
+from django.utils import timezone
+
+FIELD_RANGES = [
+    ('minute', 0, 59),
+    ('hour', 0, 23),
+    ('day', 1, 31),
+    ('month', 1, 12),
+    ('weekday', 0, 7),
+]
+
+
+class CronError(ValueError):
+    pass
+
+
+def parse_field(text, low, high, name):
+    values = set()
+    for part in text.split(','):
+        step = 1
+        if '/' in part:
+            part, step_text = part.split('/', 1)
+            if not step_text.isdigit() or int(step_text) == 0:
+                raise CronError(f"Invalid step '{step_text}' in {name} field.")
+            step = int(step_text)
+        if part == '*':
+            start, end = low, high
+        elif '-' in part:
+            start_text, end_text = part.split('-', 1)
+            if not (start_text.isdigit() and end_text.isdigit()):
+                raise CronError(f"Invalid range '{part}' in {name} field.")
+            start, end = int(start_text), int(end_text)
+        elif part.isdigit():
+            start = int(part)
+            end = high if step > 1 else start
+        else:
+            raise CronError(f"Invalid value '{part}' in {name} field.")
+        if start < low or end > high or start > end:
+            raise CronError(f"Value '{part}' out of range {low}-{high} in {name} field.")
+        values.update(range(start, end + 1, step))
+    if name == 'weekday' and 7 in values:
+        # 7 is an alias for Sunday.
+        values.discard(7)
+        values.add(0)
+    return values
+
+
+class CronSchedule:
+    """
+    Standard five-field cron expression, evaluated in the project time zone.
+    When both day-of-month and day-of-week are restricted either may match.
+    """
+
+    def __init__(self, expression):
+        fields = expression.split()
+        if len(fields) != 5:
+            raise CronError(f"Expected 5 fields in '{expression}', got {len(fields)}.")
+        self.expression = expression
+        parsed = [parse_field(text, low, high, name) for text, (name, low, high) in zip(fields, FIELD_RANGES)]
+        self.minutes, self.hours, self.days, self.months, self.weekdays = parsed
+        self.any_day = fields[2] == '*'
+        self.any_weekday = fields[4] == '*'
+
+    def day_matches(self, moment):
+        day_ok = moment.day in self.days
+        weekday_ok = (moment.weekday() + 1) % 7 in self.weekdays
+        if self.any_day or self.any_weekday:
+            return day_ok and weekday_ok
+        return day_ok or weekday_ok
+
+    def next_after(self, moment):
+        """Returns the first matching minute strictly after ``moment``."""
+        local = timezone.localtime(moment).replace(tzinfo=None, second=0, microsecond=0) + timedelta(minutes=1)
+        limit = local + timedelta(days=366 * 5)
+        while local < limit:
+            if local.month not in self.months:
+                year, month = (local.year + 1, 1) if local.month == 12 else (local.year, local.month + 1)
+                local = datetime(year, month, 1)
+            elif not self.day_matches(local):
+                local = datetime(local.year, local.month, local.day) + timedelta(days=1)
+            elif local.hour not in self.hours:
+                local = local.replace(minute=0) + timedelta(hours=1)
+            elif local.minute not in self.minutes:
+                local += timedelta(minutes=1)
+            else:
+                return timezone.make_aware(local)
+        raise CronError(f"'{self.expression}' never matches.")
@@ -0,0 +1,283 @@
+from datetime import date
+
+from django.contrib.auth.models import User
+from django.db.models import Count, Q, Prefetch
+from django.template.loader import render_to_string
+
+from .models import Author, Publisher, Book, Student, Circulation, Penalty, AuditLog, EmailLog
+from . import counters, log_archive
+from .charts import build_chart_data
+from .pagination import keyset_page
+from .search import search_books
+
+CIRCULATION_SORTS = ('-issue_date', 'issue_date', 'due_date', '-due_date')
+
+
+def render_tab(request, tab, context):
+    return {'tab': tab, 'html': render_to_string(f'dashboard_tabs/{tab}.html', context, request=request)}
+
+
+def render_paginated_tab(request, tab, name, queryset):
+    page = keyset_page(queryset, list(queryset.query.order_by), request.GET.get('cursor'))
+    data = render_tab(request, tab, {name: page['rows']})
+    data['next_cursor'] = page['next_cursor']
+    data['prev_cursor'] = page['prev_cursor']
+    return data
+
+
+def filter_circulations(request):
+    circ_search = request.GET.get('circ_search', '')
+    circ_status = request.GET.get('circ_status', '')
+    circ_sort = request.GET.get('circ_sort')
+    if circ_sort not in CIRCULATION_SORTS:
+        circ_sort = '-issue_date'
+    start_date = request.GET.get('start_date')
+    end_date = request.GET.get('end_date')
+    all_time = request.GET.get('all_time')
+
+    circulations = Circulation.objects.select_related('student', 'book__author', 'book__publisher')
+
+    if circ_search:
+        circulations = circulations.filter(Q(student__name__icontains=circ_search) | Q(book__title__icontains=circ_search))
+
+    if circ_status:
+        if circ_status == 'overdue':
+            circulations = circulations.filter(status='issued', due_date__lt=date.today())
+        else:
+            circulations = circulations.filter(status=circ_status)
+
+    if not all_time:
+        if start_date:
+            circulations = circulations.filter(issue_date__gte=start_date)
+
+        if end_date:
+            circulations = circulations.filter(issue_date__lte=end_date)
+
+    return circulations.order_by(circ_sort, '-id')
+
+
+def filter_books(request):
+    search_query = request.GET.get('search_query', '')
+    books = Book.objects.select_related('author', 'publisher').order_by('-id')
+
+    if search_query:
+        books = search_books(books, search_query)
+    return books
+
+
+def filter_authors(request):
+    author_search = request.GET.get('author_search', '')
+    author_sort = request.GET.get('author_sort', '-book_count')
+
+    authors_qs = Author.objects.annotate(book_count=Count('book')).prefetch_related(
+        Prefetch('book_set', queryset=Book.objects.select_related('publisher').order_by('title'))
+    )
+
+    if author_search:
+        authors_qs = authors_qs.filter(name__icontains=author_search)
+
+    if author_sort == 'name_asc':
+        authors_qs = authors_qs.order_by('name', 'id')
+    elif author_sort == 'name_desc':
+        authors_qs = authors_qs.order_by('-name', '-id')
+    elif author_sort == 'book_count':
+        authors_qs = authors_qs.order_by('book_count', 'id')
+    else:
+        authors_qs = authors_qs.order_by('-book_count', '-id')
+    return authors_qs
+
+
+def filter_publishers(request):
+    publisher_search = request.GET.get('publisher_search', '')
+    publisher_sort = request.GET.get('publisher_sort', 'name_asc')
+
+    # A publisher's books are fetched when its card is opened (publisher_books_tab).
+    publishers_qs = Publisher.objects.annotate(book_count=Count('book'))
+
+    if publisher_search:
+        publishers_qs = publishers_qs.filter(name__icontains=publisher_search)
+
+    if publisher_sort == 'name_desc':
+        publishers_qs = publishers_qs.order_by('-name', '-id')
+    elif publisher_sort == 'book_count_desc':
+        publishers_qs = publishers_qs.order_by('-book_count', '-id')
+    elif publisher_sort == 'book_count_asc':
+        publishers_qs = publishers_qs.order_by('book_count', 'id')
+    else:
+        publishers_qs = publishers_qs.order_by('name', 'id')
+    return publishers_qs
+
+
+def filter_students(request):
+    student_search = request.GET.get('student_search', '')
+    student_sort = request.GET.get('student_sort', '-joined_date')
+
+    students_qs = Student.objects.all()
+
+    if student_search:
+        students_qs = students_qs.filter(Q(name__icontains=student_search) | Q(email__icontains=student_search))
+
+    if student_sort == 'name_asc':
+        students_qs = students_qs.order_by('name', 'id')
+    elif student_sort == 'name_desc':
+        students_qs = students_qs.order_by('-name', '-id')
+    elif student_sort == 'joined_date_asc':
+        students_qs = students_qs.order_by('joined_date', 'id')
+    else:
+        students_qs = students_qs.order_by('-joined_date', '-id')
+    return students_qs
+
+
+def overdue_circulations():
+    return Circulation.objects.filter(status='issued', due_date__lt=date.today()).order_by('due_date')
+
+
+def unpaid_penalties_for(circulations):
+    # Maps (student_id, book_id) to the oldest unpaid penalty id, in one query.
+    student_ids = {circ.student_id for circ in circulations}
+    penalties = Penalty.objects.filter(status='unpaid', student_id__in=student_ids).order_by('id')
+    penalty_ids = {}
+    for student_id, book_id, penalty_id in penalties.values_list('student_id', 'book_id', 'id'):
+        penalty_ids.setdefault((student_id, book_id), penalty_id)
+    return penalty_ids
+
+
+def get_summary_counts():
+    values = counters.get_counters()
+    return {
+        'total_books': values['total_books'],
+        'total_students': values['total_students'],
+        'issued_books_count': values['issued_books'],
+        'reserved_books_count': values['available_copies'],
+        'overdue_books_count': values['overdue_books'],
+    }
+
+
+def dashboard_tab(request):
+    return render_tab(request, 'dashboard', {
+        'circulations': filter_circulations(request)[:5],
+        'books': filter_books(request)[:4],
+        'overdue_circulations': overdue_circulations().select_related('student', 'book__author', 'book__publisher')[:5],
+        'overdue_books_count': counters.get_counters()['overdue_books'],
+        'authors': filter_authors(request)[:5],
+    })
+
+
+def books_tab(request):
+    return render_paginated_tab(request, 'books', 'books', filter_books(request))
+
+
+def authors_tab(request):
+    return render_paginated_tab(request, 'authors', 'authors', filter_authors(request))
+
+
+def publishers_tab(request):
+    return render_paginated_tab(request, 'publishers', 'publishers', filter_publishers(request))
+
+
+def publisher_books_tab(request):
+    publisher_id = request.GET.get('publisher_id', '')
+    books = Book.objects.filter(publisher_id=publisher_id if publisher_id.isdigit() else None)
+    return render_paginated_tab(request, 'publisher_books', 'books', books.select_related('author', 'publisher').order_by('title', 'id'))
+
+
+def students_tab(request):
+    return render_paginated_tab(request, 'students', 'students', filter_students(request))
+
+
+def users_tab(request):
+    return render_paginated_tab(request, 'users', 'users', User.objects.order_by('username', 'id'))
+
+
+def circulations_tab(request):
+    return render_paginated_tab(request, 'circulations', 'circulations', filter_circulations(request))
+
+
+def penalties_tab(request):
+    penalties = Penalty.objects.select_related('student', 'book__author', 'book__publisher').order_by('-id')
+    return render_paginated_tab(request, 'penalties', 'penalties', penalties)
+
+
+def audit_logs_tab(request):
+    audit_logs = AuditLog.objects.all().order_by('-timestamp')
+    audit_start = request.GET.get('audit_start')
+    audit_end = request.GET.get('audit_end')
+
+    if audit_start:
+        audit_logs = audit_logs.filter(timestamp__gte=audit_start)
+    if audit_end:
+        audit_logs = audit_logs.filter(timestamp__lte=audit_end)
+    # Each filter below is the leading column of an AuditLog index.
+    if request.GET.get('audit_user'):
+        audit_logs = audit_logs.filter(username=request.GET['audit_user'])
+    if request.GET.get('audit_verb'):
+        audit_logs = audit_logs.filter(verb=request.GET['audit_verb'])
+    if request.GET.get('audit_object_type'):
+        audit_logs = audit_logs.filter(object_type=request.GET['audit_object_type'])
+        if request.GET.get('audit_object_id', '').isdigit():
+            audit_logs = audit_logs.filter(object_id=request.GET['audit_object_id'])
+
+    return render_tab(request, 'audit_logs', {'audit_logs': audit_logs[:100]})
+
+
+def email_logs_tab(request):
+    # Archived months are only read from disk when the search asks for them.
+    email_logs = log_archive.search(
+        EmailLog, request.GET.get('email_search', ''), include_archived=request.GET.get('include_archived') == '1',
+    )
+    return render_tab(request, 'email_logs', {'email_logs': email_logs})
+
+
+def charts_tab(request):
+    data = build_chart_data(
+        request.GET.get('chart_range', '6_months'),
+        start=request.GET.get('chart_start'),
+        end=request.GET.get('chart_end'),
+        granularity=request.GET.get('chart_granularity'),
+    )
+    data['tab'] = 'charts'
+    return data
+
+
+def overdue_tab(request):
+    overdue_data = {}
+    circulations = list(overdue_circulations().select_related('student', 'book'))
+    penalty_ids = unpaid_penalties_for(circulations)
+    for circ in circulations:
+        if circ.student.email not in overdue_data:
+            overdue_data[circ.student.email] = []
+
+        penalty_id = penalty_ids.get((circ.student_id, circ.book_id))
+        if penalty_id:
+            overdue_data[circ.student.email].append(f"{circ.book.title} (Pay Fine: http://127.0.0.1:8000/pay-penalty/{penalty_id}/)")
+        else:
+            overdue_data[circ.student.email].append(circ.book.title)
+    return {'tab': 'overdue', 'overdue_data': overdue_data}
+
+
+def options_tab(request):
+    # Choices for the modal dropdowns, fetched the first time a modal is opened.
+    # Students are picked through the autocomplete endpoint instead.
+    return {
+        'tab': 'options',
+        'authors': list(Author.objects.order_by('name').values_list('id', 'name')),
+        'publishers': list(Publisher.objects.order_by('name').values_list('id', 'name')),
+    }
+
+
+TAB_BUILDERS = {
+    'dashboard': dashboard_tab,
+    'books': books_tab,
+    'authors': authors_tab,
+    'publishers': publishers_tab,
+    'publisher_books': publisher_books_tab,
+    'students': students_tab,
+    'users': users_tab,
+    'circulations': circulations_tab,
+    'penalties': penalties_tab,
+    'audit_logs': audit_logs_tab,
+    'email_logs': email_logs_tab,
+    'charts': charts_tab,
+    'overdue': overdue_tab,
+    'options': options_tab,
+}
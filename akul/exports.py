@@ -0,0 +1,135 @@
+import csv
+import zlib
+
+from django.utils import timezone
+
+from .models import Book, Student, Circulation, Penalty, AuditLog, EmailLog
+
+CHUNK_SIZE = 2000
+# Rows buffered per yielded chunk; one chunk per row makes for tiny TCP writes.
+ROWS_PER_CHUNK = 200
+
+
+def _local(moment):
+    return timezone.localtime(moment).strftime('%Y-%m-%d %H:%M:%S') if moment else ''
+
+
+def _blank(value):
+    return '' if value is None else value
+
+
+# name -> (filename, header, rows). Each ``rows`` callable returns an iterable
+# of plain tuples drawn straight from values_list, so no model instances are built.
+EXPORTS = {
+    'books': (
+        'books_export.csv',
+        ['Title', 'Author', 'Publisher', 'ISBN', 'Total Quantity', 'Available Quantity', 'Location', 'Thumbnail URL'],
+        lambda: (
+            tuple(_blank(value) for value in row)
+            for row in Book.objects.order_by('id').values_list(
+                'title', 'author__name', 'publisher__name', 'isbn', 'quantity', 'available_quantity',
+                'location', 'thumbnail_link',
+            ).iterator(chunk_size=CHUNK_SIZE)
+        ),
+    ),
+    'students': (
+        'students_export.csv',
+        ['Name', 'Email', 'Phone', 'Address', 'Joined Date'],
+        lambda: (
+            (name, email, phone, address, joined_date.strftime('%Y-%m-%d'))
+            for name, email, phone, address, joined_date in Student.objects.order_by('id').values_list(
+                'name', 'email', 'phone', 'address', 'joined_date',
+            ).iterator(chunk_size=CHUNK_SIZE)
+        ),
+    ),
+    'circulations': (
+        'circulations_export.csv',
+        ['ID', 'Student', 'Student Email', 'Book', 'ISBN', 'Issue Date', 'Due Date', 'Return Date', 'Status', 'Fine Amount'],
+        lambda: (
+            tuple(_blank(value) for value in row)
+            for row in Circulation.objects.order_by('id').values_list(
+                'id', 'student__name', 'student__email', 'book__title', 'book__isbn',
+                'issue_date', 'due_date', 'return_date', 'status', 'fine_amount',
+            ).iterator(chunk_size=CHUNK_SIZE)
+        ),
+    ),
+    'penalties': (
+        'penalties_export.csv',
+        ['ID', 'Student', 'Student Email', 'Book', 'Due Date', 'Days Overdue', 'Amount', 'Reason', 'Status', 'Created At'],
+        lambda: (
+            (pk, student, email, _blank(book), _blank(due_date), days, amount, reason, status, _local(created_at))
+            for pk, student, email, book, due_date, days, amount, reason, status, created_at in Penalty.objects.order_by('id').values_list(
+                'id', 'student__name', 'student__email', 'book__title', 'due_date', 'days_overdue',
+                'amount', 'reason', 'status', 'created_at',
+            ).iterator(chunk_size=CHUNK_SIZE)
+        ),
+    ),
+    'audit_logs': (
+        'audit_logs_export.csv',
+        ['Timestamp', 'User', 'Action', 'Verb', 'Object Type', 'Object ID'],
+        lambda: (
+            (_local(timestamp), username, action, verb, object_type, _blank(object_id))
+            for timestamp, username, action, verb, object_type, object_id in AuditLog.objects.order_by('timestamp', 'id').values_list(
+                'timestamp', 'username', 'action', 'verb', 'object_type', 'object_id',
+            ).iterator(chunk_size=CHUNK_SIZE)
+        ),
+    ),
+    'email_logs': (
+        'email_logs_export.csv',
+        ['Sent At', 'Recipient', 'Subject', 'Message'],
+        lambda: (
+            (_local(sent_at), recipient, subject, message)
+            for sent_at, recipient, subject, message in EmailLog.objects.order_by('sent_at', 'id').values_list(
+                'sent_at', 'recipient', 'subject', 'message',
+            ).iterator(chunk_size=CHUNK_SIZE)
+        ),
+    ),
+}
+
+
+class LineBuffer:
+    """File-like target for csv.writer that hands back what was written."""
+
+    def __init__(self):
+        self.parts = []
+
+    def write(self, value):
+        self.parts.append(value)
+
+    def drain(self):
+        text = ''.join(self.parts)
+        self.parts = []
+        return text
+
+
+def csv_chunks(header, rows, rows_per_chunk=ROWS_PER_CHUNK):
+    buffer = LineBuffer()
+    writer = csv.writer(buffer)
+    writer.writerow(header)
+    pending = 1
+    for row in rows:
+        writer.writerow(row)
+        pending += 1
+        if pending >= rows_per_chunk:
+            yield buffer.drain().encode('utf-8')
+            pending = 0
+    if pending:
+        yield buffer.drain().encode('utf-8')
+
+
+def gzip_chunks(chunks):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export_stream(kind, gzip=False):
+    """Returns (filename, iterator of bytes) for one of the EXPORTS."""
+    filename, header, rows = EXPORTS[kind]
+    chunks = csv_chunks(header, rows())
+    if gzip:
+        return filename + '.gz', gzip_chunks(chunks)
+    return filename, chunks
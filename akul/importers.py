@@ -0,0 +1,138 @@
+import codecs
+import csv
+
+from django.db import transaction
+
+from . import autocomplete, content_similarity, counters, recommendation_cache, reports, search, stats
+from .models import Author, Publisher, Book
+
+BATCH_SIZE = 1000
+UNKNOWN_AUTHOR = "Unknown Author"
+UNKNOWN_PUBLISHER = "Unknown Publisher"
+
+
+class RowError(ValueError):
+    pass
+
+
+def _cell(row, index):
+    return row[index].strip() if len(row) > index else ''
+
+
+def _quantity(text, default, label):
+    if not text:
+        return default
+    if not text.isdigit():
+        raise RowError(f"{label} '{text}' is not a whole number.")
+    return int(text)
+
+
+def parse_book_row(row):
+    """Validates one CSV row in export_books_csv's column order."""
+    if len(row) < 4:
+        raise RowError(f"Expected at least 4 columns, got {len(row)}.")
+    title, isbn = _cell(row, 0), _cell(row, 3)
+    if not title or not isbn:
+        raise RowError("Title and ISBN are required.")
+    if len(title) > Book._meta.get_field('title').max_length:
+        raise RowError("Title is too long.")
+    if len(isbn) > Book._meta.get_field('isbn').max_length:
+        raise RowError(f"ISBN '{isbn}' is longer than 13 characters.")
+    quantity = _quantity(_cell(row, 4), 1, "Total quantity")
+    available = _quantity(_cell(row, 5), quantity, "Available quantity")
+    if available > quantity:
+        raise RowError("Available quantity exceeds total quantity.")
+    return {
+        'title': title,
+        'author': (_cell(row, 1) or UNKNOWN_AUTHOR)[:100],
+        'publisher': (_cell(row, 2) or UNKNOWN_PUBLISHER)[:100],
+        'isbn': isbn,
+        'quantity': quantity,
+        'available_quantity': available,
+        'location': _cell(row, 6)[:255],
+        'thumbnail_link': _cell(row, 7)[:500],
+    }
+
+
+def _resolve_names(model, names, known):
+    """Maps every name to an id, creating the missing rows with one INSERT."""
+    missing = names - known.keys()
+    if missing:
+        for pk, name in model.objects.filter(name__in=missing).order_by('-id').values_list('id', 'name'):
+            known[name] = pk
+        created = model.objects.bulk_create([model(name=name) for name in missing - known.keys()])
+        for obj in created:
+            known[obj.name] = obj.pk
+        return len(created)
+    return 0
+
+
+def _import_batch(batch, authors, publishers, seen_isbns, report):
+    existing = set(Book.objects.filter(isbn__in=[data['isbn'] for _, data in batch]).values_list('isbn', flat=True))
+    rows = []
+    for line, data in batch:
+        if data['isbn'] in existing:
+            report['skipped'].append({'row': line, 'isbn': data['isbn'], 'reason': "ISBN already in catalog."})
+        elif data['isbn'] in seen_isbns:
+            report['skipped'].append({'row': line, 'isbn': data['isbn'], 'reason': "Duplicate ISBN earlier in file."})
+        else:
+            seen_isbns.add(data['isbn'])
+            rows.append(data)
+    if not rows:
+        return
+    report['authors_created'] += _resolve_names(Author, {data['author'] for data in rows}, authors)
+    report['publishers_created'] += _resolve_names(Publisher, {data['publisher'] for data in rows}, publishers)
+    Book.objects.bulk_create([
+        Book(
+            title=data['title'], author_id=authors[data['author']], publisher_id=publishers[data['publisher']],
+            isbn=data['isbn'], quantity=data['quantity'], available_quantity=data['available_quantity'],
+            location=data['location'], thumbnail_link=data['thumbnail_link'],
+        )
+        for data in rows
+    ])
+    report['created'] += len(rows)
+    report['available_copies'] += sum(data['available_quantity'] for data in rows)
+
+
+def import_books(lines, batch_size=BATCH_SIZE):
+    """
+    Imports books from an iterable of CSV text lines (header first) in one
+    transaction, a batch at a time, so memory stays flat for large files.
+    Invalid and duplicate rows are skipped and listed in the report rather
+    than aborting the import.
+    """
+    report = {'created': 0, 'authors_created': 0, 'publishers_created': 0,
+              'available_copies': 0, 'errors': [], 'skipped': []}
+    reader = csv.reader(lines)
+    next(reader, None)
+    authors, publishers, seen_isbns = {}, {}, set()
+    batch = []
+    with transaction.atomic():
+        for row in reader:
+            if not any(cell.strip() for cell in row):
+                continue
+            try:
+                batch.append((reader.line_num, parse_book_row(row)))
+            except RowError as e:
+                report['errors'].append({'row': reader.line_num, 'isbn': _cell(row, 3), 'reason': str(e)})
+            if len(batch) >= batch_size:
+                _import_batch(batch, authors, publishers, seen_isbns, report)
+                batch = []
+        if batch:
+            _import_batch(batch, authors, publishers, seen_isbns, report)
+        # bulk_create skips the model signals, so rollups and indexes are refreshed here.
+        if report['available_copies']:
+            stats.record(available_copies=report['available_copies'])
+    if report['created']:
+        search.invalidate_index()
+        content_similarity.invalidate_index()
+        recommendation_cache.invalidate_all()
+        autocomplete.invalidate('books')
+        counters.invalidate()
+        reports.invalidate()
+    return report
+
+
+def import_books_file(uploaded_file, batch_size=BATCH_SIZE):
+    """Streams an uploaded file chunk by chunk instead of reading it whole."""
+    return import_books(codecs.iterdecode(uploaded_file, 'utf-8-sig'), batch_size)
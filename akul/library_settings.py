@@ -0,0 +1,43 @@
+import copy
+import time
+
+from django.core.cache import cache
+
+from .models import LibrarySettings
+
+CACHE_KEY = 'akul:library_settings'
+# How long a process trusts its own copy before re-reading the shared cache.
+LOCAL_TTL = 5.0
+# Bounds how long a copy cached just before a concurrent save can outlive it.
+SHARED_TTL = 300
+
+_local = None
+
+
+def _load():
+    settings_obj = cache.get(CACHE_KEY)
+    if settings_obj is None:
+        # get_or_create on the fixed primary key is race-free: a concurrent
+        # insert loses on the unique key and re-reads the winner's row.
+        settings_obj, _ = LibrarySettings.objects.get_or_create(pk=LibrarySettings.SINGLETON_ID)
+        cache.set(CACHE_KEY, settings_obj, timeout=SHARED_TTL)
+    return settings_obj
+
+
+def get_library_settings():
+    """
+    Returns the library's settings row, creating it on first use. Reads are
+    served from process memory, then the shared cache, then the database.
+    Callers get their own copy, so changes only stick once saved.
+    """
+    global _local
+    entry = _local
+    if entry is None or time.monotonic() - entry[1] > LOCAL_TTL:
+        entry = _local = (_load(), time.monotonic())
+    return copy.copy(entry[0])
+
+
+def invalidate(**kwargs):
+    global _local
+    _local = None
+    cache.delete(CACHE_KEY)
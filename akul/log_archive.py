@@ -0,0 +1,214 @@
+import glob
+import gzip
+import json
+import os
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, transaction
+from django.db.models import Min, Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import AuditLog, EmailLog, OutboundEmail
+
+ARCHIVE_DIR = getattr(settings, 'LOG_ARCHIVE_DIR', os.path.join(settings.BASE_DIR, 'archives'))
+# Months of logs kept in the database, counting the current one.
+HOT_MONTHS = getattr(settings, 'LOG_HOT_MONTHS', 6)
+# Monthly partitions are created this far ahead so new rows never land in the default partition.
+MONTHS_AHEAD = 2
+
+# Partition column and free-text search fields of each log model. Months are UTC calendar months.
+LOG_MODELS = {
+    AuditLog: ('timestamp', ('username', 'action')),
+    EmailLog: ('sent_at', ('recipient', 'subject', 'message')),
+}
+
+
+def month_start(value):
+    value = value.astimezone(dt_timezone.utc)
+    return datetime(value.year, value.month, 1, tzinfo=dt_timezone.utc)
+
+
+def add_months(month, count):
+    years, month_index = divmod(month.month - 1 + count, 12)
+    return month.replace(year=month.year + years, month=month_index + 1)
+
+
+def partition_name(model, month):
+    return f'{model._meta.db_table}_p{month:%Y%m}'
+
+
+def is_partitioned(model):
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT 1 FROM pg_partitioned_table WHERE partrelid = %s::regclass', [model._meta.db_table])
+        return cursor.fetchone() is not None
+
+
+def partitions(model):
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT child.relname FROM pg_inherits JOIN pg_class child ON child.oid = pg_inherits.inhrelid '
+            'WHERE pg_inherits.inhparent = %s::regclass',
+            [model._meta.db_table],
+        )
+        return {row[0] for row in cursor.fetchall()}
+
+
+def create_partition(model, month):
+    """
+    Adds the partition for ``month``. Rows that already fell into the default
+    partition for that range are moved over, which PostgreSQL requires before
+    the new range can be attached.
+    """
+    quote = connection.ops.quote_name
+    table = model._meta.db_table
+    name = partition_name(model, month)
+    default = f'{table}_default'
+    column = quote(model._meta.get_field(LOG_MODELS[model][0]).column)
+    start, end = month.isoformat(), add_months(month, 1).isoformat()
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f'ALTER TABLE {quote(table)} DETACH PARTITION {quote(default)}')
+        cursor.execute(f"CREATE TABLE {quote(name)} PARTITION OF {quote(table)} FOR VALUES FROM ('{start}') TO ('{end}')")
+        cursor.execute(f'INSERT INTO {quote(name)} SELECT * FROM {quote(default)} WHERE {column} >= %s AND {column} < %s', [start, end])
+        cursor.execute(f'DELETE FROM {quote(default)} WHERE {column} >= %s AND {column} < %s', [start, end])
+        cursor.execute(f'ALTER TABLE {quote(table)} ATTACH PARTITION {quote(default)} DEFAULT')
+
+
+def ensure_partitions(now=None, months_ahead=MONTHS_AHEAD):
+    """Creates any missing partition from this month to ``months_ahead`` months out. Returns their names."""
+    current = month_start(now or timezone.now())
+    created = []
+    for model in LOG_MODELS:
+        if not is_partitioned(model):
+            continue
+        existing = partitions(model)
+        for offset in range(months_ahead + 1):
+            month = add_months(current, offset)
+            if partition_name(model, month) not in existing:
+                create_partition(model, month)
+                created.append(partition_name(model, month))
+    return created
+
+
+def archive_path(model, month, directory=ARCHIVE_DIR):
+    # A month archived twice (late rows) gets a second file rather than rewriting the first.
+    stamp = timezone.now().strftime('%Y%m%d%H%M%S')
+    return os.path.join(directory, model._meta.db_table, f'{month:%Y-%m}.{stamp}.jsonl.gz')
+
+
+def archive_month(model, month, directory=ARCHIVE_DIR):
+    """
+    Writes one month of ``model`` rows to a gzipped JSONL file, then drops its
+    partition (PostgreSQL) or deletes the rows (plain tables). Export and
+    removal share one transaction, and only exported rows are removed, so a
+    row written for the month meanwhile is never lost. Returns (rows, path).
+    """
+    field = LOG_MODELS[model][0]
+    rows = model.objects.filter(**{f'{field}__gte': month, f'{field}__lt': add_months(month, 1)})
+    name = partition_name(model, month)
+    quote = connection.ops.quote_name
+    path = None
+    exported = []
+    with transaction.atomic():
+        drop_partition = is_partitioned(model) and name in partitions(model)
+        if drop_partition:
+            # SHARE mode lets the export read the partition but holds late inserts until it is dropped.
+            with connection.cursor() as cursor:
+                cursor.execute(f'LOCK TABLE {quote(name)} IN SHARE MODE')
+        if rows.exists():
+            path = archive_path(model, month, directory)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with gzip.open(path + '.part', 'wt', encoding='utf-8') as archive:
+                for row in rows.order_by(field, 'id').values().iterator(chunk_size=2000):
+                    archive.write(json.dumps(row, cls=DjangoJSONEncoder) + '\n')
+                    exported.append(row['id'])
+            os.replace(path + '.part', path)
+
+        chunks = [exported[start:start + 2000] for start in range(0, len(exported), 2000)]
+        if model is EmailLog:
+            for ids in chunks:
+                OutboundEmail.objects.filter(email_log_id__in=ids).update(email_log=None)
+        if drop_partition:
+            with connection.cursor() as cursor:
+                cursor.execute(f'ALTER TABLE {quote(model._meta.db_table)} DETACH PARTITION {quote(name)}')
+                cursor.execute(f'DROP TABLE {quote(name)}')
+        else:
+            # Plain tables, or rows for the month that sit in the default partition.
+            for ids in chunks:
+                model.objects.filter(id__in=ids).delete()
+    return len(exported), path
+
+
+def archive_old_logs(hot_months=HOT_MONTHS, now=None, directory=ARCHIVE_DIR):
+    """Archives every month older than the newest ``hot_months``. Returns (model, month, rows, path) tuples."""
+    cutoff = add_months(month_start(now or timezone.now()), -(hot_months - 1))
+    archived = []
+    for model, (field, _) in LOG_MODELS.items():
+        oldest = model.objects.filter(**{f'{field}__lt': cutoff}).aggregate(oldest=Min(field))['oldest']
+        month = month_start(oldest) if oldest else cutoff
+        while month < cutoff:
+            count, path = archive_month(model, month, directory)
+            archived.append((model, month, count, path))
+            month = add_months(month, 1)
+    return archived
+
+
+def _archived_rows(model, query, start, end, filters, directory):
+    field, text_fields = LOG_MODELS[model]
+    by_month = {}
+    for path in glob.glob(os.path.join(directory, model._meta.db_table, '*.jsonl.gz')):
+        by_month.setdefault(os.path.basename(path)[:7], []).append(path)
+    needle = query.lower()
+    for month in sorted(by_month, reverse=True):
+        month_first = datetime.strptime(month, '%Y-%m').replace(tzinfo=dt_timezone.utc)
+        if (end and month_first > end) or (start and add_months(month_first, 1) <= start):
+            continue
+        rows = {}
+        for path in by_month[month]:
+            with gzip.open(path, 'rt', encoding='utf-8') as archive:
+                for line in archive:
+                    row = json.loads(line)
+                    row[field] = parse_datetime(row[field])
+                    if (start and row[field] < start) or (end and row[field] > end):
+                        continue
+                    if any(row.get(name) != value for name, value in filters.items()):
+                        continue
+                    if needle and not any(needle in (row[name] or '').lower() for name in text_fields):
+                        continue
+                    rows[row['id']] = row
+        for row in sorted(rows.values(), key=lambda row: (row[field], row['id']), reverse=True):
+            yield model(**row)
+
+
+def search(model, query='', start=None, end=None, include_archived=False, limit=100, directory=ARCHIVE_DIR, **filters):
+    """
+    Newest-first ``model`` rows matching ``query`` (case-insensitive, across
+    the model's text fields), the ``start``/``end`` bounds and exact-match
+    ``filters``. Only the database is searched unless ``include_archived`` is
+    set, in which case archive files fill up the rest of ``limit``.
+    """
+    field, text_fields = LOG_MODELS[model]
+    rows = model.objects.filter(**filters)
+    if start:
+        rows = rows.filter(**{f'{field}__gte': start})
+    if end:
+        rows = rows.filter(**{f'{field}__lte': end})
+    if query:
+        matches = Q()
+        for name in text_fields:
+            matches |= Q(**{f'{name}__icontains': query})
+        rows = rows.filter(matches)
+    results = list(rows.order_by(f'-{field}', '-id')[:limit])
+
+    if include_archived and len(results) < limit:
+        seen = {row.id for row in results}
+        for row in _archived_rows(model, query, start, end, filters, directory):
+            if row.id not in seen:
+                results.append(row)
+                if len(results) >= limit:
+                    break
+    return results
@@ -0,0 +1,124 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import OutboundEmail, EmailLog
+from .notifications import add_notification
+
+BATCH_SIZE = getattr(settings, 'MAILER_BATCH_SIZE', 50)
+# Messages sent per run of the minutely send_emails job; 0 disables the cap.
+RATE_PER_MINUTE = getattr(settings, 'MAILER_RATE_PER_MINUTE', 60)
+MAX_ATTEMPTS = getattr(settings, 'MAILER_MAX_ATTEMPTS', 5)
+RETRY_DELAY = getattr(settings, 'MAILER_RETRY_DELAY', 60)
+
+
+def queue_email(recipient, subject, message):
+    return OutboundEmail.objects.create(recipient=recipient, subject=subject, message=message)
+
+
+def queue_emails(emails):
+    """Queues (recipient, subject, message) tuples with one INSERT."""
+    return OutboundEmail.objects.bulk_create([
+        OutboundEmail(recipient=recipient, subject=subject, message=message)
+        for recipient, subject, message in emails
+    ])
+
+
+def claim_batch(batch_size=BATCH_SIZE, now=None):
+    now = now or timezone.now()
+    with transaction.atomic():
+        due = OutboundEmail.objects.filter(status='pending', next_attempt_at__lte=now).order_by('next_attempt_at', 'id')
+        if connection.features.has_select_for_update_skip_locked:
+            due = due.select_for_update(skip_locked=True)
+        batch = list(due[:batch_size])
+        # next_attempt_at doubles as the claim time so requeue_stuck can spot abandoned batches.
+        OutboundEmail.objects.filter(id__in=[email.id for email in batch]).update(status='sending', next_attempt_at=now)
+    return batch
+
+
+def retry_delay(attempts):
+    return timedelta(seconds=RETRY_DELAY * 2 ** (attempts - 1))
+
+
+def mark_sent(email):
+    log = EmailLog.objects.create(recipient=email.recipient, subject=email.subject, message=email.message)
+    OutboundEmail.objects.filter(pk=email.pk).update(
+        status='sent', attempts=email.attempts + 1, sent_at=timezone.now(), email_log=log, last_error='',
+    )
+
+
+def mark_failed(email, error):
+    attempts = email.attempts + 1
+    if attempts >= MAX_ATTEMPTS:
+        OutboundEmail.objects.filter(pk=email.pk).update(status='failed', attempts=attempts, last_error=error)
+        add_notification(f"Email to {email.recipient} failed after {attempts} attempts: {error}")
+    else:
+        OutboundEmail.objects.filter(pk=email.pk).update(
+            status='pending', attempts=attempts, last_error=error,
+            next_attempt_at=timezone.now() + retry_delay(attempts),
+        )
+
+
+def send_batch(batch, smtp):
+    sent = failed = 0
+    for email in batch:
+        try:
+            EmailMessage(email.subject, email.message, None, [email.recipient], connection=smtp).send()
+        except Exception as e:
+            mark_failed(email, str(e) or e.__class__.__name__)
+            failed += 1
+            # The session may be broken; reconnect before the next message.
+            try:
+                smtp.close()
+                smtp.open()
+            except Exception:
+                pass
+        else:
+            mark_sent(email)
+            sent += 1
+    return sent, failed
+
+
+def send_pending(batch_size=BATCH_SIZE, rate_per_minute=RATE_PER_MINUTE):
+    """
+    Sends up to ``rate_per_minute`` due messages over a single SMTP session
+    and leaves the rest for the next minute's run, so a large mailing never
+    holds up the other scheduled jobs. Returns counts of sent and failed
+    attempts.
+    """
+    totals = {'sent': 0, 'failed': 0}
+    requeue_stuck()
+    remaining = rate_per_minute or None
+    smtp = None
+    try:
+        while remaining is None or remaining > 0:
+            batch = claim_batch(batch_size if remaining is None else min(batch_size, remaining))
+            if not batch:
+                break
+            if remaining is not None:
+                remaining -= len(batch)
+            if smtp is None:
+                smtp = get_connection(fail_silently=False)
+                try:
+                    smtp.open()
+                except Exception as e:
+                    for email in batch:
+                        mark_failed(email, f"Could not connect: {e}")
+                    totals['failed'] += len(batch)
+                    break
+            sent, failed = send_batch(batch, smtp)
+            totals['sent'] += sent
+            totals['failed'] += failed
+    finally:
+        if smtp is not None:
+            smtp.close()
+    return totals
+
+
+def requeue_stuck(older_than=timedelta(minutes=30)):
+    """Puts back messages left in 'sending' by a worker that died mid-batch."""
+    cutoff = timezone.now() - older_than
+    return OutboundEmail.objects.filter(status='sending', next_attempt_at__lt=cutoff).update(status='pending')
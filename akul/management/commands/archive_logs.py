@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from akul.log_archive import ARCHIVE_DIR, HOT_MONTHS, archive_old_logs, ensure_partitions
+
+
+class Command(BaseCommand):
+    help = "Moves audit and email log months older than the hot window into gzipped JSONL files."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--keep-months', type=int, default=HOT_MONTHS,
+                            help=f"Months kept in the database, counting the current one (default {HOT_MONTHS}).")
+        parser.add_argument('--directory', default=ARCHIVE_DIR, help="Where archive files are written.")
+
+    def handle(self, *args, **options):
+        if options['keep_months'] < 1:
+            raise CommandError("--keep-months must be at least 1.")
+        ensure_partitions()
+        archived = archive_old_logs(options['keep_months'], directory=options['directory'])
+        for model, month, count, path in archived:
+            if count:
+                self.stdout.write(f"{model._meta.verbose_name} {month:%Y-%m}: {count} rows -> {path}")
+        total = sum(count for _, _, count, _ in archived)
+        self.stdout.write(self.style.SUCCESS(f"Archived {total} log rows from {len(archived)} months."))
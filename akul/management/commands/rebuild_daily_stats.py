@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from akul.stats import rebuild
+
+
+class Command(BaseCommand):
+    help = "Backfills or rebuilds the DailyLibraryStats rollup from circulation, student and penalty rows."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', help="First day to rebuild (YYYY-MM-DD). Defaults to the earliest activity.")
+        parser.add_argument('--end', help="Last day to rebuild (YYYY-MM-DD). Defaults to today.")
+
+    def handle(self, *args, **options):
+        start = self.parse(options['start'])
+        end = self.parse(options['end'])
+        written = rebuild(start, end)
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {written} daily stats rows."))
+
+    def parse(self, value):
+        if not value:
+            return None
+        try:
+            parsed = parse_date(value)
+        except ValueError:
+            parsed = None
+        if parsed is None:
+            raise CommandError(f"Invalid date '{value}', expected YYYY-MM-DD.")
+        return parsed
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from akul.models import ScheduledJob
+from akul.scheduler import JOBS, run_due_jobs, run_forever, run_now, sync_jobs
+
+
+class Command(BaseCommand):
+    help = "Runs scheduled library jobs (reminders, penalties, recommendations, housekeeping)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="Run the jobs that are due now and exit.")
+        parser.add_argument('--run', metavar='JOB', help="Run one job immediately, whether or not it is due.")
+        parser.add_argument('--list', action='store_true', help="List jobs with their schedules and last runs.")
+        parser.add_argument('--interval', type=int, default=30, help="Seconds between checks when running continuously.")
+
+    def handle(self, *args, **options):
+        sync_jobs()
+
+        if options['list']:
+            for job in ScheduledJob.objects.order_by('name'):
+                self.stdout.write(f"{job.name:<25} {job.schedule:<15} next={job.next_run_at} last={job.last_run_at} {job.last_status}")
+            return
+
+        if options['run']:
+            if options['run'] not in JOBS:
+                raise CommandError(f"Unknown job '{options['run']}'. Known jobs: {', '.join(JOBS)}")
+            status = run_now(options['run'])
+            self.stdout.write(f"{options['run']}: {status}")
+            return
+
+        if options['once']:
+            ran = run_due_jobs()
+            self.stdout.write(f"Ran {len(ran)} job(s): {', '.join(ran) or '-'}")
+            return
+
+        self.stdout.write(self.style.SUCCESS("Scheduler started."))
+        run_forever(options['interval'])
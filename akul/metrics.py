@@ -0,0 +1,181 @@
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import connection
+from django.template import TemplateDoesNotExist
+from django.template.backends.django import DjangoTemplates, Template as BackendTemplate, reraise
+
+from .dashboard import TAB_BUILDERS
+
+logger = logging.getLogger('akul.metrics')
+
+# Upper bounds, in seconds, of the request duration histogram.
+BUCKETS = (0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# The ?api= values admin_dashboard answers; anything else is labelled 'other'.
+API_NAMES = ('recommendations', 'similar_books', 'recommendation_cache_stats')
+LABEL_NAMES = ('view', 'tab', 'api')
+SERIES_COUNTERS = [
+    ('akul_request_sql_queries_total', 'queries', 'SQL queries run by requests.'),
+    ('akul_request_sql_seconds_total', 'sql_seconds', 'Time requests spent in SQL.'),
+    ('akul_request_template_seconds_total', 'template_seconds', 'Time requests spent rendering templates.'),
+    ('akul_slow_requests_total', 'slow', 'Requests slower than METRICS_SLOW_REQUEST_MS.'),
+]
+
+_series = {}
+_lock = threading.Lock()
+_local = threading.local()
+
+
+class TimedTemplate(BackendTemplate):
+    def render(self, context=None, request=None):
+        # Only the outermost render is timed, so a template rendered from inside another is not counted twice.
+        if getattr(_local, 'template_seconds', None) is None or _local.template_depth:
+            return super().render(context, request)
+        _local.template_depth += 1
+        start = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            _local.template_depth -= 1
+            _local.template_seconds += time.perf_counter() - start
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """The Django template backend, with render time added to the current request's metrics."""
+
+    def from_string(self, template_code):
+        return TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return TimedTemplate(self.engine.get_template(template_name), self)
+        except TemplateDoesNotExist as exc:
+            reraise(exc, self)
+
+
+def labels_for(request):
+    """(view, tab, api) labels. Tabs and api names come from the request, so unknown values collapse to 'other'."""
+    match = request.resolver_match
+    view = match.url_name if match and match.url_name else 'unresolved'
+    tab = (match.kwargs.get('tab') if match else None) or request.GET.get('tab', '')
+    if tab and tab not in TAB_BUILDERS:
+        tab = 'other'
+    api = request.GET.get('api', '')
+    if api and api not in API_NAMES:
+        api = 'other'
+    return view, tab, api
+
+
+def observe(labels, seconds, queries, sql_seconds, template_seconds, slow):
+    with _lock:
+        series = _series.get(labels)
+        if series is None:
+            series = _series[labels] = {
+                'count': 0, 'seconds': 0.0, 'buckets': [0] * len(BUCKETS),
+                'queries': 0, 'sql_seconds': 0.0, 'template_seconds': 0.0, 'slow': 0,
+            }
+        series['count'] += 1
+        series['seconds'] += seconds
+        for index, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                series['buckets'][index] += 1
+        series['queries'] += queries
+        series['sql_seconds'] += sql_seconds
+        series['template_seconds'] += template_seconds
+        series['slow'] += int(slow)
+
+
+def reset():
+    with _lock:
+        _series.clear()
+
+
+class MetricsMiddleware:
+    """
+    Times every request and counts its SQL queries, SQL time and template
+    render time, tagged by URL name and the tab/api parameter. Totals are
+    kept per process and served by the /metrics view.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        sql = {'queries': 0, 'seconds': 0.0}
+
+        def time_query(execute, sql_text, params, many, context):
+            start = time.perf_counter()
+            try:
+                return execute(sql_text, params, many, context)
+            finally:
+                sql['queries'] += 1
+                sql['seconds'] += time.perf_counter() - start
+
+        _local.template_seconds, _local.template_depth = 0.0, 0
+        start = time.perf_counter()
+        try:
+            with connection.execute_wrapper(time_query):
+                response = self.get_response(request)
+        finally:
+            seconds = time.perf_counter() - start
+            template_seconds, _local.template_seconds = _local.template_seconds, None
+
+        labels = labels_for(request)
+        threshold = getattr(settings, 'METRICS_SLOW_REQUEST_MS', 1000) / 1000
+        slow = seconds > threshold
+        if slow:
+            logger.warning(
+                "Slow request %s %s (view=%s tab=%s api=%s): %.0f ms, %d queries in %.0f ms, templates %.0f ms",
+                request.method, request.path, *labels, seconds * 1000, sql['queries'], sql['seconds'] * 1000,
+                template_seconds * 1000,
+            )
+        observe(labels, seconds, sql['queries'], sql['seconds'], template_seconds, slow)
+        return response
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(pairs):
+    return '{' + ','.join(f'{name}="{_escape(str(value))}"' for name, value in pairs) + '}' if pairs else ''
+
+
+def _number(value):
+    return f'{value:.6f}' if isinstance(value, float) else str(value)
+
+
+def render(extra_samples=()):
+    """
+    The collected series in the Prometheus text format. ``extra_samples``
+    adds (name, type, help, {label: value}, value) samples from elsewhere.
+    """
+    with _lock:
+        snapshot = sorted((labels, dict(series, buckets=list(series['buckets']))) for labels, series in _series.items())
+
+    lines = [
+        '# HELP akul_request_duration_seconds Wall time of requests.',
+        '# TYPE akul_request_duration_seconds histogram',
+    ]
+    for labels, series in snapshot:
+        pairs = list(zip(LABEL_NAMES, labels))
+        for bound, count in zip(BUCKETS, series['buckets']):
+            lines.append(f'akul_request_duration_seconds_bucket{_format_labels(pairs + [("le", bound)])} {count}')
+        lines.append(f'akul_request_duration_seconds_bucket{_format_labels(pairs + [("le", "+Inf")])} {series["count"]}')
+        lines.append(f'akul_request_duration_seconds_sum{_format_labels(pairs)} {_number(series["seconds"])}')
+        lines.append(f'akul_request_duration_seconds_count{_format_labels(pairs)} {series["count"]}')
+
+    samples = [
+        (name, 'counter', help_text, dict(zip(LABEL_NAMES, labels)), series[key])
+        for name, key, help_text in SERIES_COUNTERS
+        for labels, series in snapshot
+    ]
+    described = set()
+    for name, kind, help_text, sample_labels, value in samples + list(extra_samples):
+        if name not in described:
+            described.add(name)
+            lines += [f'# HELP {name} {help_text}', f'# TYPE {name} {kind}']
+        lines.append(f'{name}{_format_labels(list(sample_labels.items()))} {_number(value)}')
+    return '\n'.join(lines) + '\n'
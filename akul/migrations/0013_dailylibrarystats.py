@@ -0,0 +1,32 @@
+# Generated by Django 6.0.2 on 2026-10-17 10:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('akul', '0012_book_location'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyLibraryStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(unique=True)),
+                ('issues', models.IntegerField(default=0)),
+                ('returns', models.IntegerField(default=0)),
+                ('new_students', models.IntegerField(default=0)),
+                ('penalties', models.IntegerField(default=0)),
+                ('penalty_amount', models.DecimalField(decimal_places=2, default=0.0, max_digits=12)),
+                ('total_students', models.IntegerField(default=0)),
+                ('issued_books', models.IntegerField(default=0)),
+                ('available_copies', models.IntegerField(default=0)),
+                ('overdue_books', models.IntegerField(default=0)),
+            ],
+            options={
+                'ordering': ['date'],
+            },
+        ),
+    ]
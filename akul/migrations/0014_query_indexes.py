@@ -0,0 +1,45 @@
+# Generated by Django 6.0.2 on 2026-10-17 10:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('akul', '0013_dailylibrarystats'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='auditlog',
+            index=models.Index(fields=['timestamp'], name='auditlog_timestamp_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='circulation',
+            index=models.Index(fields=['status', 'due_date'], name='circ_status_due_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='circulation',
+            index=models.Index(condition=models.Q(('status', 'issued')), fields=['due_date'], name='circ_issued_due_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='circulation',
+            index=models.Index(fields=['issue_date', 'id'], name='circ_issue_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='emaillog',
+            index=models.Index(fields=['sent_at'], name='emaillog_sent_at_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['created_at'], name='notif_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='penalty',
+            index=models.Index(fields=['student', 'book', 'status'], name='penalty_stu_book_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='penalty',
+            index=models.Index(condition=models.Q(('status', 'unpaid')), fields=['student', 'book'], name='penalty_unpaid_idx'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 6.0.2 on 2026-10-17 11:02
+
+from django.db import migrations
+
+TRIGRAM_INDEXES = [
+    ('akul_book_title_upper_trgm', 'akul_book', 'UPPER("title") gin_trgm_ops'),
+    ('akul_book_title_trgm', 'akul_book', '"title" gin_trgm_ops'),
+    ('akul_author_name_upper_trgm', 'akul_author', 'UPPER("name") gin_trgm_ops'),
+]
+
+
+def create_trigram_indexes(apps, schema_editor):
+    # Only PostgreSQL has pg_trgm; other backends use the in-memory index in akul.search.
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for name, table, expression in TRIGRAM_INDEXES:
+        schema_editor.execute(f'CREATE INDEX IF NOT EXISTS "{name}" ON "{table}" USING gin ({expression})')
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, table, expression in TRIGRAM_INDEXES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS "{name}"')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('akul', '0014_query_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 6.0.2 on 2026-10-17 14:20
+
+from django.db import migrations, models
+
+
+def keep_first_settings_row(apps, schema_editor):
+    # The app always read LibrarySettings.objects.first(); keep that row as the singleton.
+    LibrarySettings = apps.get_model('akul', 'LibrarySettings')
+    first = LibrarySettings.objects.order_by('id').first()
+    if first is None:
+        return
+    LibrarySettings.objects.exclude(id=first.id).delete()
+    if first.id != 1:
+        LibrarySettings.objects.filter(id=first.id).update(id=1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('akul', '0019_bookneighbor'),
+    ]
+
+    operations = [
+        migrations.RunPython(keep_first_settings_row, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='librarysettings',
+            constraint=models.CheckConstraint(condition=models.Q(('id', 1)), name='librarysettings_singleton'),
+        ),
+    ]
@@ -0,0 +1,91 @@
+# Generated by Django 6.0.2 on 2026-10-17 16:25
+
+from datetime import datetime, timezone as dt_timezone
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.utils import timezone
+
+# (table, partition column, model) of each log converted to monthly range partitions.
+LOG_TABLES = [
+    ('akul_auditlog', 'timestamp', 'AuditLog'),
+    ('akul_emaillog', 'sent_at', 'EmailLog'),
+]
+MONTHS_AHEAD = 2
+
+
+def add_months(month, count):
+    years, month_index = divmod(month.month - 1 + count, 12)
+    return month.replace(year=month.year + years, month=month_index + 1)
+
+
+def month_start(value):
+    value = value.astimezone(dt_timezone.utc)
+    return datetime(value.year, value.month, 1, tzinfo=dt_timezone.utc)
+
+
+def partition_logs(apps, schema_editor):
+    # Declarative partitioning is PostgreSQL only; other backends keep plain tables.
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    now = timezone.now()
+    for table, column, model_name in LOG_TABLES:
+        model = apps.get_model('akul', model_name)
+        old = f'{table}_unpartitioned'
+        schema_editor.execute(f'ALTER TABLE "{table}" RENAME TO "{old}"')
+        schema_editor.execute(f'CREATE TABLE "{table}" (LIKE "{old}" INCLUDING DEFAULTS) PARTITION BY RANGE ("{column}")')
+
+        with schema_editor.connection.cursor() as cursor:
+            cursor.execute(f'SELECT MIN("{column}") FROM "{old}"')
+            oldest = cursor.fetchone()[0] or now
+        month, last = month_start(oldest), add_months(month_start(now), MONTHS_AHEAD)
+        while month <= last:
+            schema_editor.execute(
+                f'CREATE TABLE "{table}_p{month:%Y%m}" PARTITION OF "{table}" '
+                f"FOR VALUES FROM ('{month.isoformat()}') TO ('{add_months(month, 1).isoformat()}')"
+            )
+            month = add_months(month, 1)
+        schema_editor.execute(f'CREATE TABLE "{table}_default" PARTITION OF "{table}" DEFAULT')
+
+        schema_editor.execute(f'INSERT INTO "{table}" SELECT * FROM "{old}"')
+        schema_editor.execute(f'DROP TABLE "{old}"')
+        # The old identity sequence went with the old table.
+        schema_editor.execute(f'CREATE SEQUENCE "{table}_id_seq" OWNED BY "{table}"."id"')
+        schema_editor.execute(f"SELECT setval('\"{table}_id_seq\"', COALESCE((SELECT MAX(id) FROM \"{table}\"), 0) + 1, false)")
+        schema_editor.execute(f'ALTER TABLE "{table}" ALTER COLUMN "id" SET DEFAULT nextval(\'"{table}_id_seq"\')')
+        # A partitioned table's primary key must include the partition column.
+        schema_editor.execute(f'ALTER TABLE "{table}" ADD PRIMARY KEY ("id", "{column}")')
+        for index in model._meta.indexes:
+            schema_editor.add_index(model, index)
+
+
+def unpartition_logs(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for table, column, model_name in LOG_TABLES:
+        model = apps.get_model('akul', model_name)
+        partitioned = f'{table}_partitioned'
+        schema_editor.execute(f'ALTER TABLE "{table}" RENAME TO "{partitioned}"')
+        schema_editor.execute(f'CREATE TABLE "{table}" (LIKE "{partitioned}" INCLUDING DEFAULTS)')
+        schema_editor.execute(f'INSERT INTO "{table}" SELECT * FROM "{partitioned}"')
+        schema_editor.execute(f'ALTER SEQUENCE "{table}_id_seq" OWNED BY "{table}"."id"')
+        schema_editor.execute(f'DROP TABLE "{partitioned}"')
+        schema_editor.execute(f'ALTER TABLE "{table}" ADD PRIMARY KEY ("id")')
+        for index in model._meta.indexes:
+            schema_editor.add_index(model, index)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('akul', '0022_auditlog_structured_fields'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='outboundemail',
+            name='email_log',
+            field=models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.SET_NULL, to='akul.emaillog'),
+        ),
+        migrations.RunPython(partition_logs, unpartition_logs),
+    ]
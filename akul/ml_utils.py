@@ -1,51 +1,57 @@
-from django.db.models import Count
-from .models import Circulation, Book
+from django.db.models import Count, Sum
+from .models import Circulation, Book, BookNeighbor
+from . import content_similarity
+from .recommender import recommend_for_students
+
+# Both lookups read the BookNeighbor table that akul.recommender refreshes
+# offline, so no co-borrow counting happens at request time.
+
+def popular_books(limit=3, exclude=()):
+    return list(
+        Book.objects.filter(available_quantity__gt=0).exclude(id__in=exclude)
+        .annotate(borrow_count=Count('circulation')).select_related('author')
+        .order_by('-borrow_count', 'id')[:limit]
+    )
+
+def books_in_order(book_ids):
+    books = Book.objects.select_related('author').in_bulk(book_ids)
+    return [books[book_id] for book_id in book_ids if book_id in books]
 
 def get_recommendations_for_student(student_id, limit=3):
     # Get all books the student has borrowed
-    student_history = Circulation.objects.filter(student_id=student_id).values_list('book_id', flat=True)
-    
+    student_history = set(Circulation.objects.filter(student_id=student_id).values_list('book_id', flat=True))
+
     if not student_history:
         # Cold start: Recommend the most popular books overall if no history exists
-        return Book.objects.annotate(
-            borrow_count=Count('circulation')
-        ).filter(available_quantity__gt=0).order_by('-borrow_count')[:limit]
-
-    # Collaborative Filtering: Find other students who borrowed the same books
-    similar_students = Circulation.objects.filter(
-        book_id__in=student_history
-    ).exclude(student_id=student_id).values_list('student_id', flat=True)
-
-    # Find what those similar students borrowed, that the current student HAS NOT read
-    recommended_books = Book.objects.filter(
-        circulation__student_id__in=similar_students,
-        available_quantity__gt=0
-    ).exclude(
-        id__in=student_history
-    ).annotate(
-        match_score=Count('circulation')
-    ).order_by('-match_score')[:limit]
-
-    # Fallback to Content-based (Author) if not enough matches
-    if not recommended_books.exists():
-        authors_read = Book.objects.filter(id__in=student_history).values_list('author_id', flat=True)
-        recommended_books = Book.objects.filter(
-            author_id__in=authors_read,
-            available_quantity__gt=0
-        ).exclude(id__in=student_history).order_by('?')[:limit]
-
-    return recommended_books
+        return popular_books(limit)
+
+    # Collaborative Filtering: sum the similarity of every stored neighbour of the
+    # books already read, leaving out what the student HAS read
+    scored = (
+        BookNeighbor.objects.filter(book_id__in=student_history, neighbor__available_quantity__gt=0)
+        .exclude(neighbor_id__in=student_history)
+        .values('neighbor_id').annotate(match_score=Sum('score'))
+        .order_by('-match_score', 'neighbor_id')[:limit]
+    )
+    ranked_ids = [row['neighbor_id'] for row in scored]
+    if ranked_ids:
+        return books_in_order(ranked_ids)
+
+    # Fallback to Content-based (author, publisher and title similarity) if not enough matches
+    return books_in_order(content_similarity.similar_books(student_history, limit))
 
 def get_similar_books(book_id, limit=3):
-    # Find students who borrowed this specific book
-    students_who_borrowed = Circulation.objects.filter(book_id=book_id).values_list('student_id', flat=True)
-    
-    if not students_who_borrowed:
-        return Book.objects.none()
-
-    # Recommend other books those specific students have read
-    return Book.objects.filter(
-        circulation__student_id__in=students_who_borrowed
-    ).exclude(
-        id=book_id
-    ).annotate(match_score=Count('circulation')).order_by('-match_score')[:limit]
\ No newline at end of file
+    neighbors = (
+        BookNeighbor.objects.filter(book_id=book_id).select_related('neighbor__author').order_by('rank')[:limit]
+    )
+    similar = [row.neighbor for row in neighbors]
+    if not similar and book_id:
+        # Never borrowed alongside anything yet: fall back to content similarity.
+        similar = books_in_order(content_similarity.get_index().rank([int(book_id)], limit=limit))
+    return similar
+
+def get_recommendations_for_students(student_ids=None, limit=3):
+    """Batch form of get_recommendations_for_student: {student_id: [Book, ...]}."""
+    ranked = recommend_for_students(student_ids, limit)
+    books = Book.objects.select_related('author').in_bulk({book_id for ids in ranked.values() for book_id in ids})
+    return {student_id: [books[book_id] for book_id in ids if book_id in books] for student_id, ids in ranked.items()}
@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils import timezone
 
 class Author(models.Model):
     name = models.CharField(max_length=100)
@@ -52,6 +53,13 @@ class Circulation(models.Model):
     fine_amount = models.DecimalField(max_digits=6, decimal_places=2, default=0.00)
     remarks = models.TextField(blank=True, null=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'due_date'], name='circ_status_due_idx'),
+            models.Index(fields=['due_date'], condition=models.Q(status='issued'), name='circ_issued_due_idx'),
+            models.Index(fields=['issue_date', 'id'], name='circ_issue_date_idx'),
+        ]
+
     def __str__(self):
         return f"{self.student.name} - {self.book.title}"
 
@@ -83,6 +91,12 @@ class Penalty(models.Model):
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='unpaid')
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['student', 'book', 'status'], name='penalty_stu_book_status_idx'),
+            models.Index(fields=['student', 'book'], condition=models.Q(status='unpaid'), name='penalty_unpaid_idx'),
+        ]
+
     def __str__(self):
         return f"Penalty: {self.student.name} - {self.amount}"
 
@@ -96,21 +110,51 @@ class LibrarySettings(models.Model):
     max_books = models.IntegerField(default=3)
     enable_emails = models.BooleanField(default=True)
 
+    # There is exactly one settings row and it always has this primary key.
+    SINGLETON_ID = 1
+
+    class Meta:
+        constraints = [
+            models.CheckConstraint(condition=models.Q(id=1), name='librarysettings_singleton'),
+        ]
+
+    def save(self, *args, **kwargs):
+        self.pk = self.SINGLETON_ID
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return "Library Settings"
 
 class Notification(models.Model):
     message = models.TextField()
+    # SHA-1 of the day and message for notices that must appear once a day; NULL otherwise.
+    dedup_key = models.CharField(max_length=40, null=True, blank=True, unique=True)
     created_at = models.DateTimeField(auto_now_add=True)
     read = models.BooleanField(default=False)
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['created_at'], name='notif_created_idx'),
+        ]
 
 class AuditLog(models.Model):
     username = models.CharField(max_length=150)
     action = models.CharField(max_length=500)
-    timestamp = models.DateTimeField(auto_now_add=True)
+    # Structured copy of the action for filtering; blank on entries older than these columns.
+    verb = models.CharField(max_length=30, blank=True, default='')
+    object_type = models.CharField(max_length=30, blank=True, default='')
+    object_id = models.BigIntegerField(null=True, blank=True)
+    # Stamped when the action is logged, not when its buffered batch is written.
+    timestamp = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['timestamp'], name='auditlog_timestamp_idx'),
+            models.Index(fields=['username', 'timestamp'], name='auditlog_user_time_idx'),
+            models.Index(fields=['verb', 'timestamp'], name='auditlog_verb_time_idx'),
+            models.Index(fields=['object_type', 'object_id', 'timestamp'], name='auditlog_object_time_idx'),
+        ]
 
     def __str__(self):
         return f"{self.username} - {self.action} at {self.timestamp}"
@@ -121,5 +165,120 @@ class EmailLog(models.Model):
     message = models.TextField()
     sent_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['sent_at'], name='emaillog_sent_at_idx'),
+        ]
+
     def __str__(self):
         return f"{self.subject} to {self.recipient}"
+
+class DailyLibraryStats(models.Model):
+    date = models.DateField(unique=True)
+    issues = models.IntegerField(default=0)
+    returns = models.IntegerField(default=0)
+    new_students = models.IntegerField(default=0)
+    penalties = models.IntegerField(default=0)
+    penalty_amount = models.DecimalField(max_digits=12, decimal_places=2, default=0.00)
+    total_students = models.IntegerField(default=0)
+    issued_books = models.IntegerField(default=0)
+    available_copies = models.IntegerField(default=0)
+    overdue_books = models.IntegerField(default=0)
+
+    class Meta:
+        ordering = ['date']
+
+    def __str__(self):
+        return f"Library stats for {self.date}"
+
+class ScheduledJob(models.Model):
+    name = models.CharField(max_length=100, unique=True)
+    schedule = models.CharField(max_length=100, help_text="Cron expression: minute hour day-of-month month day-of-week")
+    enabled = models.BooleanField(default=True)
+    next_run_at = models.DateTimeField(null=True, blank=True)
+    last_run_at = models.DateTimeField(null=True, blank=True)
+    last_status = models.CharField(max_length=10, blank=True, default='')
+    last_error = models.TextField(blank=True, default='')
+
+    def __str__(self):
+        return f"{self.name} ({self.schedule})"
+
+class OutboundEmail(models.Model):
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('sending', 'Sending'),
+        ('sent', 'Sent'),
+        ('failed', 'Failed'),
+    ]
+    recipient = models.EmailField()
+    subject = models.CharField(max_length=255)
+    message = models.TextField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    attempts = models.IntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+    # No database constraint: PostgreSQL cannot reference a partitioned table by id alone.
+    email_log = models.ForeignKey(EmailLog, on_delete=models.SET_NULL, null=True, blank=True, db_constraint=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='outbox_status_next_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.subject} to {self.recipient} ({self.status})"
+
+class ReportJob(models.Model):
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+    cache_key = models.CharField(max_length=64)
+    params = models.JSONField(default=dict)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    file_path = models.CharField(max_length=500, blank=True, default='')
+    error = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['cache_key', 'status'], name='report_key_status_idx'),
+            models.Index(fields=['status', 'created_at'], name='report_status_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"Report {self.cache_key[:12]} ({self.status})"
+
+class BookNeighbor(models.Model):
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='neighbors')
+    neighbor = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='+')
+    rank = models.PositiveSmallIntegerField()
+    score = models.FloatField()
+    co_borrowers = models.IntegerField()
+
+    class Meta:
+        ordering = ['book', 'rank']
+        constraints = [
+            models.UniqueConstraint(fields=['book', 'neighbor'], name='bookneighbor_unique_pair'),
+        ]
+        indexes = [
+            models.Index(fields=['book', 'rank'], name='bookneighbor_book_rank_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.book_id} -> {self.neighbor_id} ({self.score:.3f})"
+
+class SharedCounter(models.Model):
+    # Named integers every worker process reads: data versions for the in-memory
+    # indexes and report cache, and the dashboard summary counters.
+    name = models.CharField(max_length=100, unique=True)
+    value = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.name} = {self.value}"
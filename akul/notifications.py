@@ -0,0 +1,75 @@
+import hashlib
+from datetime import date
+
+from django.core.cache import cache
+
+from .models import Notification
+
+# Rows kept by trim() and shown in the bell dropdown.
+FEED_SIZE = 50
+FEED_CACHE_KEY = 'akul:notifications:feed'
+FEED_TTL = 300
+
+
+def dedup_key(message, day=None):
+    day = day or date.today()
+    return hashlib.sha1(f'{day.isoformat()}:{message}'.encode()).hexdigest()
+
+
+def add_notifications(messages, dedup=False):
+    """
+    Stores ``messages`` in a single INSERT. With ``dedup`` a message already
+    posted today is dropped by the unique index on its key instead of being
+    looked up first. Old rows are removed by trim(), not here.
+    """
+    messages = list(dict.fromkeys(messages))
+    if not messages:
+        return
+    Notification.objects.bulk_create(
+        [Notification(message=message, dedup_key=dedup_key(message) if dedup else None) for message in messages],
+        ignore_conflicts=dedup,
+    )
+    invalidate()
+
+
+def add_notification(message, dedup=False):
+    add_notifications([message], dedup)
+
+
+def get_feed():
+    """The latest notifications and the unread count, as one cache read."""
+    feed = cache.get(FEED_CACHE_KEY)
+    if feed is None:
+        feed = {
+            'notifications': list(Notification.objects.order_by('-created_at', '-id')[:FEED_SIZE]),
+            'unread_count': Notification.objects.filter(read=False).count(),
+        }
+        cache.set(FEED_CACHE_KEY, feed, timeout=FEED_TTL)
+    return feed
+
+
+def mark_read(notification_id=None):
+    notifications = Notification.objects.filter(read=False)
+    if notification_id is not None:
+        notifications = notifications.filter(id=notification_id)
+    notifications.update(read=True)
+    invalidate()
+
+
+def clear():
+    Notification.objects.all().delete()
+    invalidate()
+
+
+def trim(keep=FEED_SIZE):
+    """Deletes everything older than the newest ``keep`` rows in one statement."""
+    cutoff = list(Notification.objects.order_by('-id').values_list('id', flat=True)[keep:keep + 1])
+    if not cutoff:
+        return 0
+    deleted, _ = Notification.objects.filter(id__lte=cutoff[0]).delete()
+    invalidate()
+    return deleted
+
+
+def invalidate():
+    cache.delete(FEED_CACHE_KEY)
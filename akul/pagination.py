@@ -0,0 +1,80 @@
+import base64
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+PAGE_SIZE = 25
+
+
+def encode_cursor(values, direction):
+    payload = json.dumps({'v': values, 'd': direction}, default=str)
+    return base64.urlsafe_b64encode(payload.encode()).decode()
+
+
+def decode_cursor(token):
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(token.encode()).decode())
+        return payload['v'], payload['d']
+    except (ValueError, KeyError, TypeError):
+        return None, None
+
+
+def _seek_filter(ordering, values, forward):
+    # Rows strictly after (or before) the cursor row in the given ordering:
+    # (a > x) OR (a = x AND b > y) OR ... with per-field direction.
+    condition = Q()
+    for i, field in enumerate(ordering):
+        name = field.lstrip('-')
+        descending = field.startswith('-')
+        lookup = 'lt' if descending == forward else 'gt'
+        clause = Q(**{f'{name}__{lookup}': values[i]})
+        for prev_field, prev_value in zip(ordering[:i], values[:i]):
+            clause &= Q(**{prev_field.lstrip('-'): prev_value})
+        condition |= clause
+    return condition
+
+
+def _reverse(ordering):
+    return [field[1:] if field.startswith('-') else f'-{field}' for field in ordering]
+
+
+def keyset_page(queryset, ordering, cursor=None, page_size=PAGE_SIZE):
+    """
+    Returns one page of ``queryset`` plus next/prev cursors. ``ordering`` must
+    end with a unique field (normally ``id``) so every row has a distinct key.
+    """
+    values, direction = decode_cursor(cursor) if cursor else (None, None)
+    if not isinstance(values, list) or len(values) != len(ordering):
+        values, direction = None, None
+    if values is not None:
+        try:
+            seek = queryset.filter(_seek_filter(ordering, values, forward=direction != 'prev'))
+        except (ValidationError, ValueError, TypeError):
+            # A decodable token whose values don't fit the fields is treated like no cursor.
+            values, direction = None, None
+
+    if values is None:
+        rows = list(queryset.order_by(*ordering)[:page_size + 1])
+        has_more = len(rows) > page_size
+        rows = rows[:page_size]
+        has_next, has_prev = has_more, False
+    elif direction == 'prev':
+        rows = list(seek.order_by(*_reverse(ordering))[:page_size + 1])
+        has_more = len(rows) > page_size
+        rows = rows[:page_size][::-1]
+        has_next, has_prev = True, has_more
+    else:
+        rows = list(seek.order_by(*ordering)[:page_size + 1])
+        has_more = len(rows) > page_size
+        rows = rows[:page_size]
+        has_next, has_prev = has_more, True
+
+    def row_key(row):
+        return [getattr(row, field.lstrip('-')) for field in ordering]
+
+    return {
+        'rows': rows,
+        'next_cursor': encode_cursor(row_key(rows[-1]), 'next') if rows and has_next else None,
+        'prev_cursor': encode_cursor(row_key(rows[0]), 'prev') if rows and has_prev else None,
+    }
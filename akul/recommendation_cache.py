@@ -0,0 +1,102 @@
+import threading
+
+from django.core.cache import caches
+
+from . import ml_utils
+
+CACHE_ALIAS = 'recommendations'
+GLOBAL_VERSION_KEY = 'recs:version:all'
+
+_counters = {}
+_counters_lock = threading.Lock()
+
+
+def get_cache():
+    return caches[CACHE_ALIAS]
+
+
+def _version_key(kind, object_id):
+    return f'recs:version:{kind}:{object_id}'
+
+
+def _bump(key):
+    cache = get_cache()
+    # add() is a no-op when the key exists; incr() then makes the bump atomic on shared backends.
+    cache.add(key, 0, timeout=None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, timeout=None)
+
+
+def invalidate_student(student_id):
+    _bump(_version_key('student', student_id))
+
+
+def invalidate_book(book_id):
+    _bump(_version_key('book', book_id))
+
+
+def invalidate_all(**kwargs):
+    _bump(GLOBAL_VERSION_KEY)
+
+
+def _record(kind, hit):
+    with _counters_lock:
+        counts = _counters.setdefault(kind, {'hits': 0, 'misses': 0})
+        counts['hits' if hit else 'misses'] += 1
+
+
+def stats():
+    """Per-kind hits, misses and hit rate seen by this process."""
+    with _counters_lock:
+        return {
+            kind: dict(counts, hit_rate=counts['hits'] / (counts['hits'] + counts['misses']))
+            for kind, counts in _counters.items()
+        }
+
+
+def reset_stats():
+    with _counters_lock:
+        _counters.clear()
+
+
+def _cached(kind, object_id, limit, compute):
+    cache = get_cache()
+    version_key = _version_key(kind, object_id)
+    versions = cache.get_many([GLOBAL_VERSION_KEY, version_key])
+    # Entries are never deleted on invalidation; bumping a version just makes their key unreachable.
+    key = f'recs:{kind}:{object_id}:{limit}:{versions.get(GLOBAL_VERSION_KEY, 0)}:{versions.get(version_key, 0)}'
+    data = cache.get(key)
+    _record(kind, data is not None)
+    if data is None:
+        data = [{'id': b.id, 'title': b.title, 'author': b.author.name if b.author else 'Unknown'} for b in compute()]
+        cache.set(key, data)
+    return data
+
+
+def recommendations_for_student(student_id, limit=3):
+    return _cached('student', student_id, limit, lambda: ml_utils.get_recommendations_for_student(student_id, limit))
+
+
+def similar_books(book_id, limit=3):
+    return _cached('book', book_id, limit, lambda: ml_utils.get_similar_books(book_id, limit))
+
+
+def circulation_saved(sender, instance, **kwargs):
+    # The borrower's history changed; availability is handled by book_saved.
+    invalidate_student(instance.student_id)
+    invalidate_book(instance.book_id)
+
+
+def book_saved(sender, instance, created, **kwargs):
+    """
+    Recommendations only show books on the shelf, so every cached list goes
+    stale when a book is added or its availability flips between zero and
+    non-zero. Other copy count changes leave them valid.
+    """
+    previous = getattr(instance, '_stats_available', None)
+    if created or previous is None or (int(previous) > 0) != (int(instance.available_quantity) > 0):
+        invalidate_all()
+    else:
+        invalidate_book(instance.id)
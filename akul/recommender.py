@@ -0,0 +1,228 @@
+import heapq
+import math
+from collections import defaultdict
+from datetime import date
+
+from django.db import transaction
+from django.db.models import Count
+
+from . import content_similarity
+from .models import Book, BookNeighbor, Circulation, Student
+
+try:
+    import numpy as np
+    from scipy import sparse
+    HAS_SCIPY = True
+except ImportError:
+    HAS_SCIPY = False
+
+TOP_K = 20
+
+
+def borrow_pairs():
+    """Distinct (student_id, book_id) pairs; repeat loans of a book count once."""
+    return Circulation.objects.values_list('student_id', 'book_id').distinct().order_by().iterator(chunk_size=5000)
+
+
+def _scipy_neighbors(pairs, book_ids, k):
+    students, books = zip(*pairs)
+    student_index = {student_id: i for i, student_id in enumerate(set(students))}
+    book_list = sorted(set(books))
+    book_index = {book_id: i for i, book_id in enumerate(book_list)}
+    rows = np.fromiter((student_index[s] for s in students), dtype=np.int64, count=len(students))
+    cols = np.fromiter((book_index[b] for b in books), dtype=np.int64, count=len(books))
+    borrowed = sparse.csr_matrix(
+        (np.ones(len(rows), dtype=np.float64), (rows, cols)), shape=(len(student_index), len(book_list)),
+    )
+    popularity = np.asarray(borrowed.sum(axis=0)).ravel()
+
+    targets = book_list if book_ids is None else [b for b in book_ids if b in book_index]
+    if not targets:
+        return {}
+    target_cols = [book_index[b] for b in targets]
+    # (targets x books) co-borrow counts: how many students read both.
+    co_counts = (borrowed[:, target_cols].T @ borrowed).tocsr()
+
+    neighbors = {}
+    for row, book_id in enumerate(targets):
+        start, end = co_counts.indptr[row], co_counts.indptr[row + 1]
+        cols_row, counts = co_counts.indices[start:end], co_counts.data[start:end]
+        keep = cols_row != target_cols[row]
+        cols_row, counts = cols_row[keep], counts[keep]
+        if not len(cols_row):
+            neighbors[book_id] = []
+            continue
+        scores = counts / np.sqrt(popularity[target_cols[row]] * popularity[cols_row])
+        best = np.lexsort((cols_row, -scores))[:k]
+        neighbors[book_id] = [(book_list[cols_row[i]], float(scores[i]), int(counts[i])) for i in best]
+    return neighbors
+
+
+def _python_neighbors(pairs, book_ids, k):
+    readers = defaultdict(set)
+    for student_id, book_id in pairs:
+        readers[student_id].add(book_id)
+    popularity = defaultdict(int)
+    for books in readers.values():
+        for book_id in books:
+            popularity[book_id] += 1
+
+    targets = set(popularity) if book_ids is None else set(book_ids) & set(popularity)
+    co_counts = defaultdict(lambda: defaultdict(int))
+    for books in readers.values():
+        for book_id in books & targets:
+            row = co_counts[book_id]
+            for other in books:
+                if other != book_id:
+                    row[other] += 1
+
+    neighbors = {}
+    for book_id in targets:
+        scored = [
+            (count / math.sqrt(popularity[book_id] * popularity[other]), other, count)
+            for other, count in co_counts[book_id].items()
+        ]
+        best = heapq.nsmallest(k, scored, key=lambda item: (-item[0], item[1]))
+        neighbors[book_id] = [(other, score, count) for score, other, count in best]
+    return neighbors
+
+
+def compute_neighbors(book_ids=None, k=TOP_K):
+    """
+    Top-``k`` co-borrowed books for each book (or just ``book_ids``), scored by
+    cosine similarity of their reader sets. Returns {book_id: [(neighbor_id,
+    score, co_borrowers), ...]} best first.
+    """
+    pairs = list(borrow_pairs())
+    if not pairs:
+        return {}
+    if HAS_SCIPY:
+        return _scipy_neighbors(pairs, book_ids, k)
+    return _python_neighbors(pairs, book_ids, k)
+
+
+def refresh(book_ids=None, k=TOP_K):
+    """
+    Rewrites the stored neighbour lists, for every book or only ``book_ids``.
+    Returns the number of neighbour rows written.
+    """
+    neighbors = compute_neighbors(book_ids, k)
+    rows = [
+        BookNeighbor(book_id=book_id, neighbor_id=neighbor_id, rank=rank, score=score, co_borrowers=count)
+        for book_id, ranked in neighbors.items()
+        for rank, (neighbor_id, score, count) in enumerate(ranked, 1)
+    ]
+    with transaction.atomic():
+        stale = BookNeighbor.objects.all() if book_ids is None else BookNeighbor.objects.filter(book_id__in=list(book_ids))
+        stale.delete()
+        BookNeighbor.objects.bulk_create(rows, batch_size=2000)
+    return len(rows)
+
+
+def books_touched_since(day):
+    """
+    Books whose neighbour lists a loan since ``day`` could have changed: the
+    books issued and everything else their borrowers have read.
+    """
+    recent = Circulation.objects.filter(issue_date__gte=day)
+    students = recent.values('student_id')
+    return set(Circulation.objects.filter(student_id__in=students).values_list('book_id', flat=True).distinct())
+
+
+def refresh_recent(day=None):
+    # A new co-borrow raises both sides' counts, but a neighbour's score also
+    # depends on its popularity; the nightly full refresh settles the rest.
+    book_ids = books_touched_since(day or date.today())
+    return refresh(book_ids) if book_ids else 0
+
+
+def _scipy_scores(history, weights, book_list, available, k):
+    book_index = {book_id: i for i, book_id in enumerate(book_list)}
+    students = list(history)
+    rows, cols = [], []
+    for row, student_id in enumerate(students):
+        for book_id in history[student_id]:
+            if book_id in book_index:
+                rows.append(row)
+                cols.append(book_index[book_id])
+    read = sparse.csr_matrix((np.ones(len(rows)), (rows, cols)), shape=(len(students), len(book_list)))
+    w_rows = [book_index[b] for b, _, _ in weights]
+    w_cols = [book_index[n] for _, n, _ in weights]
+    similarity = sparse.csr_matrix(([score for _, _, score in weights], (w_rows, w_cols)), shape=(len(book_list),) * 2)
+
+    # Every student's score for every book in one product, then masked to
+    # books that are on the shelf and not read yet.
+    scores = read @ similarity
+    available_mask = np.fromiter((book_id in available for book_id in book_list), dtype=np.float64, count=len(book_list))
+    scores = sparse.csr_matrix(scores.multiply(available_mask[np.newaxis, :]))
+    scores = scores - scores.multiply(read)
+    scores.eliminate_zeros()
+
+    books = np.asarray(book_list)
+    result = {}
+    for row, student_id in enumerate(students):
+        start, end = scores.indptr[row], scores.indptr[row + 1]
+        row_books, row_scores = books[scores.indices[start:end]], scores.data[start:end]
+        best = np.lexsort((row_books, -row_scores))[:k]
+        result[student_id] = [int(book_id) for book_id in row_books[best]]
+    return result
+
+
+def _python_scores(history, weights, book_list, available, k):
+    similarity = defaultdict(list)
+    for book_id, neighbor_id, score in weights:
+        similarity[book_id].append((neighbor_id, score))
+    result = {}
+    for student_id, read in history.items():
+        scores = defaultdict(float)
+        for book_id in read:
+            for neighbor_id, score in similarity[book_id]:
+                if neighbor_id in available and neighbor_id not in read:
+                    scores[neighbor_id] += score
+        best = heapq.nsmallest(k, scores.items(), key=lambda item: (-item[1], item[0]))
+        result[student_id] = [book_id for book_id, _ in best]
+    return result
+
+
+def recommend_for_students(student_ids=None, k=3):
+    """
+    Recommends up to ``k`` available, unread books to each student (every
+    student when ``student_ids`` is None) in one pass:
+    the student x book history matrix times the stored neighbour similarities.
+    Students with no history get the most borrowed books; students whose
+    neighbours are all read or out get the closest books by content.
+    Returns {student_id: [book_id, ...]} best first, with a query count that
+    does not depend on the number of students.
+    """
+    loans = Circulation.objects.values_list('student_id', 'book_id').distinct().order_by()
+    if student_ids is None:
+        student_ids = list(Student.objects.values_list('id', flat=True))
+    else:
+        student_ids = list(student_ids)
+        loans = loans.filter(student_id__in=student_ids)
+    history = {student_id: set() for student_id in student_ids}
+    for student_id, book_id in loans.iterator(chunk_size=5000):
+        history[student_id].add(book_id)
+
+    books = dict(Book.objects.values_list('id', 'available_quantity').iterator(chunk_size=5000))
+    available = {book_id for book_id, quantity in books.items() if quantity > 0}
+    weights = list(BookNeighbor.objects.values_list('book_id', 'neighbor_id', 'score').iterator(chunk_size=5000))
+
+    readers = {student_id: read for student_id, read in history.items() if read}
+    if not readers or not weights:
+        result = {student_id: [] for student_id in readers}
+    elif HAS_SCIPY:
+        result = _scipy_scores(readers, weights, sorted(books), available, k)
+    else:
+        result = _python_scores(readers, weights, sorted(books), available, k)
+
+    borrow_counts = dict(Circulation.objects.values_list('book_id').annotate(count=Count('id')).order_by())
+    by_popularity = sorted(available, key=lambda book_id: (-borrow_counts.get(book_id, 0), book_id))
+
+    for student_id in student_ids:
+        read = history[student_id]
+        if not read:
+            result[student_id] = by_popularity[:k]
+        elif not result.get(student_id):
+            result[student_id] = content_similarity.similar_books(read, k, available=available)
+    return result
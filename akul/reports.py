@@ -0,0 +1,226 @@
+import hashlib
+import json
+import os
+from datetime import date, timedelta
+from xml.sax.saxutils import escape
+
+from django.conf import settings
+from django.utils import timezone
+
+from . import counters, versions
+from .dashboard import filter_circulations
+from .models import Book, ReportJob
+
+try:
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import letter
+    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+    from reportlab.pdfbase.pdfmetrics import stringWidth
+    from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, PageBreak
+    HAS_REPORTLAB = True
+except ImportError:
+    HAS_REPORTLAB = False
+
+REPORTS_DIR = getattr(settings, 'REPORTS_DIR', os.path.join(settings.BASE_DIR, 'reports'))
+# Finished reports older than this are deleted by the cleanup in run_pending.
+MAX_AGE = timedelta(days=getattr(settings, 'REPORT_MAX_AGE_DAYS', 7))
+PARAM_NAMES = ['circ_search', 'circ_status', 'circ_sort', 'start_date', 'end_date', 'all_time']
+# ReportLab splits a table once per page it spans; bounded tables keep that linear.
+ROWS_PER_TABLE = 500
+CELL_FONT = 'Helvetica'
+CELL_FONT_SIZE = 9
+CELL_PADDING = 12
+
+CIRCULATION_COLUMNS = [('Student', 100), ('Book', 150), ('Issue Date', 65), ('Due Date', 65),
+                       ('Return Date', 65), ('Status', 60), ('Fine', 40)]
+INVENTORY_COLUMNS = [('Title', 200), ('Author', 120), ('ISBN', 82), ('Total', 50), ('Avail', 50), ('Issued', 50)]
+
+
+class ReportParams:
+    """Stands in for the request so filter_circulations can run outside a view."""
+
+    def __init__(self, params):
+        self.GET = params
+
+
+def report_params(query):
+    return {name: query.get(name) for name in PARAM_NAMES if query.get(name)}
+
+
+VERSION_NAME = 'reports'
+
+
+def data_version():
+    """
+    Fingerprint of the rows a report reads: a shared counter bumped by every
+    save or delete of a book, author, student or loan, plus the date, because
+    overdue status and the statistics page depend on it.
+    """
+    return f'{date.today().isoformat()}:{versions.current(VERSION_NAME)}'
+
+
+def invalidate(**kwargs):
+    """Moves the data version once the surrounding transaction commits."""
+    versions.bump(VERSION_NAME)
+
+
+def cache_key(params, version=None):
+    version = version if version is not None else data_version()
+    payload = json.dumps({'params': params, 'version': version}, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def request_report(params):
+    """
+    Returns the job for these filters and the current data version, reusing a
+    finished or in-flight one when it exists and queueing a new one otherwise.
+    """
+    key = cache_key(params)
+    for job in ReportJob.objects.filter(cache_key=key, status__in=['pending', 'running', 'done']).order_by('-id'):
+        if job.status != 'done' or os.path.exists(job.file_path):
+            return job
+    return ReportJob.objects.create(cache_key=key, params=params)
+
+
+def _styles():
+    normal = getSampleStyleSheet()['Normal']
+    cell = ParagraphStyle('CellStyle', parent=normal, fontName=CELL_FONT, fontSize=CELL_FONT_SIZE, leading=11, alignment=0)
+    header = ParagraphStyle('HeaderStyle', parent=normal, fontSize=10, leading=12, textColor=colors.whitesmoke,
+                            fontName='Helvetica-Bold', alignment=1)
+    return cell, header
+
+
+def _cell(text, width, style):
+    # Paragraphs are only needed for text that has to wrap; plain strings are far cheaper to lay out.
+    if stringWidth(text, CELL_FONT, CELL_FONT_SIZE) <= width - CELL_PADDING:
+        return text
+    return Paragraph(escape(text), style)
+
+
+def _tables(columns, rows, cell_style, header_style):
+    header = [Paragraph(name, header_style) for name, _ in columns]
+    widths = [width for _, width in columns]
+    table_style = TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+        ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+        ('GRID', (0, 0), (-1, -1), 0.5, colors.black),
+        ('FONT', (0, 1), (-1, -1), CELL_FONT, CELL_FONT_SIZE),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
+        ('TOPPADDING', (0, 0), (-1, -1), 6),
+    ])
+    chunk = []
+    emitted = False
+    for row in rows:
+        chunk.append([_cell(text, width, cell_style) for text, width in zip(row, widths)])
+        if len(chunk) == ROWS_PER_TABLE:
+            yield Table([header] + chunk, colWidths=widths, repeatRows=1, style=table_style)
+            chunk = []
+            emitted = True
+    if chunk or not emitted:
+        yield Table([header] + chunk, colWidths=widths, repeatRows=1, style=table_style)
+
+
+def _circulation_rows(params):
+    circulations = filter_circulations(ReportParams(params)).values_list(
+        'student__name', 'book__title', 'issue_date', 'due_date', 'return_date', 'status', 'fine_amount',
+    )
+    for student, title, issue_date, due_date, return_date, status, fine in circulations.iterator(chunk_size=2000):
+        yield [
+            student, title, issue_date.strftime('%Y-%m-%d'), due_date.strftime('%Y-%m-%d'),
+            return_date.strftime('%Y-%m-%d') if return_date else "-", status.title(), f"{fine}" if fine else "-",
+        ]
+
+
+def _inventory_rows():
+    books = Book.objects.order_by('title').values_list('title', 'author__name', 'isbn', 'quantity', 'available_quantity')
+    for title, author, isbn, quantity, available in books.iterator(chunk_size=2000):
+        yield [title, author or "-", isbn or "-", str(quantity), str(available), str(quantity - available)]
+
+
+def build_pdf(params, path):
+    cell_style, header_style = _styles()
+    title_style = getSampleStyleSheet()['Title']
+    counts = counters.get_counters()
+
+    elements = [Paragraph("Circulation Report", title_style), Spacer(1, 12)]
+    elements.extend(_tables(CIRCULATION_COLUMNS, _circulation_rows(params), cell_style, header_style))
+
+    elements += [PageBreak(), Paragraph("Library Statistics", title_style), Spacer(1, 20)]
+    stats_table = Table([
+        [Paragraph("Metric", header_style), Paragraph("Count", header_style)],
+        ["Total Book Titles", str(counts['total_books'])],
+        ["Total Physical Books", str(counts['total_copies'])],
+        ["Books Available", str(counts['available_copies'])],
+        ["Books Issued", str(counts['issued_books'])],
+        ["Books Overdue", str(counts['overdue_books'])],
+        ["Registered Students", str(counts['total_students'])],
+    ], colWidths=[250, 100], hAlign='LEFT')
+    stats_table.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+        ('GRID', (0, 0), (-1, -1), 1, colors.black),
+        ('FONT', (0, 1), (-1, -1), CELL_FONT, CELL_FONT_SIZE),
+        ('PADDING', (0, 0), (-1, -1), 12),
+    ]))
+    elements.append(stats_table)
+
+    elements += [PageBreak(), Paragraph("Book Inventory Details", title_style), Spacer(1, 12)]
+    elements.extend(_tables(INVENTORY_COLUMNS, _inventory_rows(), cell_style, header_style))
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    partial = path + '.part'
+    doc = SimpleDocTemplate(partial, pagesize=letter, rightMargin=30, leftMargin=30, topMargin=30, bottomMargin=30)
+    doc.build(elements)
+    os.replace(partial, path)
+
+
+def generate(job):
+    """Renders one claimed job to disk and records the outcome."""
+    path = os.path.join(REPORTS_DIR, f'{job.pk}-{job.cache_key[:16]}.pdf')
+    try:
+        build_pdf(job.params, path)
+    except Exception as e:
+        ReportJob.objects.filter(pk=job.pk).update(status='failed', error=str(e), finished_at=timezone.now())
+        return False
+    ReportJob.objects.filter(pk=job.pk).update(status='done', file_path=path, finished_at=timezone.now())
+    return True
+
+
+def requeue_stuck(older_than=timedelta(minutes=30)):
+    """Puts back jobs left running by a worker that died mid-render."""
+    cutoff = timezone.now() - older_than
+    return ReportJob.objects.filter(status='running', started_at__lt=cutoff).update(status='pending')
+
+
+def claim_next():
+    for job in ReportJob.objects.filter(status='pending').order_by('created_at', 'id')[:10]:
+        if ReportJob.objects.filter(pk=job.pk, status='pending').update(status='running', started_at=timezone.now()):
+            return job
+    return None
+
+
+def cleanup(now=None):
+    cutoff = (now or timezone.now()) - MAX_AGE
+    old = ReportJob.objects.filter(created_at__lt=cutoff).exclude(status__in=['pending', 'running'])
+    for path in old.exclude(file_path='').values_list('file_path', flat=True):
+        if os.path.exists(path):
+            os.remove(path)
+    return old.delete()[0]
+
+
+def run_pending():
+    """Generates every queued report. Returns the number rendered."""
+    if not HAS_REPORTLAB:
+        ReportJob.objects.filter(status='pending').update(
+            status='failed', error="The 'reportlab' library is missing. Please install it using: pip install reportlab",
+        )
+        return 0
+    requeue_stuck()
+    done = 0
+    while True:
+        job = claim_next()
+        if job is None:
+            break
+        done += generate(job)
+    cleanup()
+    return done
@@ -0,0 +1,119 @@
+import time
+import traceback
+import zlib
+from contextlib import contextmanager
+
+from django.db import close_old_connections, connection
+from django.utils import timezone
+
+from . import tasks
+from .cron import CronSchedule
+from .models import ScheduledJob
+
+# name -> (default cron schedule, callable). The schedule stored on the
+# ScheduledJob row wins once the row exists, so it can be edited in the admin.
+JOBS = {
+    'due_reminders': ('0 8 * * *', tasks.send_due_reminders),
+    'overdue_penalties': ('5 8 * * *', tasks.apply_overdue_penalties),
+    'monthly_recommendations': ('0 9 1 * *', tasks.send_monthly_recommendations),
+    'trim_notifications': ('*/10 * * * *', tasks.trim_notifications),
+    'daily_stats': ('10 0 * * *', tasks.refresh_daily_stats),
+    'send_emails': ('* * * * *', tasks.send_queued_emails),
+    'reports': ('* * * * *', tasks.generate_reports),
+    'book_neighbors': ('30 1 * * *', tasks.refresh_book_neighbors),
+    'recent_book_neighbors': ('15 * * * *', tasks.refresh_recent_book_neighbors),
+    'log_partitions': ('45 2 * * *', tasks.ensure_log_partitions),
+    'reconcile_counters': ('*/15 * * * *', tasks.reconcile_counters),
+}
+
+ADVISORY_LOCK_KEY = zlib.crc32(b'akul.scheduler')
+
+
+def sync_jobs(now=None):
+    """Creates missing job rows and schedules any row without a next run."""
+    now = now or timezone.now()
+    for name, (schedule, func) in JOBS.items():
+        ScheduledJob.objects.get_or_create(
+            name=name,
+            defaults={'schedule': schedule, 'next_run_at': CronSchedule(schedule).next_after(now)},
+        )
+    for job in ScheduledJob.objects.filter(next_run_at__isnull=True):
+        job.next_run_at = CronSchedule(job.schedule).next_after(now)
+        job.save(update_fields=['next_run_at'])
+
+
+@contextmanager
+def scheduler_lock():
+    """
+    Yields True if this process may run jobs. On PostgreSQL a session advisory
+    lock keeps a second worker idle; elsewhere every worker proceeds and the
+    per-job claim in run_due_jobs stops double runs.
+    """
+    if connection.vendor != 'postgresql':
+        yield True
+        return
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT pg_try_advisory_lock(%s)', [ADVISORY_LOCK_KEY])
+        acquired = cursor.fetchone()[0]
+    try:
+        yield acquired
+    finally:
+        if acquired:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT pg_advisory_unlock(%s)', [ADVISORY_LOCK_KEY])
+
+
+def claim(job, now):
+    """
+    Moves the job's next_run_at forward if nobody else has. A run that was
+    missed while no worker was up is caught up once, not once per missed slot.
+    """
+    next_run_at = CronSchedule(job.schedule).next_after(now)
+    claimed = ScheduledJob.objects.filter(pk=job.pk, next_run_at=job.next_run_at).update(next_run_at=next_run_at)
+    job.next_run_at = next_run_at
+    return bool(claimed)
+
+
+def run_job(job):
+    func = JOBS[job.name][1]
+    started = timezone.now()
+    try:
+        func()
+        status, error = 'success', ''
+    except Exception as e:
+        status, error = 'failed', traceback.format_exc()
+        print(f"[SCHEDULER] {job.name} failed: {e}")
+    ScheduledJob.objects.filter(pk=job.pk).update(last_run_at=started, last_status=status, last_error=error)
+    return status
+
+
+def run_due_jobs(now=None):
+    """Runs every enabled job whose next_run_at has passed. Returns the names run."""
+    now = now or timezone.now()
+    ran = []
+    with scheduler_lock() as acquired:
+        if not acquired:
+            return ran
+        due = ScheduledJob.objects.filter(enabled=True, next_run_at__lte=now, name__in=list(JOBS)).order_by('next_run_at')
+        for job in due:
+            if claim(job, now):
+                run_job(job)
+                ran.append(job.name)
+    return ran
+
+
+def run_now(name):
+    job = ScheduledJob.objects.get(name=name)
+    return run_job(job)
+
+
+def run_forever(interval=30):
+    sync_jobs()
+    while True:
+        close_old_connections()
+        try:
+            for name in run_due_jobs():
+                print(f"[SCHEDULER] Ran {name}")
+        except Exception as e:
+            print(f"[SCHEDULER] Error: {e}")
+        time.sleep(interval)
@@ -0,0 +1,198 @@
+import re
+import threading
+from bisect import bisect_left
+from collections import defaultdict
+
+from django.db import connection
+from django.db.models import Case, FloatField, Q, Value, When
+from django.db.models.functions import Greatest
+
+from . import versions
+from .models import Author, Book
+
+TOKEN_RE = re.compile(r'\w+')
+
+# Relative weight of a hit in each field when ranking results.
+ISBN_WEIGHT = 3.0
+TITLE_WEIGHT = 2.0
+AUTHOR_WEIGHT = 1.0
+
+VERSION_NAME = 'search'
+_index = None
+_index_version = None
+_index_lock = threading.Lock()
+
+
+def tokenize(text):
+    return TOKEN_RE.findall((text or '').lower())
+
+
+def isbn_prefix(query):
+    digits = re.sub(r'[\s-]', '', query)
+    return digits if digits.isdigit() or (digits[:-1].isdigit() and digits[-1:].lower() == 'x') else ''
+
+
+def search_books(queryset, query):
+    """
+    Filters ``queryset`` to books matching ``query`` and annotates a
+    ``search_rank`` (higher is better). ISBN prefixes are matched exactly.
+    """
+    query = (query or '').strip()
+    if not query:
+        return queryset
+    if connection.vendor == 'postgresql':
+        return _trigram_search(queryset, query)
+    return _inverted_index_search(queryset, query)
+
+
+def _trigram_search(queryset, query):
+    # icontains compiles to UPPER(col) LIKE, which the UPPER(...) gin_trgm_ops
+    # indexes serve; trigram_similar uses the plain title index for typos.
+    from django.contrib.postgres.search import TrigramSimilarity
+
+    authors = Author.objects.filter(name__icontains=query).values('id')
+    condition = Q(title__icontains=query) | Q(title__trigram_similar=query) | Q(author__in=authors)
+    isbn = isbn_prefix(query)
+    if isbn:
+        condition |= Q(isbn__startswith=isbn)
+
+    rank = Greatest(
+        TrigramSimilarity('title', query) * TITLE_WEIGHT,
+        TrigramSimilarity('author__name', query) * AUTHOR_WEIGHT,
+    )
+    if isbn:
+        rank = rank + Case(When(isbn__startswith=isbn, then=Value(ISBN_WEIGHT)), default=Value(0.0))
+    return queryset.filter(condition).annotate(search_rank=rank).order_by('-search_rank', '-id')
+
+
+class InvertedIndex:
+    """
+    In-memory token index over book titles, author names and ISBNs. Query
+    tokens match index tokens by prefix through a sorted token list.
+    """
+
+    def __init__(self, books=()):
+        self.postings = defaultdict(dict)
+        self.isbns = {}
+        self.documents = {}
+        self.terms = {}
+        for book_id, title, author_id, author_name, isbn in books:
+            self._index(book_id, title, author_id, author_name, isbn)
+        self.tokens = sorted(self.postings)
+        self.isbn_keys = sorted(self.isbns)
+
+    def _index(self, book_id, title, author_id, author_name, isbn):
+        self.documents[book_id] = (title, author_id, isbn)
+        self.terms[book_id] = set(tokenize(title)) | set(tokenize(author_name))
+        for token in tokenize(title):
+            self._add(token, book_id, TITLE_WEIGHT)
+        for token in tokenize(author_name):
+            self._add(token, book_id, AUTHOR_WEIGHT)
+        if isbn:
+            self.isbns[isbn.lower()] = book_id
+
+    def _add(self, token, book_id, weight):
+        postings = self.postings[token]
+        postings[book_id] = max(postings.get(book_id, 0.0), weight)
+
+    def remove(self, book_id):
+        document = self.documents.pop(book_id, None)
+        if document is None:
+            return
+        for token in self.terms.pop(book_id):
+            del self.postings[token][book_id]
+            if not self.postings[token]:
+                del self.postings[token]
+                del self.tokens[bisect_left(self.tokens, token)]
+        isbn = (document[2] or '').lower()
+        if self.isbns.get(isbn) == book_id:
+            del self.isbns[isbn]
+            del self.isbn_keys[bisect_left(self.isbn_keys, isbn)]
+
+    def update(self, book):
+        if self.documents.get(book.id) == (book.title, book.author_id, book.isbn):
+            return
+        self.remove(book.id)
+        self._index(book.id, book.title, book.author_id, book.author.name, book.isbn)
+        self.tokens = sorted(self.postings)
+        self.isbn_keys = sorted(self.isbns)
+
+    def _prefixed(self, keys, prefix):
+        for position in range(bisect_left(keys, prefix), len(keys)):
+            if not keys[position].startswith(prefix):
+                break
+            yield keys[position]
+
+    def search(self, query):
+        scores = None
+        for token in tokenize(query):
+            token_scores = {}
+            for match in self._prefixed(self.tokens, token):
+                exact = 1.0 if match == token else 0.5
+                for book_id, weight in self.postings[match].items():
+                    token_scores[book_id] = max(token_scores.get(book_id, 0.0), weight * exact)
+            if scores is None:
+                scores = token_scores
+            else:
+                # Every query token has to match somewhere in the book.
+                scores = {book_id: score + token_scores[book_id] for book_id, score in scores.items() if book_id in token_scores}
+        scores = scores or {}
+
+        isbn = isbn_prefix(query).lower()
+        if isbn:
+            for key in self._prefixed(self.isbn_keys, isbn):
+                book_id = self.isbns[key]
+                scores[book_id] = scores.get(book_id, 0.0) + ISBN_WEIGHT
+        return scores
+
+
+def get_index():
+    # Saves in this process update the index in place; the shared version
+    # catches writes made by other worker processes.
+    global _index, _index_version
+    version = versions.current(VERSION_NAME)
+    with _index_lock:
+        if _index is None or _index_version != version:
+            books = Book.objects.values_list('id', 'title', 'author_id', 'author__name', 'isbn')
+            _index, _index_version = InvertedIndex(books.iterator()), version
+        return _index
+
+
+def invalidate_index(**kwargs):
+    global _index
+    versions.bump(VERSION_NAME)
+    _index = None
+
+
+def book_saved(sender, instance, **kwargs):
+    # Stock edits leave the document unchanged and skip the rebuild elsewhere.
+    if not versions.changed(instance, 'title', 'isbn', 'author_id'):
+        return
+    versions.bump(VERSION_NAME)
+    with _index_lock:
+        if _index is not None:
+            _index.update(instance)
+
+
+def book_deleted(sender, instance, **kwargs):
+    versions.bump(VERSION_NAME)
+    with _index_lock:
+        if _index is not None:
+            _index.remove(instance.id)
+
+
+def _inverted_index_search(queryset, query):
+    index = get_index()
+    with _index_lock:
+        scores = index.search(query)
+    if not scores:
+        return queryset.none()
+    by_score = defaultdict(list)
+    for book_id, score in scores.items():
+        by_score[round(score, 3)].append(book_id)
+    rank = Case(
+        *[When(id__in=ids, then=Value(score)) for score, ids in by_score.items()],
+        default=Value(0.0),
+        output_field=FloatField(),
+    )
+    return queryset.filter(id__in=list(scores)).annotate(search_rank=rank).order_by('-search_rank', '-id')
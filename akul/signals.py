@@ -0,0 +1,146 @@
+from datetime import date
+from decimal import Decimal
+
+from django.core.signals import request_finished
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import audit, autocomplete, content_similarity, counters, library_settings, recommendation_cache, reports, search, stats
+from .models import Author, Book, Student, Circulation, Penalty, LibrarySettings
+
+
+def _stored_value(instance, field):
+    if instance._state.adding or instance.pk is None:
+        return None
+    return type(instance).objects.filter(pk=instance.pk).values_list(field, flat=True).first()
+
+
+@receiver(pre_save, sender=Book)
+def remember_stored_book(sender, instance, **kwargs):
+    stored = None
+    if not instance._state.adding and instance.pk is not None:
+        stored = Book.objects.filter(pk=instance.pk).values(
+            'available_quantity', 'quantity', 'title', 'isbn', 'author_id', 'publisher_id',
+        ).first()
+    instance._stored_fields = stored
+    instance._stats_available, instance._stats_quantity = (
+        (stored['available_quantity'], stored['quantity']) if stored else (None, None)
+    )
+
+
+@receiver(post_save, sender=Book)
+def book_saved(sender, instance, created, **kwargs):
+    previous = 0 if created else instance._stats_available
+    if previous is not None:
+        stats.record(available_copies=int(instance.available_quantity) - previous)
+
+
+@receiver(post_delete, sender=Book)
+def book_deleted(sender, instance, **kwargs):
+    stats.record(available_copies=-int(instance.available_quantity))
+
+
+@receiver(pre_save, sender=Student)
+def remember_stored_student(sender, instance, **kwargs):
+    stored = None
+    if not instance._state.adding and instance.pk is not None:
+        stored = Student.objects.filter(pk=instance.pk).values('name', 'email').first()
+    instance._stored_fields = stored
+
+
+@receiver(post_save, sender=Student)
+def student_saved(sender, instance, created, **kwargs):
+    if created:
+        stats.record(instance.joined_date, new_students=1, total_students=1)
+
+
+@receiver(post_delete, sender=Student)
+def student_deleted(sender, instance, **kwargs):
+    stats.record(instance.joined_date, new_students=-1, total_students=-1)
+
+
+@receiver(pre_save, sender=Circulation)
+def remember_loan_state(sender, instance, **kwargs):
+    stored = None
+    if not instance._state.adding and instance.pk is not None:
+        stored = Circulation.objects.filter(pk=instance.pk).values_list('status', 'due_date').first()
+    instance._counted_loan = stored
+
+
+def _loan_changes(circulation, sign):
+    if circulation.status != 'issued':
+        return {}
+    overdue = circulation.due_date < date.today()
+    return {'issued_books': sign, 'overdue_books': sign if overdue else 0}
+
+
+@receiver(post_save, sender=Circulation)
+def circulation_saved(sender, instance, created, **kwargs):
+    # Returns are recorded by return_book; only new loans are counted here.
+    if created:
+        stats.record(instance.issue_date, issues=1, **_loan_changes(instance, 1))
+        if instance.return_date:
+            stats.record(instance.return_date, returns=1)
+
+
+@receiver(post_delete, sender=Circulation)
+def circulation_deleted(sender, instance, **kwargs):
+    stats.record(instance.issue_date, issues=-1, **_loan_changes(instance, -1))
+    if instance.return_date:
+        stats.record(instance.return_date, returns=-1)
+
+
+@receiver(pre_save, sender=Penalty)
+def remember_penalty_amount(sender, instance, **kwargs):
+    instance._stats_amount = _stored_value(instance, 'amount')
+
+
+@receiver(post_save, sender=Penalty)
+def penalty_saved(sender, instance, created, **kwargs):
+    day = timezone.localdate(instance.created_at)
+    amount = Decimal(str(instance.amount))
+    if created:
+        stats.record(day, penalties=1, penalty_amount=amount)
+    elif instance._stats_amount is not None:
+        stats.record(day, penalty_amount=amount - instance._stats_amount)
+
+
+@receiver(post_delete, sender=Penalty)
+def penalty_deleted(sender, instance, **kwargs):
+    stats.record(timezone.localdate(instance.created_at), penalties=-1, penalty_amount=-Decimal(str(instance.amount)))
+
+
+post_save.connect(search.book_saved, sender=Book, dispatch_uid='search_index_book_save')
+post_delete.connect(search.book_deleted, sender=Book, dispatch_uid='search_index_book_delete')
+post_save.connect(search.invalidate_index, sender=Author, dispatch_uid='search_index_author_save')
+post_delete.connect(search.invalidate_index, sender=Author, dispatch_uid='search_index_author_delete')
+post_save.connect(autocomplete.book_saved, sender=Book, dispatch_uid='autocomplete_book_save')
+post_delete.connect(autocomplete.book_deleted, sender=Book, dispatch_uid='autocomplete_book_delete')
+post_save.connect(autocomplete.student_saved, sender=Student, dispatch_uid='autocomplete_student_save')
+post_delete.connect(autocomplete.student_deleted, sender=Student, dispatch_uid='autocomplete_student_delete')
+post_save.connect(content_similarity.book_saved, sender=Book, dispatch_uid='content_index_book_save')
+post_delete.connect(content_similarity.invalidate_index, sender=Book, dispatch_uid='content_index_book_delete')
+post_save.connect(recommendation_cache.book_saved, sender=Book, dispatch_uid='recommendation_cache_book_save')
+post_delete.connect(recommendation_cache.invalidate_all, sender=Book, dispatch_uid='recommendation_cache_book_delete')
+post_save.connect(recommendation_cache.circulation_saved, sender=Circulation, dispatch_uid='recommendation_cache_circ_save')
+post_delete.connect(recommendation_cache.circulation_saved, sender=Circulation, dispatch_uid='recommendation_cache_circ_delete')
+post_save.connect(counters.book_saved, sender=Book, dispatch_uid='counters_book_save')
+post_delete.connect(counters.book_deleted, sender=Book, dispatch_uid='counters_book_delete')
+post_save.connect(counters.student_saved, sender=Student, dispatch_uid='counters_student_save')
+post_delete.connect(counters.student_deleted, sender=Student, dispatch_uid='counters_student_delete')
+post_save.connect(counters.circulation_saved, sender=Circulation, dispatch_uid='counters_circ_save')
+post_delete.connect(counters.circulation_deleted, sender=Circulation, dispatch_uid='counters_circ_delete')
+post_save.connect(reports.invalidate, sender=Author, dispatch_uid='reports_author_save')
+post_delete.connect(reports.invalidate, sender=Author, dispatch_uid='reports_author_delete')
+post_save.connect(reports.invalidate, sender=Book, dispatch_uid='reports_book_save')
+post_delete.connect(reports.invalidate, sender=Book, dispatch_uid='reports_book_delete')
+post_save.connect(reports.invalidate, sender=Student, dispatch_uid='reports_student_save')
+post_delete.connect(reports.invalidate, sender=Student, dispatch_uid='reports_student_delete')
+post_save.connect(reports.invalidate, sender=Circulation, dispatch_uid='reports_circ_save')
+post_delete.connect(reports.invalidate, sender=Circulation, dispatch_uid='reports_circ_delete')
+post_save.connect(library_settings.invalidate, sender=LibrarySettings, dispatch_uid='library_settings_save')
+post_delete.connect(library_settings.invalidate, sender=LibrarySettings, dispatch_uid='library_settings_delete')
+
+# Runs after the response has been handed to the client, so the write is off the request path.
+request_finished.connect(audit.flush, dispatch_uid='audit_flush')
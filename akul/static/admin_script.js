@@ -1,3 +1,155 @@
+let overdueData = {};
+let dashboardOptions = null;
+const loadedTabs = {};
+
+function loadTab(pageName, force, cursor) {
+    const container = document.querySelector(`[data-tab-body="${pageName}"]`);
+    if (!container || (loadedTabs[pageName] && !force)) return;
+    loadedTabs[pageName] = true;
+
+    const params = new URLSearchParams(window.location.search);
+    params.delete('tab');
+    params.delete('open_issue');
+    if (cursor) params.set('cursor', cursor);
+
+    fetch(`/dashboard/api/${pageName}/?${params.toString()}`)
+        .then(response => response.json())
+        .then(data => {
+            container.innerHTML = data.html;
+            renderPager(pageName, data);
+        })
+        .catch(error => {
+            loadedTabs[pageName] = false;
+            console.error(`Failed to load ${pageName}`, error);
+        });
+}
+
+function renderPager(pageName, data, pager, loadPage) {
+    pager = pager || document.querySelector(`[data-tab-pager="${pageName}"]`);
+    if (!pager) return;
+    pager.innerHTML = '';
+    loadPage = loadPage || (cursor => loadTab(pageName, true, cursor));
+
+    const addButton = (label, cursor) => {
+        const button = document.createElement('button');
+        button.type = 'button';
+        button.className = 'btn-primary btn-filter';
+        button.textContent = label;
+        button.onclick = () => loadPage(cursor);
+        pager.appendChild(button);
+    };
+
+    if (data.prev_cursor) addButton('← Previous', data.prev_cursor);
+    if (data.next_cursor) addButton('Next →', data.next_cursor);
+}
+
+function loadDashboardOptions() {
+    if (dashboardOptions) return dashboardOptions;
+
+    dashboardOptions = fetch('/dashboard/api/options/')
+        .then(response => response.json())
+        .then(data => {
+            document.querySelectorAll('[data-options]').forEach(element => {
+                fillOptions(element, element.getAttribute('data-options'), data);
+            });
+            return data;
+        })
+        .catch(error => {
+            dashboardOptions = null;
+            console.error('Failed to load form options', error);
+        });
+    return dashboardOptions;
+}
+
+function fillOptions(element, kind, data) {
+    // Keep the static placeholder entry and append the fetched ones.
+    (data[kind] || []).forEach(([id, name]) => {
+        const option = document.createElement('option');
+        option.value = id;
+        option.textContent = name;
+        element.appendChild(option);
+    });
+}
+
+function setupAutocomplete(input) {
+    const field = input.closest('.autocomplete');
+    const hidden = field.querySelector('input[type="hidden"]');
+    const list = field.querySelector('.autocomplete-results');
+    let timer = null;
+    let requestId = 0;
+
+    input.addEventListener('input', () => {
+        hidden.value = '';
+        input.setCustomValidity(input.value ? 'Please choose a match from the list.' : '');
+        clearTimeout(timer);
+        timer = setTimeout(() => {
+            const query = input.value.trim();
+            if (!query) {
+                list.innerHTML = '';
+                return;
+            }
+            const params = new URLSearchParams({q: query});
+            if (input.dataset.available) params.set('available', '1');
+            const current = ++requestId;
+            fetch(`/autocomplete/${input.dataset.autocomplete}/?${params.toString()}`)
+                .then(response => response.json())
+                .then(data => {
+                    if (current === requestId) renderAutocomplete(input, data.results || []);
+                })
+                .catch(error => console.error('Autocomplete failed', error));
+        }, 150);
+    });
+    input.addEventListener('blur', () => setTimeout(() => { list.innerHTML = ''; }, 150));
+    if (input.form) {
+        input.form.addEventListener('reset', () => {
+            input.setCustomValidity('');
+            list.innerHTML = '';
+        });
+    }
+}
+
+function renderAutocomplete(input, results) {
+    const list = input.closest('.autocomplete').querySelector('.autocomplete-results');
+    list.innerHTML = '';
+    if (results.length === 0) {
+        const empty = document.createElement('li');
+        empty.className = 'text-muted';
+        empty.textContent = 'No matches';
+        list.appendChild(empty);
+        return;
+    }
+    results.forEach(result => {
+        const item = document.createElement('li');
+        item.textContent = result.label;
+        item.addEventListener('mousedown', event => {
+            event.preventDefault();
+            pickAutocomplete(input, result);
+        });
+        list.appendChild(item);
+    });
+}
+
+function pickAutocomplete(input, result) {
+    // data-value picks which result field is submitted; the id by default.
+    const field = input.closest('.autocomplete');
+    const hidden = field.querySelector('input[type="hidden"]');
+    hidden.value = result[input.dataset.value || 'id'];
+    hidden.dataset.name = result.name || '';
+    input.value = result.label;
+    input.setCustomValidity('');
+    field.querySelector('.autocomplete-results').innerHTML = '';
+    hidden.dispatchEvent(new Event('change'));
+}
+
+function loadOverdueData() {
+    return fetch('/dashboard/api/overdue/')
+        .then(response => response.json())
+        .then(data => {
+            overdueData = data.overdue_data || {};
+        })
+        .catch(error => console.error('Failed to load overdue data', error));
+}
+
 function checkHash() {
     const urlParams = new URLSearchParams(window.location.search);
     const tab = urlParams.get('tab');
@@ -9,15 +161,16 @@ function checkHash() {
         if (tab === 'circulations' && openIssue === 'true') {
             const isbn = urlParams.get('isbn');
             openIssueBookModal();
-            
-            const bookSelect = document.querySelector('#issueBookModal select[name="book"]');
-            if(bookSelect && isbn) {
+            const bookInput = document.querySelector('#issueBookModal input[data-autocomplete="books"]');
+            if (bookInput && isbn) {
                 const cleanIsbn = isbn.replace(/[^0-9X]/gi, '');
-                const option = Array.from(bookSelect.options).find(opt => {
-                    const optIsbn = opt.getAttribute('data-isbn') || '';
-                    return optIsbn.replace(/[^0-9X]/gi, '') === cleanIsbn;
-                });
-                if (option) bookSelect.value = option.value;
+                fetch(`/autocomplete/books/?available=1&limit=1&q=${encodeURIComponent(cleanIsbn)}`)
+                    .then(response => response.json())
+                    .then(data => {
+                        const match = (data.results || [])[0];
+                        if (match) pickAutocomplete(bookInput, match);
+                    })
+                    .catch(error => console.error('Failed to look up ISBN', error));
             }
             
             const dateInput = document.querySelector('#issueBookModal input[name="issue_date"]');
@@ -28,6 +181,8 @@ function checkHash() {
     } else if (window.location.hash) {
         const pageName = window.location.hash.substring(1);
         if (document.getElementById(pageName)) showPage(pageName);
+    } else {
+        loadTab('dashboard');
     }
 }
 
@@ -44,10 +199,12 @@ document.addEventListener('DOMContentLoaded', function() {
         showPage('books');
     }
 
+    document.querySelectorAll('[data-autocomplete]').forEach(setupAutocomplete);
+
     // AI Recommendations for Issue Book
-    const issueStudentSelect = document.querySelector('#issueBookModal select[name="student"]');
-    if (issueStudentSelect) {
-        issueStudentSelect.addEventListener('change', function() {
+    const issueStudentInput = document.querySelector('#issueBookModal input[name="student"]');
+    if (issueStudentInput) {
+        issueStudentInput.addEventListener('change', function() {
             const studentId = this.value;
             const container = document.getElementById('recommendationContainer');
             const list = document.getElementById('recommendationList');
@@ -68,7 +225,10 @@ document.addEventListener('DOMContentLoaded', function() {
                             list.innerHTML = '';
                             data.recommendations.forEach(book => {
                                 let li = document.createElement('li');
-                                li.innerHTML = `<a href="javascript:void(0)" onclick="selectRecommendedBook('${book.id}')" style="color: #1565c0; text-decoration: none;"><strong>${book.title}</strong> by ${book.author}</a>`;
+                                li.innerHTML = `<a href="javascript:void(0)" style="color: #1565c0; text-decoration: none;"><strong></strong> by <span></span></a>`;
+                                li.querySelector('strong').textContent = book.title;
+                                li.querySelector('span').textContent = book.author;
+                                li.querySelector('a').addEventListener('click', () => selectRecommendedBook(book.id, book.title));
                                 list.appendChild(li);
                             });
                         } else {
@@ -94,10 +254,10 @@ window.addEventListener('popstate', function() {
     }
 });
 
-function selectRecommendedBook(bookId) {
-    const bookSelect = document.querySelector('#issueBookModal select[name="book"]');
-    if (bookSelect) {
-        bookSelect.value = bookId;
+function selectRecommendedBook(bookId, title) {
+    const bookInput = document.querySelector('#issueBookModal input[data-autocomplete="books"]');
+    if (bookInput) {
+        pickAutocomplete(bookInput, bookId, title);
     }
 }
 
@@ -118,6 +278,7 @@ function showPage(pageName) {
     navLinks.forEach(link => link.classList.remove('active'));
 
     document.getElementById(pageName).classList.add('active');
+    loadTab(pageName);
 
     navLinks.forEach(link => {
         const onclick = link.getAttribute('onclick');
@@ -164,14 +325,27 @@ window.addEventListener('click', function (event) {
 
 function openPublisherModal(card) {
     const modal = document.getElementById('publisherBooksModal');
-    const name = card.getAttribute('data-name');
-    const booksHtml = card.querySelector('.publisher-books-data').innerHTML;
-
-    document.getElementById('modalPublisherName').innerText = name;
-    document.getElementById('modalBooksList').innerHTML = booksHtml;
+    document.getElementById('modalPublisherName').innerText = card.getAttribute('data-name');
+    document.getElementById('modalBooksList').innerHTML = '<div class="modal-book-item">Loading...</div>';
+    document.getElementById('modalBooksPager').innerHTML = '';
+    loadPublisherBooks(card.getAttribute('data-id'));
     modal.style.display = "block";
 }
 
+function loadPublisherBooks(publisherId, cursor) {
+    // A publisher's books are fetched a page at a time when its card is opened.
+    const params = new URLSearchParams({publisher_id: publisherId});
+    if (cursor) params.set('cursor', cursor);
+    fetch(`/dashboard/api/publisher_books/?${params.toString()}`)
+        .then(response => response.json())
+        .then(data => {
+            document.getElementById('modalBooksList').innerHTML = data.html;
+            renderPager('publisher_books', data, document.getElementById('modalBooksPager'),
+                        next => loadPublisherBooks(publisherId, next));
+        })
+        .catch(error => console.error('Failed to load publisher books', error));
+}
+
 function closePublisherModal() {
     document.getElementById('publisherBooksModal').style.display = "none";
 }
@@ -239,6 +413,7 @@ function closeAuthorModal() {
 }
 
 function openAddBookModal() {
+    loadDashboardOptions();
     document.getElementById('addBookModal').style.display = "block";
 }
 
@@ -350,7 +525,9 @@ function fillBookForm(title, author, publisher, imageUrl) {
 function openEditBookModal(id, title, authorId, isbn, totalQty, availQty, imageUrl, location) {
     document.getElementById('editBookId').value = id;
     document.getElementById('editBookTitle').value = title;
-    document.getElementById('editBookAuthor').value = authorId;
+    loadDashboardOptions().then(() => {
+        document.getElementById('editBookAuthor').value = authorId;
+    });
     document.getElementById('editBookIsbn').value = isbn;
     document.getElementById('editBookTotalQty').value = totalQty;
     document.getElementById('editBookAvailQty').value = availQty;
@@ -534,79 +711,73 @@ function closeEditStudentModal() {
     }
 }
 
-function openEmailStudentModal(email) {
-    const studentSelect = document.getElementById('emailStudentAddress');
+function openEmailStudentModal(email, name) {
+    loadOverdueData().then(() => selectEmailRecipient(email, name));
+    document.getElementById('emailStudentModal').style.display = "block";
+}
+
+function selectEmailRecipient(email, name) {
+    const studentEmail = document.getElementById('emailStudentAddress');
+    const studentSearch = document.getElementById('emailStudentSearch');
+    const customToggle = document.getElementById('customEmailToggle');
     const customEmailInput = document.getElementById('customEmailAddress');
     
-    if(studentSelect) {
-        studentSelect.value = '';
-        if(customEmailInput) {
-            customEmailInput.value = '';
-            customEmailInput.style.display = 'none';
-        }
+    if(studentEmail) {
+        studentEmail.value = '';
+        studentEmail.dataset.name = '';
+        studentSearch.value = '';
+        customToggle.checked = false;
+        customEmailInput.value = '';
         document.getElementById('emailTemplateSelector').value = 'custom';
         document.getElementById('emailSubject').value = '';
         document.getElementById('emailMessage').value = '';
-        if(document.getElementById('overdueBooksArea')) document.getElementById('overdueBooksArea').style.display = 'none';
-
-        if (email) {
-            let optionExists = false;
-            for (let i = 0; i < studentSelect.options.length; i++) {
-                if (studentSelect.options[i].value === email) {
-                    studentSelect.value = email;
-                    optionExists = true;
-                    break;
-                }
-            }
-            if (!optionExists && customEmailInput) {
-                studentSelect.value = 'custom';
-                customEmailInput.value = email;
-                customEmailInput.style.display = 'block';
-            }
-        }
-        
-        if (typeof updateStudentEmailContext === 'function') {
-            updateStudentEmailContext();
+
+        if (email && name) {
+            pickAutocomplete(studentSearch, {email: email, name: name, label: `${name} (${email})`});
+        } else if (email) {
+            customToggle.checked = true;
+            customEmailInput.value = email;
         }
+        updateStudentEmailContext();
     }
-    
-    document.getElementById('emailStudentModal').style.display = "block";
 }
 
 function updateStudentEmailContext() {
-    const studentSelect = document.getElementById('emailStudentAddress');
+    const studentEmail = document.getElementById('emailStudentAddress');
+    const studentSearch = document.getElementById('emailStudentSearch');
+    const custom = document.getElementById('customEmailToggle').checked;
     const customEmailInput = document.getElementById('customEmailAddress');
     const overdueArea = document.getElementById('overdueBooksArea');
     const overdueList = document.getElementById('overdueBooksList');
     
-    if(!studentSelect) return;
-
-    if (studentSelect.value === 'custom') {
-        if(customEmailInput) {
-            customEmailInput.style.display = 'block';
-            customEmailInput.required = true;
-        }
-        if(overdueArea) overdueArea.style.display = 'none';
+    if(!studentEmail) return;
+
+    customEmailInput.style.display = custom ? 'block' : 'none';
+    customEmailInput.required = custom;
+    studentSearch.required = !custom;
+    studentSearch.disabled = custom;
+    if (custom) {
+        studentEmail.value = '';
+        studentEmail.dataset.name = '';
+        studentSearch.value = '';
+        studentSearch.setCustomValidity('');
     } else {
-        if(customEmailInput) {
-            customEmailInput.style.display = 'none';
-            customEmailInput.required = false;
-        }
-        
-        const email = studentSelect.value;
-        if (typeof overdueData !== 'undefined' && email && overdueData[email] && overdueData[email].length > 0) {
-            if(overdueArea) overdueArea.style.display = 'block';
-            if(overdueList) {
-                overdueList.innerHTML = '';
-                overdueData[email].forEach(function(book) {
-                    let li = document.createElement('li');
-                    li.innerText = book;
-                    overdueList.appendChild(li);
-                });
-            }
-        } else {
-            if(overdueArea) overdueArea.style.display = 'none';
+        customEmailInput.value = '';
+    }
+
+    const email = studentEmail.value;
+    if (!custom && email && overdueData[email] && overdueData[email].length > 0) {
+        if(overdueArea) overdueArea.style.display = 'block';
+        if(overdueList) {
+            overdueList.innerHTML = '';
+            overdueData[email].forEach(function(book) {
+                let li = document.createElement('li');
+                li.innerText = book;
+                overdueList.appendChild(li);
+            });
         }
+    } else if(overdueArea) {
+        overdueArea.style.display = 'none';
     }
     
     const template = document.getElementById('emailTemplateSelector');
@@ -620,13 +791,9 @@ function applyEmailTemplate() {
     const subject = document.getElementById('emailSubject');
     const message = document.getElementById('emailMessage');
     
-    const studentSelect = document.getElementById('emailStudentAddress');
-    let studentName = "Student";
-    let email = studentSelect ? studentSelect.value : '';
-    
-    if (studentSelect && studentSelect.selectedIndex > 0 && studentSelect.value !== 'custom') {
-        studentName = studentSelect.options[studentSelect.selectedIndex].getAttribute('data-name');
-    }
+    const studentEmail = document.getElementById('emailStudentAddress');
+    let email = studentEmail ? studentEmail.value : '';
+    let studentName = (studentEmail && studentEmail.dataset.name) || "Student";
     
     let adminName = typeof currentAdminName !== 'undefined' ? currentAdminName : 'Admin';
     let libraryName = typeof currentLibraryName !== 'undefined' ? currentLibraryName : 'Library';
@@ -667,6 +834,9 @@ function closeGenerateReportModal() {
         modal.style.display = "none";
         const form = modal.querySelector('form');
         if (form) form.reset();
+        clearTimeout(reportPollTimer);
+        const status = document.getElementById('reportStatus');
+        if (status) status.style.display = 'none';
         const allTimeCheckbox = document.getElementById('allTimeCheckbox');
         if (allTimeCheckbox) {
             allTimeCheckbox.checked = false;
@@ -675,6 +845,37 @@ function closeGenerateReportModal() {
     }
 }
 
+let reportPollTimer;
+
+function showReportStatus(job) {
+    const status = document.getElementById('reportStatus');
+    status.style.display = 'block';
+    if (job.status === 'done') {
+        status.textContent = 'Report ready. Downloading...';
+        window.location = job.download_url;
+    } else if (job.status === 'failed') {
+        status.textContent = `Report failed: ${job.error}`;
+    } else {
+        status.textContent = 'Generating report...';
+        reportPollTimer = setTimeout(() => {
+            fetch(`/reports/${job.id}/`)
+                .then(response => response.json())
+                .then(showReportStatus);
+        }, 2000);
+    }
+}
+
+function requestReport(form) {
+    // Reports render in the background; poll the job and download once it is done.
+    const params = new URLSearchParams(new FormData(form));
+    clearTimeout(reportPollTimer);
+    fetch(`${form.action}?${params.toString()}`, { headers: { 'X-Requested-With': 'XMLHttpRequest' } })
+        .then(response => response.json())
+        .then(showReportStatus)
+        .catch(() => form.submit());
+    return false;
+}
+
 let html5QrcodeScanner;
 
 function openScanBarcodeModal() {
@@ -0,0 +1,161 @@
+from collections import defaultdict
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Min, Q, Sum
+from django.db.models.functions import TruncDate
+
+from .models import Book, Student, Circulation, Penalty, DailyLibraryStats
+
+FLOW_FIELDS = ('issues', 'returns', 'new_students', 'penalties', 'penalty_amount')
+STOCK_FIELDS = ('total_students', 'issued_books', 'available_copies', 'overdue_books')
+
+
+def snapshot():
+    today = date.today()
+    return {
+        'total_students': Student.objects.count(),
+        'issued_books': Circulation.objects.filter(status='issued').count(),
+        'available_copies': Book.objects.aggregate(Sum('available_quantity'))['available_quantity__sum'] or 0,
+        'overdue_books': Circulation.objects.filter(status='issued', due_date__lt=today).count(),
+    }
+
+
+def _apply(day, changes):
+    changes = {field: value for field, value in changes.items() if value}
+    if not changes:
+        return
+    updates = {field: F(field) + value for field, value in changes.items()}
+    if DailyLibraryStats.objects.filter(date=day).update(**updates):
+        return
+
+    # First change of the day. Callers record after writing, so a live
+    # snapshot already includes this change's effect on the stock fields.
+    values = snapshot() if day == date.today() else {}
+    values.update({field: changes[field] for field in FLOW_FIELDS if field in changes})
+    try:
+        with transaction.atomic():
+            DailyLibraryStats.objects.create(date=day, **values)
+    except IntegrityError:
+        DailyLibraryStats.objects.filter(date=day).update(**updates)
+
+
+def record(day=None, **changes):
+    """
+    Adds ``changes`` to the rollup. Flow fields go to ``day`` (the date the
+    event is charted under); stock fields always go to today's row.
+    """
+    today = date.today()
+    day = day or today
+    if day == today:
+        _apply(today, changes)
+        return
+    _apply(day, {field: value for field, value in changes.items() if field in FLOW_FIELDS})
+    _apply(today, {field: value for field, value in changes.items() if field in STOCK_FIELDS})
+
+
+def record_return(circulation):
+    record(
+        circulation.return_date,
+        returns=1,
+        issued_books=-1,
+        overdue_books=-1 if circulation.due_date < date.today() else 0,
+    )
+
+
+def today_stats():
+    today = date.today()
+    stats = DailyLibraryStats.objects.filter(date=today).first()
+    if stats is None:
+        try:
+            with transaction.atomic():
+                stats = DailyLibraryStats.objects.create(date=today, **snapshot())
+        except IntegrityError:
+            stats = DailyLibraryStats.objects.get(date=today)
+    return stats
+
+
+def first_activity_date():
+    candidates = [
+        Circulation.objects.aggregate(d=Min('issue_date'))['d'],
+        Student.objects.aggregate(d=Min('joined_date'))['d'],
+        Penalty.objects.annotate(day=TruncDate('created_at')).aggregate(d=Min('day'))['d'],
+    ]
+    candidates = [d for d in candidates if d]
+    return min(candidates) if candidates else date.today()
+
+
+def _add_interval(diff, first, last, start, end):
+    first, last = max(first, start), min(last, end)
+    if first <= last:
+        diff[first] += 1
+        diff[last + timedelta(days=1)] -= 1
+
+
+def rebuild(start=None, end=None):
+    """
+    Recomputes every row between ``start`` and ``end`` from the fact tables.
+    Returns the number of rows written.
+    """
+    end = end or date.today()
+    start = start or first_activity_date()
+    if start > end:
+        return 0
+
+    issues = dict(Circulation.objects.filter(issue_date__range=(start, end))
+                  .values_list('issue_date').annotate(n=Count('id')).order_by())
+    returns = dict(Circulation.objects.filter(return_date__range=(start, end))
+                   .values_list('return_date').annotate(n=Count('id')).order_by())
+    new_students = dict(Student.objects.filter(joined_date__range=(start, end))
+                        .values_list('joined_date').annotate(n=Count('id')).order_by())
+    penalties = {}
+    penalty_rows = (Penalty.objects.annotate(day=TruncDate('created_at'))
+                    .filter(day__range=(start, end))
+                    .values('day').annotate(n=Count('id'), amount=Sum('amount')).order_by())
+    for row in penalty_rows:
+        penalties[row['day']] = (row['n'], row['amount'] or Decimal('0'))
+
+    # Stock fields: end-of-day values, rolled forward from the state before ``start``.
+    total_students = Student.objects.filter(joined_date__lt=start).count()
+    issued_books = Circulation.objects.filter(issue_date__lt=start).filter(
+        Q(return_date__isnull=True) | Q(return_date__gte=start)
+    ).count()
+    overdue_diff = defaultdict(int)
+    open_loans = Circulation.objects.filter(due_date__lt=end).filter(
+        Q(return_date__isnull=True) | Q(return_date__gt=start)
+    ).values_list('issue_date', 'due_date', 'return_date')
+    for issue_date, due_date, return_date in open_loans.iterator():
+        last = return_date - timedelta(days=1) if return_date else end
+        _add_interval(overdue_diff, max(due_date + timedelta(days=1), issue_date), last, start, end)
+
+    # Book has no history, so past availability assumes today's shelf quantities.
+    available_now = Book.objects.aggregate(Sum('available_quantity'))['available_quantity__sum'] or 0
+    copies_in_stock = available_now + Circulation.objects.filter(status='issued').count()
+
+    rows = []
+    overdue_books = 0
+    day = start
+    while day <= end:
+        total_students += new_students.get(day, 0)
+        issued_books += issues.get(day, 0) - returns.get(day, 0)
+        overdue_books += overdue_diff.get(day, 0)
+        penalty_count, penalty_amount = penalties.get(day, (0, Decimal('0')))
+        rows.append(DailyLibraryStats(
+            date=day,
+            issues=issues.get(day, 0),
+            returns=returns.get(day, 0),
+            new_students=new_students.get(day, 0),
+            penalties=penalty_count,
+            penalty_amount=penalty_amount,
+            total_students=total_students,
+            issued_books=issued_books,
+            available_copies=copies_in_stock - issued_books,
+            overdue_books=overdue_books,
+        ))
+        day += timedelta(days=1)
+
+    with transaction.atomic():
+        DailyLibraryStats.objects.filter(date__range=(start, end)).delete()
+        DailyLibraryStats.objects.bulk_create(rows, batch_size=500)
+    return len(rows)
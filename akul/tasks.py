@@ -0,0 +1,134 @@
+import datetime
+
+from .models import Circulation, OutboundEmail, Student
+from . import counters, log_archive, mailer, notifications, penalties, recommendation_cache, recommender, reports, stats
+from .library_settings import get_library_settings
+from .mailer import queue_email, queue_emails
+
+
+def send_due_reminders():
+    today = datetime.date.today()
+    tomorrow = today + datetime.timedelta(days=1)
+    lib_settings = get_library_settings()
+
+    approaching_due = Circulation.objects.filter(status='issued', due_date=tomorrow).select_related('student', 'book')
+    notices = []
+    for circ in approaching_due:
+        subject = "Library Reminder: Book Due Tomorrow"
+        message = f"Dear {circ.student.name},\n\nThis is a friendly reminder that the book '{circ.book.title}' is due tomorrow ({circ.due_date}).\nPlease return it to avoid late fees.\n\nRegards,\n{lib_settings.library_name}"
+
+        if getattr(lib_settings, 'enable_emails', True):
+            queue_email(circ.student.email, subject, message)
+            print(f"[BACKGROUND TASK] Reminder queued for {circ.student.email}")
+
+        notices.append(f"Reminder: '{circ.book.title}' issued to {circ.student.name} is due tomorrow.")
+    notifications.add_notifications(notices, dedup=True)
+
+
+def apply_overdue_penalties():
+    today = datetime.date.today()
+    lib_settings = get_library_settings()
+
+    result = penalties.apply_overdue_penalties(lib_settings, today)
+    print(f"[BACKGROUND TASK] Overdue penalties: {result['created']} created, {result['updated']} updated, {result['capped']} capped at {lib_settings.max_penalty}")
+
+    notices = result['notices']
+    students = Student.objects.in_bulk({notice['student_id'] for notice in notices})
+    overdue_notices = []
+    emails = []
+    for notice in notices:
+        student = students[notice['student_id']]
+        book_title = notice['book_title']
+        days_overdue = notice['days_overdue']
+        pay_link = f"http://127.0.0.1:8000/pay-penalty/{notice['penalty_id']}/"
+        subject = f"Overdue Notice & Penalty Applied: {book_title}"
+        message = (
+            f"Dear {student.name},\n\n"
+            f"Your borrowed book '{book_title}' is now {days_overdue} days overdue.\n"
+            f"A penalty of ₹{notice['amount']} has been applied.\n\n"
+            f"Please return the book.\n\n"
+            f"You can pay your fine online instantly here:\n{pay_link}\n\n"
+            f"Regards,\n{lib_settings.library_name}"
+        )
+
+        if getattr(lib_settings, 'enable_emails', True):
+            emails.append((student.email, subject, message))
+
+        overdue_notices.append(f"Overdue: '{book_title}' issued to {student.name} is {days_overdue} days overdue.")
+    notifications.add_notifications(overdue_notices, dedup=True)
+    queue_emails(emails)
+    print(f"[BACKGROUND TASK] {len(emails)} overdue notices queued.")
+    return result
+
+
+def send_monthly_recommendations():
+    today = datetime.date.today()
+    lib_settings = get_library_settings()
+    rec_email_sent = OutboundEmail.objects.filter(
+        subject="Your Monthly Book Recommendations",
+        created_at__date=today
+    ).exists()
+
+    if getattr(lib_settings, 'enable_emails', True) and not rec_email_sent:
+        from .ml_utils import get_recommendations_for_students
+
+        # One batch pass scores every student; names and emails are streamed alongside.
+        all_recommendations = get_recommendations_for_students(limit=3)
+        emails = []
+        for student_id, name, email in Student.objects.values_list('id', 'name', 'email').iterator(chunk_size=2000):
+            recommendations = all_recommendations.get(student_id)
+            if recommendations:
+                rec_list = "\n".join([f"- {b.title} by {b.author.name if b.author else 'Unknown'}" for b in recommendations])
+                subject = "Your Monthly Book Recommendations"
+                message = f"Dear {name},\n\nBased on your reading history and our library's activity, we think you'll love these books:\n\n{rec_list}\n\nVisit {lib_settings.library_name} to check them out!\n\nHappy Reading,\nThe Library Team"
+
+                emails.append((email, subject, message))
+        queue_emails(emails)
+        print(f"[BACKGROUND TASK] {len(emails)} monthly AI recommendation emails queued.")
+
+
+def trim_notifications():
+    notifications.trim()
+
+
+def refresh_daily_stats():
+    # Re-derives yesterday's and today's rollup rows so any drift from bulk edits is corrected nightly.
+    today = datetime.date.today()
+    stats.rebuild(today - datetime.timedelta(days=1), today)
+
+
+def send_queued_emails():
+    totals = mailer.send_pending()
+    if totals['sent'] or totals['failed']:
+        print(f"[BACKGROUND TASK] Emails: {totals['sent']} sent, {totals['failed']} failed.")
+    return totals
+
+
+def generate_reports():
+    count = reports.run_pending()
+    if count:
+        print(f"[BACKGROUND TASK] {count} circulation reports generated.")
+
+
+def refresh_book_neighbors():
+    count = recommender.refresh()
+    recommendation_cache.invalidate_all()
+    print(f"[BACKGROUND TASK] Book neighbours rebuilt: {count} rows.")
+
+
+def refresh_recent_book_neighbors():
+    count = recommender.refresh_recent()
+    if count:
+        recommendation_cache.invalidate_all()
+        print(f"[BACKGROUND TASK] Book neighbours refreshed for today's loans: {count} rows.")
+
+
+def ensure_log_partitions():
+    created = log_archive.ensure_partitions()
+    if created:
+        print(f"[BACKGROUND TASK] Log partitions created: {', '.join(created)}")
+
+
+def reconcile_counters():
+    # Corrects drift from queryset updates and bulk edits, which bypass the counter signals.
+    counters.reconcile()
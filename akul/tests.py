@@ -1,2 +1,1142 @@
-from django.test import TestCase
+import csv
+import gzip
+import math
+import re
+import tempfile
+import threading
+from datetime import date, timedelta
+from io import StringIO
+from unittest import mock
 
+from django.db import OperationalError, connection, transaction
+from django.db.models import Sum
+from django.core import mail
+from django.core.management import call_command
+from django.core.mail.backends.locmem import EmailBackend
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings, skipUnlessDBFeature
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from . import (audit, autocomplete, circulation, content_similarity, counters, importers, library_settings,
+               log_archive, mailer, metrics, ml_utils, notifications, pagination, penalties, recommendation_cache,
+               recommender, reports, scheduler, search, stats, tasks, versions)
+from .dashboard import filter_circulations, get_summary_counts, overdue_circulations
+from .models import (Author, Publisher, Book, Student, Circulation, Penalty, DailyLibraryStats,
+                     Notification, AuditLog, EmailLog, ScheduledJob, LibrarySettings, OutboundEmail, BookNeighbor)
+
+
+class DashboardQueryCountTests(TestCase):
+    ROWS = 1000
+
+    # Upper bound on queries per tab API call; none of these may grow with ROWS.
+    TAB_QUERY_LIMITS = {
+        'dashboard': 6,
+        'books': 1,
+        'authors': 2,
+        'publishers': 2,
+        'students': 1,
+        'users': 1,
+        'circulations': 1,
+        'penalties': 1,
+        'audit_logs': 1,
+        'email_logs': 1,
+        'charts': 1,
+        'overdue': 2,
+        'options': 3,
+        'publisher_books': 1,
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        today = date.today()
+        authors = Author.objects.bulk_create([Author(name=f'Author {i}') for i in range(cls.ROWS // 10)])
+        publishers = Publisher.objects.bulk_create([Publisher(name=f'Publisher {i}') for i in range(cls.ROWS // 100)])
+        books = Book.objects.bulk_create([
+            Book(title=f'Book {i}', author=authors[i % len(authors)], publisher=publishers[i % len(publishers)],
+                 isbn=f'{i:013d}', quantity=2, available_quantity=1)
+            for i in range(cls.ROWS)
+        ])
+        students = Student.objects.bulk_create([
+            Student(name=f'Student {i}', email=f'student{i}@example.com', phone='0', address='-')
+            for i in range(cls.ROWS)
+        ])
+        Circulation.objects.bulk_create([
+            Circulation(student=students[i], book=books[i], issue_date=today - timedelta(days=30),
+                        due_date=today - timedelta(days=i % 30), status='issued')
+            for i in range(cls.ROWS)
+        ])
+        Penalty.objects.bulk_create([
+            Penalty(student=students[i], book=books[i], amount=10, reason='Overdue', due_date=today)
+            for i in range(0, cls.ROWS, 2)
+        ])
+        # bulk_create skips the rollup and counter signals, as a data import would.
+        stats.rebuild()
+        counters.reconcile()
+
+    def assertTabQueries(self, tab, limit):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(f'/dashboard/api/{tab}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertLessEqual(len(ctx.captured_queries), limit, f"'{tab}' ran {len(ctx.captured_queries)} queries")
+
+    def test_tab_query_counts(self):
+        for tab, limit in self.TAB_QUERY_LIMITS.items():
+            with self.subTest(tab=tab):
+                self.assertTabQueries(tab, limit)
+
+    def test_sorted_and_searched_tabs(self):
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get('/dashboard/api/authors/?author_sort=name_asc&author_search=Author')
+            self.client.get('/dashboard/api/circulations/?circ_sort=due_date&circ_status=overdue')
+            self.client.get('/dashboard/api/students/?student_sort=name_desc')
+        self.assertLessEqual(len(ctx.captured_queries), 4)
+
+    def test_publisher_books_are_fetched_per_publisher(self):
+        publisher = Publisher.objects.order_by('id').first()
+        response = self.client.get('/dashboard/api/publishers/')
+        self.assertNotIn('Book 0<', response.json()['html'])
+        self.assertIn('next_cursor', response.json())
+        response = self.client.get('/dashboard/api/publisher_books/', {'publisher_id': publisher.id})
+        self.assertIn('Book 0<', response.json()['html'])
+        self.assertNotIn('Book 1<', response.json()['html'])
+        self.assertNotIn('students', self.client.get('/dashboard/api/options/').json())
+
+    def test_chart_query_count_independent_of_range(self):
+        for params in ({'chart_range': 'last_year'},
+                       {'chart_range': 'custom', 'chart_start': '2000-01-01', 'chart_end': date.today().isoformat()},
+                       {'chart_range': 'custom', 'chart_start': '2020-01-01', 'chart_end': date.today().isoformat(),
+                        'chart_granularity': 'week'}):
+            with self.subTest(**params), CaptureQueriesContext(connection) as ctx:
+                data = self.client.get('/dashboard/api/charts/', params).json()
+            self.assertEqual(len(ctx.captured_queries), 1)
+            self.assertEqual(len(data['chart_labels']), len(data['issue_counts']))
+            self.assertEqual(sum(data['issue_counts']), self.ROWS)
+
+    def test_long_chart_ranges_are_coarsened_or_refused(self):
+        data = self.client.get('/dashboard/api/charts/', {
+            'chart_range': 'custom', 'chart_start': '2000-01-01', 'chart_end': '2010-12-31', 'chart_granularity': 'day',
+        }).json()
+        self.assertEqual((data['granularity'], len(data['chart_labels'])), ('month', 132))
+        response = self.client.get('/dashboard/api/charts/', {
+            'chart_range': 'custom', 'chart_start': '0001-01-01', 'chart_end': '9999-12-31',
+        })
+        self.assertEqual(response.status_code, 400)
+
+    def test_next_page_query_count(self):
+        first = self.client.get('/dashboard/api/circulations/').json()
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get('/dashboard/api/circulations/', {'cursor': first['next_cursor']})
+        self.assertEqual(len(ctx.captured_queries), 1)
+
+    def test_malformed_cursor_contents_fall_back_to_the_first_page(self):
+        first = self.client.get('/dashboard/api/circulations/').json()
+        for values in (5, ['not-a-date', 1], ['2026-01-01', 'x']):
+            token = pagination.encode_cursor(values, 'next')
+            with self.subTest(values=values):
+                response = self.client.get('/dashboard/api/circulations/', {'cursor': token})
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.json()['next_cursor'], first['next_cursor'])
+
+
+class DashboardQueryCountLargeTests(DashboardQueryCountTests):
+    ROWS = 10000
+
+
+class DailyLibraryStatsTests(TestCase):
+    def setUp(self):
+        author = Author.objects.create(name='Ann')
+        publisher = Publisher.objects.create(name='Pub')
+        self.book = Book.objects.create(title='T', author=author, publisher=publisher, isbn='1', quantity=3, available_quantity=3)
+        self.student = Student.objects.create(name='S', email='s@example.com', phone='0', address='-')
+
+    def assertMatchesSnapshot(self):
+        row = DailyLibraryStats.objects.get(date=date.today())
+        for field, value in stats.snapshot().items():
+            self.assertEqual(getattr(row, field), value, field)
+
+    def test_incremental_updates_match_rebuild(self):
+        today = date.today()
+        self.client.post('/issue_book/', {'student': self.student.id, 'book': self.book.id,
+                                          'issue_date': (today - timedelta(days=30)).isoformat()})
+        self.client.post('/issue_book/', {'student': self.student.id, 'book': self.book.id,
+                                          'issue_date': today.isoformat()})
+        self.assertMatchesSnapshot()
+        overdue = Circulation.objects.get(issue_date=today - timedelta(days=30))
+        self.client.post('/return_book/', {'circulation_id': overdue.id})
+        Student.objects.create(name='T', email='t@example.com', phone='0', address='-')
+        self.assertMatchesSnapshot()
+
+        # Backdated events only touch flow fields on past rows; stock fields live on today's row.
+        fields = ['date', *stats.FLOW_FIELDS]
+        incremental = list(DailyLibraryStats.objects.values_list(*fields))
+        today_row = DailyLibraryStats.objects.values_list(*stats.STOCK_FIELDS).get(date=today)
+        stats.rebuild()
+        rebuilt = DailyLibraryStats.objects.exclude(issues=0, returns=0, new_students=0, penalties=0)
+        self.assertEqual(incremental, list(rebuilt.values_list(*fields)))
+        self.assertEqual(today_row, DailyLibraryStats.objects.values_list(*stats.STOCK_FIELDS).get(date=today))
+
+    def test_summary_counts_are_one_query(self):
+        counters.invalidate()
+        get_summary_counts()
+        with self.assertNumQueries(1):
+            counts = get_summary_counts()
+        self.assertEqual(counts['total_students'], 1)
+        self.assertEqual(counts['reserved_books_count'], 3)
+
+
+class QueryPlanTests(TestCase):
+    """
+    Runs EXPLAIN on the hot queries and fails if any table is read with a
+    full scan. PostgreSQL runs with enable_seqscan off so small test tables
+    still show whether an index is usable; SQLite stands in locally.
+    """
+
+    def assertNoFullScan(self, queryset):
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('SET enable_seqscan = off')
+            try:
+                plan = queryset.explain()
+            finally:
+                with connection.cursor() as cursor:
+                    cursor.execute('RESET enable_seqscan')
+            self.assertNotIn('Seq Scan', plan, plan)
+        elif connection.vendor == 'sqlite':
+            plan = queryset.explain()
+            scans = [line for line in plan.splitlines() if re.search(r'\bSCAN\b', line) and 'USING' not in line]
+            self.assertEqual(scans, [], plan)
+        else:
+            self.skipTest(f'No plan check for {connection.vendor}')
+
+    def test_circulation_queries(self):
+        today = date.today()
+        request = RequestFactory().get('/dashboard/api/circulations/')
+        self.assertNoFullScan(overdue_circulations())
+        self.assertNoFullScan(Circulation.objects.filter(status='issued', due_date=today + timedelta(days=1)))
+        self.assertNoFullScan(filter_circulations(request)[:25])
+
+    def test_penalty_queries(self):
+        self.assertNoFullScan(Penalty.objects.filter(student_id=1, book_id=1, due_date=date.today(), status='unpaid'))
+        self.assertNoFullScan(Penalty.objects.filter(status='unpaid', student_id__in=[1, 2, 3]).order_by('id'))
+
+    def test_log_queries(self):
+        self.assertNoFullScan(Notification.objects.filter(dedup_key=notifications.dedup_key('m')))
+        self.assertNoFullScan(Notification.objects.all()[:50])
+        self.assertNoFullScan(AuditLog.objects.order_by('-timestamp')[:100])
+        self.assertNoFullScan(AuditLog.objects.filter(verb='issue').order_by('-timestamp')[:100])
+        self.assertNoFullScan(AuditLog.objects.filter(object_type='book', object_id=1).order_by('-timestamp')[:100])
+        self.assertNoFullScan(EmailLog.objects.order_by('-sent_at')[:100])
+
+
+class BookSearchTests(TestCase):
+    def setUp(self):
+        search.invalidate_index()
+        tolkien = Author.objects.create(name='J. R. R. Tolkien')
+        hobbes = Author.objects.create(name='Thomas Hobbes')
+        publisher = Publisher.objects.create(name='Pub')
+        self.hobbit = Book.objects.create(title='The Hobbit', author=tolkien, publisher=publisher, isbn='9780261102217')
+        self.leviathan = Book.objects.create(title='Leviathan', author=hobbes, publisher=publisher, isbn='9780140431957')
+        self.rings = Book.objects.create(title='The Lord of the Rings', author=tolkien, publisher=publisher, isbn='9780261103252')
+
+    def search(self, query):
+        return list(search.search_books(Book.objects.all(), query))
+
+    def test_ranks_title_hits_above_author_hits(self):
+        self.assertEqual(self.search('hob'), [self.hobbit, self.leviathan])
+        self.assertEqual(self.search('tolkien rings'), [self.rings])
+
+    def test_isbn_prefix(self):
+        self.assertEqual(self.search('978-02611'), [self.rings, self.hobbit])
+        self.assertEqual(self.search('9780140431957'), [self.leviathan])
+
+    def test_index_follows_saves_and_deletes(self):
+        self.search('hobbit')
+        self.hobbit.title = 'There and Back Again'
+        self.hobbit.save()
+        self.assertEqual(self.search('hobbit'), [])
+        self.assertEqual(self.search('back again'), [self.hobbit])
+        self.rings.delete()
+        self.assertEqual(self.search('lord'), [])
+
+    def test_writes_from_other_workers_are_picked_up(self):
+        self.assertEqual(self.search('hobbit'), [self.hobbit])
+        Book.objects.filter(id=self.hobbit.id).update(title='There and Back Again')
+        with self.captureOnCommitCallbacks(execute=True):
+            versions.bump(search.VERSION_NAME)
+        self.assertEqual(self.search('back again'), [self.hobbit])
+
+    def test_searched_books_tab_paginates(self):
+        Book.objects.bulk_create([
+            Book(title=f'Hobbit Companion {i}', author=self.hobbit.author, publisher=self.hobbit.publisher, isbn=f'1{i:012d}')
+            for i in range(30)
+        ])
+        search.invalidate_index()
+        first = self.client.get('/dashboard/api/books/', {'search_query': 'hobbit'}).json()
+        second = self.client.get('/dashboard/api/books/', {'search_query': 'hobbit', 'cursor': first['next_cursor']}).json()
+        self.assertIsNone(second['next_cursor'])
+        self.assertEqual(second['html'].count('<tr'), 31 - 25)
+
+
+class AutocompleteTests(TestCase):
+    def setUp(self):
+        autocomplete._indexes.clear()
+        author = Author.objects.create(name='Ann')
+        publisher = Publisher.objects.create(name='Pub')
+        self.dune = Book.objects.create(title='Dune', author=author, publisher=publisher, isbn='9780441013593', available_quantity=1)
+        self.messiah = Book.objects.create(title='Dune Messiah', author=author, publisher=publisher, isbn='9780593098233', available_quantity=0)
+        self.student = Student.objects.create(name='Paul Atreides', email='paul@arrakis.example', phone='0', address='-')
+
+    def suggest(self, kind, **params):
+        response = self.client.get(f'/autocomplete/{kind}/', params)
+        self.assertEqual(response.status_code, 200)
+        return [result['id'] for result in response.json()['results']]
+
+    def test_prefix_matches(self):
+        self.assertEqual(self.suggest('books', q='dune'), [self.dune.id, self.messiah.id])
+        self.assertEqual(self.suggest('books', q='mess'), [self.messiah.id])
+        self.assertEqual(self.suggest('books', q='978059'), [self.messiah.id])
+        self.assertEqual(self.suggest('books', q='dune', available='1'), [self.dune.id])
+        self.assertEqual(self.suggest('students', q='atr'), [self.student.id])
+        self.assertEqual(self.suggest('students', q='paul@arr'), [self.student.id])
+        results = self.client.get('/autocomplete/students/', {'q': 'paul'}).json()['results']
+        self.assertEqual((results[0]['name'], results[0]['email']), ('Paul Atreides', 'paul@arrakis.example'))
+        self.assertEqual(self.client.get('/autocomplete/authors/', {'q': 'a'}).status_code, 404)
+
+    def test_index_follows_signals(self):
+        self.suggest('students', q='p')
+        self.student.name = 'Muad Dib'
+        self.student.save()
+        self.assertEqual(self.suggest('students', q='atreides'), [])
+        self.assertEqual(self.suggest('students', q='muad'), [self.student.id])
+        self.student.delete()
+        self.assertEqual(self.suggest('students', q='muad'), [])
+
+    def test_writes_from_other_workers_are_picked_up(self):
+        self.assertEqual(self.suggest('students', q='paul'), [self.student.id])
+        # Another process's write: no signal here, only the version bump it committed.
+        Student.objects.filter(id=self.student.id).update(name='Leto Atreides')
+        with self.captureOnCommitCallbacks(execute=True):
+            versions.bump(autocomplete.version_name('students'))
+        self.assertEqual(self.suggest('students', q='leto'), [self.student.id])
+
+    def test_unchanged_saves_do_not_move_index_versions(self):
+        with mock.patch.object(versions, 'bump') as bump:
+            Book.objects.get(id=self.dune.id).save()
+        bumped = {name for call in bump.call_args_list for name in call.args}
+        self.assertFalse(bumped & {autocomplete.version_name('books'), search.VERSION_NAME, content_similarity.VERSION_NAME})
+
+    def test_add_penalty_takes_ids(self):
+        self.client.post('/add_penalty/', {'student': self.student.id, 'book': self.dune.id, 'amount': '25'})
+        penalty = Penalty.objects.get()
+        self.assertEqual((penalty.student, penalty.book, penalty.reason), (self.student, self.dune, 'Book: Dune'))
+
+
+
+class SchedulerTests(TestCase):
+    def setUp(self):
+        self.calls = []
+        jobs = {
+            'record': ('0 8 * * *', lambda: self.calls.append('record')),
+            'broken': ('0 8 * * *', lambda: 1 / 0),
+        }
+        patcher = mock.patch.dict(scheduler.JOBS, jobs, clear=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_missed_runs_are_caught_up_once(self):
+        now = timezone.now()
+        scheduler.sync_jobs(now - timedelta(days=3))
+        self.assertEqual(sorted(scheduler.run_due_jobs(now)), ['broken', 'record'])
+        self.assertEqual(self.calls, ['record'])
+        self.assertEqual(scheduler.run_due_jobs(now), [])
+
+        job = ScheduledJob.objects.get(name='record')
+        self.assertGreater(job.next_run_at, now)
+        self.assertEqual(job.last_status, 'success')
+        broken = ScheduledJob.objects.get(name='broken')
+        self.assertEqual(broken.last_status, 'failed')
+        self.assertIn('ZeroDivisionError', broken.last_error)
+
+    def test_claimed_job_is_not_run_twice(self):
+        now = timezone.now()
+        scheduler.sync_jobs(now - timedelta(days=1))
+        stale = ScheduledJob.objects.get(name='record')
+        self.assertTrue(scheduler.claim(ScheduledJob.objects.get(name='record'), now))
+        self.assertFalse(scheduler.claim(stale, now))
+
+    def test_disabled_jobs_are_skipped(self):
+        now = timezone.now()
+        scheduler.sync_jobs(now - timedelta(days=1))
+        ScheduledJob.objects.update(enabled=False)
+        self.assertEqual(scheduler.run_due_jobs(now), [])
+
+
+class OverduePenaltyEngineTests(TestCase):
+    ROWS = 300
+
+    @classmethod
+    def setUpTestData(cls):
+        today = date.today()
+        author = Author.objects.create(name='Ann')
+        publisher = Publisher.objects.create(name='Pub')
+        books = Book.objects.bulk_create([
+            Book(title=f'Book {i}', author=author, publisher=publisher, isbn=f'{i:013d}') for i in range(cls.ROWS)
+        ])
+        students = Student.objects.bulk_create([
+            Student(name=f'Student {i}', email=f's{i}@example.com', phone='0', address='-') for i in range(cls.ROWS)
+        ])
+        Circulation.objects.bulk_create([
+            Circulation(student=students[i], book=books[i], issue_date=today - timedelta(days=90),
+                        due_date=today - timedelta(days=1 + i % 60), status='issued')
+            for i in range(cls.ROWS)
+        ])
+        cls.settings = LibrarySettings.objects.create(penalty_per_day=10, max_penalty=200)
+
+    def test_creates_then_updates_in_bulk(self):
+        with CaptureQueriesContext(connection) as ctx:
+            result = penalties.apply_overdue_penalties(self.settings, batch_size=100)
+        self.assertEqual((result['created'], result['updated']), (self.ROWS, 0))
+        self.assertLess(len(ctx.captured_queries), 40)
+        self.assertEqual(Penalty.objects.count(), self.ROWS)
+        self.assertEqual(Penalty.objects.filter(amount__gt=200).count(), 0)
+        self.assertEqual(result['capped'], Penalty.objects.filter(days_overdue__gt=20).count())
+        self.assertEqual(set(Penalty.objects.filter(days_overdue=3).values_list('amount', flat=True)), {30})
+
+        later = date.today() + timedelta(days=1)
+        result = penalties.apply_overdue_penalties(self.settings, today=later, batch_size=100)
+        self.assertEqual((result['created'], result['updated']), (0, self.ROWS))
+        self.assertEqual(set(Penalty.objects.filter(due_date=date.today() - timedelta(days=3)).values_list('amount', flat=True)), {40})
+        self.assertEqual(DailyLibraryStats.objects.get(date=date.today()).penalty_amount,
+                         Penalty.objects.aggregate(total=Sum('amount'))['total'])
+
+
+class FlakyBackend(EmailBackend):
+    """locmem backend that refuses any recipient at bad.example and counts sessions."""
+    opened = 0
+
+    def open(self):
+        FlakyBackend.opened += 1
+        return True
+
+    def send_messages(self, messages):
+        for message in messages:
+            if any(address.endswith('@bad.example') for address in message.to):
+                raise OSError('550 mailbox unavailable')
+        return super().send_messages(messages)
+
+
+@override_settings(EMAIL_BACKEND='akul.tests.FlakyBackend')
+class OutboundEmailQueueTests(TestCase):
+    def setUp(self):
+        FlakyBackend.opened = 0
+
+    def test_queue_is_drained_over_one_connection(self):
+        mailer.queue_emails([(f's{i}@example.com', 'Hello', 'Body') for i in range(12)])
+        self.assertEqual(len(mail.outbox), 0)
+
+        totals = mailer.send_pending(batch_size=5, rate_per_minute=0)
+        self.assertEqual(totals, {'sent': 12, 'failed': 0})
+        self.assertEqual(len(mail.outbox), 12)
+        self.assertEqual(FlakyBackend.opened, 1)
+        self.assertEqual(OutboundEmail.objects.filter(status='sent', email_log__isnull=False).count(), 12)
+        self.assertEqual(EmailLog.objects.count(), 12)
+        self.assertEqual(mailer.send_pending(rate_per_minute=0), {'sent': 0, 'failed': 0})
+
+    def test_each_run_sends_at_most_the_per_minute_rate(self):
+        mailer.queue_emails([(f's{i}@example.com', 'Hello', 'Body') for i in range(12)])
+        self.assertEqual(mailer.send_pending(batch_size=5, rate_per_minute=7), {'sent': 7, 'failed': 0})
+        self.assertEqual(OutboundEmail.objects.filter(status='pending').count(), 5)
+        self.assertEqual(mailer.send_pending(batch_size=5, rate_per_minute=7), {'sent': 5, 'failed': 0})
+
+    def test_failures_back_off_then_give_up(self):
+        email = mailer.queue_email('x@bad.example', 'Hello', 'Body')
+        mailer.queue_email('ok@example.com', 'Hello', 'Body')
+        totals = mailer.send_pending(rate_per_minute=0)
+        self.assertEqual(totals, {'sent': 1, 'failed': 1})
+        email.refresh_from_db()
+        self.assertEqual((email.status, email.attempts), ('pending', 1))
+        self.assertGreater(email.next_attempt_at, timezone.now())
+
+        for attempt in range(2, mailer.MAX_ATTEMPTS + 1):
+            OutboundEmail.objects.filter(pk=email.pk).update(next_attempt_at=timezone.now())
+            mailer.send_pending(rate_per_minute=0)
+        email.refresh_from_db()
+        self.assertEqual((email.status, email.attempts), ('failed', mailer.MAX_ATTEMPTS))
+        self.assertIn('550', email.last_error)
+        self.assertTrue(Notification.objects.filter(message__startswith='Email to x@bad.example failed').exists())
+
+    def test_overdue_penalties_only_enqueue(self):
+        author = Author.objects.create(name='Ann')
+        book = Book.objects.create(title='Late', author=author, publisher=Publisher.objects.create(name='Pub'), isbn='1')
+        student = Student.objects.create(name='Sam', email='sam@example.com', phone='0', address='-')
+        Circulation.objects.create(student=student, book=book, issue_date=date.today() - timedelta(days=20),
+                                   due_date=date.today() - timedelta(days=3), status='issued')
+        LibrarySettings.objects.create(penalty_per_day=5)
+        tasks.apply_overdue_penalties()
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(list(OutboundEmail.objects.values_list('recipient', 'status')), [('sam@example.com', 'pending')])
+
+
+class BookImportTests(TestCase):
+    def csv_lines(self, rows):
+        header = 'Title,Author,Publisher,ISBN,Total Quantity,Available Quantity,Location,Thumbnail URL\n'
+        return [header] + [row + '\n' for row in rows]
+
+    def test_bulk_import_resolves_lookups_in_batches(self):
+        Author.objects.create(name='Author 1')
+        Book.objects.create(title='Old', author=Author.objects.create(name='Old'),
+                            publisher=Publisher.objects.create(name='Pub 0'), isbn='9000000000000')
+        rows = [f'Book {i},Author {i % 7},Pub {i % 3},{9780000000000 + i},3,2,Shelf {i},' for i in range(2500)]
+        rows += ['Old again,Old,Pub 0,9000000000000,1,1,,', 'Dup,Author 1,Pub 1,9780000000000,1,1,,',
+                 ',No title,Pub,123,1,1,,', 'Bad qty,A,P,555,two,1,,', 'Too many,A,P,556,1,5,,', '', 'short,row']
+
+        with CaptureQueriesContext(connection) as ctx:
+            report = importers.import_books(self.csv_lines(rows), batch_size=1000)
+        # SQLite caps bind parameters, so its bulk INSERTs are split into more statements.
+        self.assertLess(len(ctx.captured_queries), 40)
+        self.assertEqual(report['created'], 2500)
+        self.assertEqual((report['authors_created'], report['publishers_created']), (6, 2))
+        self.assertEqual([e['row'] for e in report['errors']], [2504, 2505, 2506, 2508])
+        self.assertEqual([(s['row'], s['isbn']) for s in report['skipped']],
+                         [(2502, '9000000000000'), (2503, '9780000000000')])
+        self.assertEqual(Book.objects.count(), 2501)
+        self.assertEqual(Author.objects.filter(name='Author 1').count(), 1)
+        self.assertEqual(stats.today_stats().available_copies, 1 + 2 * 2500)
+        self.assertEqual(search.search_books(Book.objects.all(), 'Book 2499').first().isbn, '9780000002499')
+
+    def test_upload_view_streams_file_and_reports(self):
+        from django.core.files.uploadedfile import SimpleUploadedFile
+
+        content = ''.join(self.csv_lines(['Dune,Frank Herbert,Chilton,9780441013593,2,2,A1,', 'Bad,,,']))
+        upload = SimpleUploadedFile('books.csv', ('﻿' + content).encode('utf-8'), content_type='text/csv')
+        response = self.client.post('/import_books_csv/', {'csv_file': upload}, HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        report = response.json()
+        self.assertEqual(report['created'], 1)
+        self.assertEqual(report['errors'][0]['row'], 3)
+        self.assertTrue(Book.objects.filter(isbn='9780441013593', author__name='Frank Herbert').exists())
+
+
+class StreamingExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        author = Author.objects.create(name='Ann')
+        publisher = Publisher.objects.create(name='Pub')
+        Book.objects.bulk_create([
+            Book(title=f'Book, "{i}"', author=author, publisher=publisher, isbn=f'{i:013d}', quantity=2, available_quantity=1)
+            for i in range(450)
+        ])
+        AuditLog.objects.create(username='admin', action='did a thing')
+
+    def test_books_export_streams_and_round_trips(self):
+        response = self.client.get('/export_books_csv/')
+        self.assertTrue(response.streaming)
+        chunks = list(response.streaming_content)
+        self.assertGreater(len(chunks), 1)
+        rows = list(csv.reader(b''.join(chunks).decode('utf-8').splitlines()))
+        self.assertEqual(len(rows), 451)
+        self.assertEqual(rows[1], ['Book, "0"', 'Ann', 'Pub', '0000000000000', '2', '1', '', ''])
+
+        Book.objects.all().delete()
+        report = importers.import_books(b''.join(chunks).decode('utf-8').splitlines(keepends=True))
+        self.assertEqual((report['created'], report['errors']), (450, []))
+
+    def test_gzip_and_unknown_kind(self):
+        response = self.client.get('/export/audit_logs/?gzip=1')
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        self.assertIn('audit_logs_export.csv.gz', response['Content-Disposition'])
+        text = gzip.decompress(b''.join(response.streaming_content)).decode('utf-8')
+        self.assertIn('admin,did a thing', text)
+        self.assertEqual(self.client.get('/export/nothing/').status_code, 404)
+
+
+class ReportJobTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        author = Author.objects.create(name='Ann')
+        publisher = Publisher.objects.create(name='Pub')
+        cls.student = Student.objects.create(name='Sam', email='sam@example.com', phone='0', address='-')
+        cls.books = Book.objects.bulk_create([
+            Book(title=f'Book & {i}' + ' long words' * (i % 5), author=author, publisher=publisher, isbn=f'{i:013d}')
+            for i in range(40)
+        ])
+        for book in cls.books[:30]:
+            Circulation.objects.create(student=cls.student, book=book, issue_date=date.today() - timedelta(days=5),
+                                       due_date=date.today() + timedelta(days=9), status='issued')
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        patcher = mock.patch.object(reports, 'REPORTS_DIR', self.tmp.name)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(self.tmp.cleanup)
+
+    def test_reports_render_in_background_and_are_reused(self):
+        params = reports.report_params({'circ_status': 'issued', 'circ_search': '', 'start_date': ''})
+        self.assertEqual(params, {'circ_status': 'issued'})
+        job = reports.request_report(params)
+        self.assertEqual(reports.request_report(params).id, job.id)
+        self.assertEqual(job.status, 'pending')
+
+        with mock.patch.object(reports, 'ROWS_PER_TABLE', 7):
+            self.assertEqual(reports.run_pending(), 1)
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'done')
+        with open(job.file_path, 'rb') as report_file:
+            self.assertEqual(report_file.read(5), b'%PDF-')
+        self.assertEqual(reports.request_report(params).id, job.id)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Circulation.objects.create(student=self.student, book=self.books[35], issue_date=date.today(),
+                                       due_date=date.today() + timedelta(days=14), status='issued')
+        second = reports.request_report(params)
+        self.assertNotEqual(second.id, job.id)
+
+        # Renames change no counts or sums but still have to move the version.
+        student = Student.objects.get(id=self.student.id)
+        student.name = 'Samuel'
+        with self.captureOnCommitCallbacks(execute=True):
+            student.save()
+        self.assertNotEqual(reports.request_report(params).id, second.id)
+
+    def test_plain_cells_unless_wrapping(self):
+        cell_style, _ = reports._styles()
+        self.assertEqual(reports._cell('2026-10-17', 65, cell_style), '2026-10-17')
+        self.assertNotIsInstance(reports._cell('A & B ' * 20, 150, cell_style), str)
+
+    def test_status_and_download_endpoints(self):
+        response = self.client.get('/dashboard/', {'action': 'generate_report', 'circ_status': 'issued'},
+                                   HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        job_id = response.json()['id']
+        self.assertEqual(response.json()['status'], 'pending')
+        self.assertEqual(self.client.get(f'/reports/{job_id}/download/').status_code, 404)
+
+        scheduler.sync_jobs(timezone.now() - timedelta(minutes=5))
+        self.assertIn('reports', scheduler.run_due_jobs())
+        status = self.client.get(f'/reports/{job_id}/').json()
+        self.assertEqual(status['status'], 'done')
+        response = self.client.get(status['download_url'])
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertTrue(b''.join(response.streaming_content).startswith(b'%PDF-'))
+
+
+class BookNeighborTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        author = Author.objects.create(name='Ann')
+        other_author = Author.objects.create(name='Bob')
+        publisher = Publisher.objects.create(name='Pub')
+        cls.books = Book.objects.bulk_create([
+            Book(title=f'Book {i}', author=author if i < 6 else other_author, publisher=publisher, isbn=f'{i:013d}')
+            for i in range(8)
+        ])
+        cls.students = Student.objects.bulk_create([
+            Student(name=f'Student {i}', email=f's{i}@example.com', phone='0', address='-') for i in range(6)
+        ])
+        reads = {0: [0, 1, 2], 1: [0, 1], 2: [0, 1, 3], 3: [2, 3, 4], 4: [4], 5: [0, 0, 6]}
+        Circulation.objects.bulk_create([
+            Circulation(student=cls.students[s], book=cls.books[b], issue_date=date.today() - timedelta(days=30),
+                        due_date=date.today() - timedelta(days=16), return_date=date.today() - timedelta(days=20),
+                        status='returned')
+            for s, books in reads.items() for b in books
+        ])
+
+    def setUp(self):
+        # setUpTestData bulk-creates books, which skips the index signals.
+        content_similarity.invalidate_index()
+
+    def book_ids(self, books):
+        return [self.books.index(book) for book in books]
+
+    def test_sparse_and_fallback_paths_agree(self):
+        sparse_result = recommender.compute_neighbors(k=3)
+        with mock.patch.object(recommender, 'HAS_SCIPY', False):
+            python_result = recommender.compute_neighbors(k=3)
+        self.assertEqual(sparse_result.keys(), python_result.keys())
+        for book_id, ranked in sparse_result.items():
+            self.assertEqual([n for n, _, _ in ranked], [n for n, _, _ in python_result[book_id]])
+            for (_, a, _), (_, b, _) in zip(ranked, python_result[book_id]):
+                self.assertAlmostEqual(a, b)
+        # Book 0 has four distinct readers, three of whom also read book 1.
+        neighbor, score, count = sparse_result[self.books[0].id][0]
+        self.assertEqual((neighbor, count), (self.books[1].id, 3))
+        self.assertAlmostEqual(score, 3 / math.sqrt(4 * 3))
+
+    def test_api_endpoints_are_lookups(self):
+        self.assertEqual(recommender.refresh(k=3), BookNeighbor.objects.count())
+        with self.assertNumQueries(1):
+            response = self.client.get('/dashboard/', {'api': 'similar_books', 'book_id': self.books[0].id})
+        self.assertEqual([b['title'] for b in response.json()['similar_books']], ['Book 1', 'Book 6', 'Book 2'])
+
+        # Student 1 read books 0 and 1; book 2 neighbours both, book 6 only book 0.
+        with self.assertNumQueries(3):
+            recommendations = ml_utils.get_recommendations_for_student(self.students[1].id, limit=2)
+        self.assertEqual(self.book_ids(recommendations), [2, 6])
+        self.assertEqual(len(ml_utils.get_recommendations_for_student(None)), 3)
+
+    def test_recent_refresh_only_rewrites_touched_books(self):
+        recommender.refresh(k=3)
+        untouched = list(BookNeighbor.objects.filter(book=self.books[4]).values_list('id', flat=True))
+        Circulation.objects.create(student=self.students[1], book=self.books[7], issue_date=date.today(),
+                                   due_date=date.today() + timedelta(days=14), status='issued')
+        recommender.refresh_recent()
+        self.assertEqual(list(BookNeighbor.objects.filter(book=self.books[4]).values_list('id', flat=True)), untouched)
+        self.assertIn(self.books[7].id, BookNeighbor.objects.filter(book=self.books[0]).values_list('neighbor_id', flat=True))
+
+    def test_batch_recommendations_match_single_lookups(self):
+        recommender.refresh(k=3)
+        Book.objects.filter(id=self.books[6].id).update(available_quantity=0)
+        with CaptureQueriesContext(connection) as ctx:
+            batch = ml_utils.get_recommendations_for_students(limit=2)
+        self.assertLessEqual(len(ctx.captured_queries), 6)
+        with mock.patch.object(recommender, 'HAS_SCIPY', False):
+            self.assertEqual(recommender.recommend_for_students(k=2),
+                             {student_id: [b.id for b in books] for student_id, books in batch.items()})
+
+        for student in self.students[:4]:
+            self.assertEqual(batch[student.id], ml_utils.get_recommendations_for_student(student.id, limit=2))
+        # Student 1 loses book 6 to the availability mask.
+        self.assertEqual(self.book_ids(batch[self.students[1].id]), [2, 3])
+        # Student 4 read only book 4, whose neighbours are read or out; same-author fallback kicks in.
+        self.assertTrue(set(self.book_ids(batch[self.students[4].id])) <= {0, 1, 2, 3, 5})
+        newcomer = Student.objects.create(name='New', email='n@example.com', phone='0', address='-')
+        self.assertEqual(self.book_ids(ml_utils.get_recommendations_for_students([newcomer.id])[newcomer.id]), [0, 1, 2])
+
+    def test_monthly_campaign_queues_one_email_per_reader(self):
+        recommender.refresh(k=3)
+        with CaptureQueriesContext(connection) as ctx:
+            tasks.send_monthly_recommendations()
+        self.assertLess(len(ctx.captured_queries), 15)
+        self.assertEqual(OutboundEmail.objects.filter(subject='Your Monthly Book Recommendations').count(), 6)
+
+
+class ContentSimilarityTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        tolkien = Author.objects.create(name='Tolkien')
+        lewis = Author.objects.create(name='Lewis')
+        allen = Publisher.objects.create(name='Allen')
+        bles = Publisher.objects.create(name='Bles')
+        titles = [
+            ('The Hobbit', tolkien, allen), ('The Lord of the Rings', tolkien, allen),
+            ('The Silmarillion', tolkien, bles), ('The Lion, the Witch and the Wardrobe', lewis, bles),
+            ('Prince Caspian', lewis, bles), ('The Rings of Saturn', lewis, allen),
+        ]
+        cls.books = [Book.objects.create(title=title, author=author, publisher=publisher, isbn=f'{i:013d}')
+                     for i, (title, author, publisher) in enumerate(titles)]
+        cls.student = Student.objects.create(name='Sam', email='sam@example.com', phone='0', address='-')
+        Circulation.objects.create(student=cls.student, book=cls.books[0], issue_date=date.today() - timedelta(days=3),
+                                   due_date=date.today() + timedelta(days=11), status='issued')
+
+    def setUp(self):
+        content_similarity.invalidate_index()
+
+    def titles(self, books):
+        return [book.title for book in books]
+
+    def test_fallback_is_ranked_and_never_sorts_randomly(self):
+        Book.objects.filter(id=self.books[2].id).update(available_quantity=0)
+        with CaptureQueriesContext(connection) as ctx:
+            first = ml_utils.get_recommendations_for_student(self.student.id, limit=3)
+        self.assertFalse(any('RANDOM' in q['sql'].upper() for q in ctx.captured_queries))
+        # Same author and publisher first, then same publisher, then a shared title word;
+        # The Silmarillion is out on loan.
+        self.assertEqual(self.titles(first), ['The Lord of the Rings', 'The Rings of Saturn',
+                                              'The Lion, the Witch and the Wardrobe'])
+        self.assertEqual(self.titles(ml_utils.get_recommendations_for_student(self.student.id, limit=3)), self.titles(first))
+        self.assertEqual(self.titles(ml_utils.get_similar_books(self.books[1].id, limit=2))[0], 'The Hobbit')
+
+    def test_index_rebuilds_only_on_content_changes(self):
+        index = content_similarity.get_index()
+        book = Book.objects.get(id=self.books[4].id)
+        book.available_quantity = 0
+        book.save()
+        self.assertIs(content_similarity.get_index(), index)
+        self.assertNotIn(book.id, index.rank([self.books[0].id], limit=10))
+        book.title = 'The Hobbit Returns'
+        book.save()
+        self.assertIsNot(content_similarity.get_index(), index)
+        self.assertIn(book.id, content_similarity.get_index().rank([self.books[0].id], limit=10))
+
+
+class RecommendationCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        author = Author.objects.create(name='Ann')
+        publisher = Publisher.objects.create(name='Pub')
+        cls.books = [Book.objects.create(title=f'Book {i}', author=author, publisher=publisher, isbn=f'{i:013d}', quantity=2,
+                                         available_quantity=2) for i in range(5)]
+        cls.students = [Student.objects.create(name=f'S{i}', email=f's{i}@example.com', phone='0', address='-')
+                        for i in range(2)]
+        for student in cls.students:
+            Circulation.objects.create(student=student, book=cls.books[0], issue_date=date.today() - timedelta(days=30),
+                                       due_date=date.today() - timedelta(days=16), return_date=date.today() - timedelta(days=20),
+                                       status='returned')
+
+    def setUp(self):
+        recommendation_cache.get_cache().clear()
+        recommendation_cache.reset_stats()
+        content_similarity.invalidate_index()
+
+    def test_repeat_lookups_are_served_from_cache(self):
+        student_id = self.students[0].id
+        first = recommendation_cache.recommendations_for_student(student_id)
+        with self.assertNumQueries(0):
+            self.assertEqual(recommendation_cache.recommendations_for_student(student_id), first)
+            recommendation_cache.recommendations_for_student(student_id)
+        response = self.client.get('/dashboard/', {'api': 'recommendation_cache_stats'})
+        self.assertEqual(response.json()['student'], {'hits': 2, 'misses': 1, 'hit_rate': 2 / 3})
+
+    def test_circulation_and_availability_changes_invalidate(self):
+        first, second = (s.id for s in self.students)
+        recommendation_cache.recommendations_for_student(first)
+        recommendation_cache.recommendations_for_student(second)
+        recommendation_cache.similar_books(self.books[0].id)
+
+        # A loan that leaves copies on the shelf only invalidates the borrower and the book.
+        book = self.books[1]
+        Circulation.objects.create(student_id=first, book=book, issue_date=date.today(),
+                                   due_date=date.today() + timedelta(days=14), status='issued')
+        book.available_quantity = 1
+        book.save()
+        recommendation_cache.recommendations_for_student(first)
+        recommendation_cache.recommendations_for_student(second)
+        self.assertEqual(recommendation_cache.stats()['student'], {'hits': 1, 'misses': 3, 'hit_rate': 0.25})
+
+        # The last copy going out changes what anyone can be offered.
+        book.available_quantity = 0
+        book.save()
+        recommendation_cache.recommendations_for_student(second)
+        recommendation_cache.similar_books(self.books[0].id)
+        self.assertEqual(recommendation_cache.stats()['student']['misses'], 4)
+        self.assertEqual(recommendation_cache.stats()['book'], {'hits': 0, 'misses': 2, 'hit_rate': 0.0})
+        self.assertNotIn(book.id, [b['id'] for b in recommendation_cache.recommendations_for_student(second)])
+
+
+class LibrarySettingsCacheTests(TestCase):
+    def setUp(self):
+        library_settings.invalidate()
+
+    def test_singleton_row(self):
+        LibrarySettings.objects.create(library_name='First')
+        LibrarySettings(library_name='Second').save()
+        self.assertEqual(list(LibrarySettings.objects.values_list('id', 'library_name')), [(1, 'Second')])
+        self.assertEqual(library_settings.get_library_settings().library_name, 'Second')
+
+    def test_reads_are_cached_and_saves_invalidate(self):
+        settings_obj = library_settings.get_library_settings()
+        self.assertEqual(settings_obj.pk, 1)
+        with self.assertNumQueries(0):
+            library_settings.get_library_settings().library_name = 'Not saved'
+            self.assertEqual(library_settings.get_library_settings().library_name, settings_obj.library_name)
+
+        self.client.post('/update_settings/', {
+            'library_name': 'Renamed', 'address': 'A', 'contact': 'C', 'penalty_per_day': '7',
+            'max_penalty': '70', 'loan_duration': '10', 'max_books': '2',
+        })
+        current = library_settings.get_library_settings()
+        self.assertEqual((current.library_name, current.penalty_per_day, current.enable_emails), ('Renamed', 7, False))
+        self.assertEqual(LibrarySettings.objects.count(), 1)
+
+
+class CirculationServiceTests(TestCase):
+    def setUp(self):
+        author = Author.objects.create(name='Ann')
+        publisher = Publisher.objects.create(name='Pub')
+        self.book = Book.objects.create(title='T', author=author, publisher=publisher, isbn='1', quantity=1, available_quantity=1)
+        self.other = Book.objects.create(title='U', author=author, publisher=publisher, isbn='2', quantity=5, available_quantity=5)
+        self.student = Student.objects.create(name='S', email='s@example.com', phone='0', address='-')
+        library_settings.invalidate()
+
+    def test_last_copy_and_loan_limit(self):
+        circulation.issue_book(self.student.id, self.book.id)
+        with self.assertRaisesMessage(circulation.CirculationError, 'No copies'):
+            circulation.issue_book(self.student.id, self.book.id)
+
+        LibrarySettings.objects.update_or_create(pk=1, defaults={'max_books': 2})
+        circulation.issue_book(self.student.id, self.other.id)
+        with self.assertRaisesMessage(circulation.CirculationError, 'limit 2'):
+            circulation.issue_book(self.student.id, self.other.id)
+        # The refused loan rolled back its stock decrement.
+        self.assertEqual(Book.objects.get(id=self.other.id).available_quantity, 4)
+        self.assertEqual(DailyLibraryStats.objects.get(date=date.today()).available_copies, 4)
+
+    def test_return_is_applied_once(self):
+        loan = circulation.issue_book(self.student.id, self.book.id, date.today() - timedelta(days=30))
+        returned = circulation.return_book(loan.id)
+        self.assertGreater(returned.fine_amount, 0)
+        with self.assertRaises(circulation.CirculationError):
+            circulation.return_book(loan.id)
+        self.assertEqual(Book.objects.get(id=self.book.id).available_quantity, 1)
+        self.assertEqual(Penalty.objects.filter(student=self.student).count(), 1)
+
+    def test_first_loan_of_the_day_counts_stock_once(self):
+        DailyLibraryStats.objects.all().delete()
+        circulation.issue_book(self.student.id, self.other.id)
+        row = DailyLibraryStats.objects.get(date=date.today())
+        self.assertEqual(row.available_copies, 5)
+        self.assertEqual(row.issued_books, 1)
+        self.assertEqual(row.issues, 1)
+
+
+@skipUnlessDBFeature('test_db_allows_multiple_connections')
+class ConcurrentCirculationTests(TransactionTestCase):
+    THREADS = 10
+
+    def setUp(self):
+        author = Author.objects.create(name='Ann')
+        publisher = Publisher.objects.create(name='Pub')
+        self.book = Book.objects.create(title='T', author=author, publisher=publisher, isbn='1', quantity=3, available_quantity=3)
+        self.students = [
+            Student.objects.create(name=f'S{i}', email=f's{i}@example.com', phone='0', address='-')
+            for i in range(self.THREADS)
+        ]
+        library_settings.invalidate()
+
+    def run_concurrently(self, calls):
+        barrier = threading.Barrier(len(calls))
+        outcomes = []
+
+        def worker(call):
+            try:
+                barrier.wait()
+                call()
+                outcomes.append('ok')
+            except circulation.CirculationError:
+                outcomes.append('refused')
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker, args=(call,)) for call in calls]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return outcomes
+
+    def test_parallel_issues_never_oversell(self):
+        outcomes = self.run_concurrently([
+            lambda student=student: circulation.issue_book(student.id, self.book.id) for student in self.students
+        ])
+        self.assertEqual((outcomes.count('ok'), outcomes.count('refused')), (3, self.THREADS - 3))
+        self.assertEqual(Book.objects.get(id=self.book.id).available_quantity, 0)
+        self.assertEqual(Circulation.objects.filter(status='issued').count(), 3)
+
+    def test_parallel_issues_respect_loan_limit(self):
+        Book.objects.filter(id=self.book.id).update(quantity=20, available_quantity=20)
+        student = self.students[0]
+        outcomes = self.run_concurrently([lambda: circulation.issue_book(student.id, self.book.id)] * self.THREADS)
+        self.assertEqual(outcomes.count('ok'), 3)
+        self.assertEqual(Circulation.objects.filter(student=student, status='issued').count(), 3)
+        self.assertEqual(Book.objects.get(id=self.book.id).available_quantity, 17)
+
+
+class NotificationTests(TestCase):
+    def setUp(self):
+        notifications.invalidate()
+
+    def test_insert_is_one_query_and_dedup_uses_the_key(self):
+        with self.assertNumQueries(1):
+            notifications.add_notification('Hello')
+        notifications.add_notifications(['Overdue: a', 'Overdue: b'], dedup=True)
+        notifications.add_notifications(['Overdue: b', 'Overdue: c'], dedup=True)
+        notifications.add_notification('Hello')
+        messages = list(Notification.objects.order_by('id').values_list('message', flat=True))
+        self.assertEqual(messages, ['Hello', 'Overdue: a', 'Overdue: b', 'Overdue: c', 'Hello'])
+
+    def test_feed_is_cached_and_trim_keeps_newest(self):
+        notifications.add_notifications([f'n{i}' for i in range(notifications.FEED_SIZE + 10)])
+        feed = notifications.get_feed()
+        self.assertEqual(len(feed['notifications']), notifications.FEED_SIZE)
+        self.assertEqual(feed['unread_count'], notifications.FEED_SIZE + 10)
+        with self.assertNumQueries(0):
+            notifications.get_feed()
+
+        self.assertEqual(notifications.trim(), 10)
+        self.assertEqual(Notification.objects.count(), notifications.FEED_SIZE)
+        self.assertFalse(Notification.objects.filter(message='n9').exists())
+        notifications.mark_read()
+        self.assertEqual(notifications.get_feed()['unread_count'], 0)
+
+
+class AuditBufferTests(TestCase):
+    def setUp(self):
+        audit.flush()
+
+    def test_entries_are_buffered_and_flushed_in_one_insert(self):
+        with self.assertNumQueries(0):
+            audit.record('ann', 'did one thing', 'update')
+            audit.record('ann', 'did another thing', 'update')
+        logged_at = audit._buffer[0].timestamp
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(audit.flush(), 2)
+        inserts = [query for query in ctx.captured_queries if query['sql'].startswith('INSERT')]
+        self.assertEqual(len(inserts), 1)
+        self.assertEqual(AuditLog.objects.order_by('id').first().timestamp, logged_at)
+
+        with mock.patch.object(audit, 'BUFFER_SIZE', 2), self.captureOnCommitCallbacks(execute=True):
+            audit.record('ann', 'a')
+            self.assertEqual(audit.pending(), 1)
+            audit.record('ann', 'b')
+            self.assertEqual(audit.pending(), 2)
+        self.assertEqual((audit.pending(), AuditLog.objects.count()), (0, 4))
+
+    def test_rolled_back_transaction_keeps_buffered_entries(self):
+        audit.record('bob', 'from another request')
+        with mock.patch.object(audit, 'BUFFER_SIZE', 2), self.captureOnCommitCallbacks(execute=True):
+            with self.assertRaises(ValueError), transaction.atomic():
+                audit.record('ann', 'fills the buffer')
+                Author.objects.create(name='Ann')
+                raise ValueError('rolled back')
+        self.assertEqual((audit.pending(), AuditLog.objects.count()), (2, 0))
+        self.assertEqual(audit.flush(), 2)
+
+    def test_failed_flush_keeps_entries_for_the_next_one(self):
+        audit.record('ann', 'kept', 'update')
+        with mock.patch.object(AuditLog.objects, 'bulk_create', side_effect=OperationalError('gone')):
+            with self.assertLogs('akul.audit', 'ERROR'):
+                self.assertEqual(audit.flush(), 0)
+        self.assertEqual(audit.pending(), 1)
+        self.assertEqual(audit.flush(), 1)
+        self.assertTrue(AuditLog.objects.filter(action='kept').exists())
+
+    @override_settings(AUDIT_STRICT=True)
+    def test_strict_mode_writes_immediately(self):
+        with self.assertNumQueries(1):
+            audit.record('ann', 'paid', 'pay')
+        self.assertEqual(audit.pending(), 0)
+
+    def test_request_end_flushes_structured_entries(self):
+        self.client.post('/add_author/', {'name': 'Ann', 'bio': ''})
+        author = Author.objects.get(name='Ann')
+        entry = AuditLog.objects.get()
+        self.assertEqual((entry.verb, entry.object_type, entry.object_id), ('create', 'author', author.id))
+
+        self.client.post(f'/delete_author/{author.id}/')
+        data = self.client.get('/dashboard/api/audit_logs/', {'audit_verb': 'delete'}).json()
+        self.assertIn('deleted author', data['html'])
+        self.assertNotIn('added a new author', data['html'])
+
+
+class LogArchiveTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        now = timezone.now()
+        self.logs = []
+        for months_ago, subject in [(8, 'Invoice February'), (7, 'Reminder'), (0, 'Invoice today')]:
+            log = EmailLog.objects.create(recipient='s@example.com', subject=subject, message='Body')
+            EmailLog.objects.filter(id=log.id).update(sent_at=now - timedelta(days=31 * months_ago))
+            self.logs.append(log)
+        self.outbound = OutboundEmail.objects.create(recipient='s@example.com', subject='Invoice February', message='Body',
+                                                     status='sent', email_log=self.logs[0])
+
+    def test_old_months_move_to_archive_files(self):
+        archived = log_archive.archive_old_logs(6, directory=self.directory)
+        self.assertEqual(sum(count for model, _, count, _ in archived if model is EmailLog), 2)
+        self.assertEqual(list(EmailLog.objects.values_list('subject', flat=True)), ['Invoice today'])
+        self.outbound.refresh_from_db()
+        self.assertIsNone(self.outbound.email_log_id)
+
+        hot = log_archive.search(EmailLog, 'invoice', directory=self.directory)
+        self.assertEqual([log.subject for log in hot], ['Invoice today'])
+        everything = log_archive.search(EmailLog, 'invoice', include_archived=True, directory=self.directory)
+        self.assertEqual([log.subject for log in everything], ['Invoice today', 'Invoice February'])
+        self.assertEqual(everything[1].id, self.logs[0].id)
+        self.assertEqual(len(log_archive.search(EmailLog, include_archived=True, directory=self.directory)), 3)
+
+    def test_rows_written_during_the_export_are_kept(self):
+        month = log_archive.month_start(EmailLog.objects.get(id=self.logs[0].id).sent_at)
+        real_replace = log_archive.os.replace
+
+        def late_row_then_replace(src, dst):
+            late = EmailLog.objects.create(recipient='s@example.com', subject='Late', message='Body')
+            EmailLog.objects.filter(id=late.id).update(sent_at=month + timedelta(days=1))
+            real_replace(src, dst)
+
+        with mock.patch.object(log_archive.os, 'replace', late_row_then_replace):
+            count, _ = log_archive.archive_month(EmailLog, month, self.directory)
+        self.assertEqual(count, 1)
+        self.assertTrue(EmailLog.objects.filter(subject='Late').exists())
+        self.assertFalse(EmailLog.objects.filter(id=self.logs[0].id).exists())
+
+    def test_command_reports_archived_rows(self):
+        out = StringIO()
+        call_command('archive_logs', '--keep-months', '6', '--directory', self.directory, stdout=out)
+        self.assertIn('Archived 2 log rows', out.getvalue())
+        self.assertEqual(log_archive.archive_old_logs(6, directory=self.directory), [])
+
+
+class SummaryCounterTests(TestCase):
+    def setUp(self):
+        self.author = Author.objects.create(name='Ann')
+        self.publisher = Publisher.objects.create(name='Pub')
+        self.book = Book.objects.create(title='T', author=self.author, publisher=self.publisher, isbn='1', quantity=2,
+                                        available_quantity=2)
+        self.student = Student.objects.create(name='S', email='s@example.com', phone='0', address='-')
+        counters.invalidate()
+        library_settings.invalidate()
+
+    def test_events_keep_counters_in_step_with_the_database(self):
+        counters.get_counters()
+        with self.captureOnCommitCallbacks(execute=True):
+            loan = circulation.issue_book(self.student.id, self.book.id, date.today() - timedelta(days=30))
+            Book.objects.create(title='U', author=self.author, publisher=self.publisher, isbn='2', quantity=4, available_quantity=3)
+            other = Student.objects.create(name='O', email='o@example.com', phone='0', address='-')
+        self.assertEqual(counters.get_counters(), counters.compute())
+        self.assertEqual(counters.get_counters()['overdue_books'], 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            circulation.return_book(loan.id)
+            other.delete()
+            self.book.refresh_from_db()
+            self.book.quantity = 5
+            self.book.save()
+        with self.assertNumQueries(1):
+            values = counters.get_counters()
+        self.assertEqual(values, counters.compute())
+        self.assertEqual((values['issued_books'], values['total_copies'], values['total_students']), (0, 9, 1))
+
+    def test_rolled_back_changes_do_not_reach_the_counters(self):
+        before = counters.get_counters()
+        with self.captureOnCommitCallbacks(execute=True):
+            with self.assertRaises(circulation.CirculationError):
+                with transaction.atomic():
+                    Student.objects.create(name='X', email='x@example.com', phone='0', address='-')
+                    circulation.issue_book(self.student.id, 0)
+        self.assertEqual(counters.get_counters(), before)
+
+
+class MetricsMiddlewareTests(TestCase):
+    def setUp(self):
+        metrics.reset()
+
+    def test_requests_are_aggregated_per_view_and_tab(self):
+        self.client.get('/dashboard/api/books/')
+        self.client.get('/dashboard/api/books/')
+        self.client.get('/dashboard/api/no_such_tab/')
+        body = self.client.get('/metrics').content.decode()
+        books = '{view="dashboard_api",tab="books",api=""}'
+        self.assertIn(f'akul_request_duration_seconds_count{books} 2', body)
+        self.assertIn('akul_request_duration_seconds_count{view="dashboard_api",tab="other",api=""} 1', body)
+        queries = re.search(rf'akul_request_sql_queries_total{re.escape(books)} (\d+)', body)
+        self.assertGreater(int(queries.group(1)), 0)
+        template_seconds = re.search(rf'akul_request_template_seconds_total{re.escape(books)} ([\d.]+)', body)
+        self.assertGreater(float(template_seconds.group(1)), 0)
+
+    def test_unknown_api_values_share_one_series(self):
+        self.client.get('/dashboard/', {'api': 'recommendation_cache_stats'})
+        for api in ('aaaa', 'aaab', 'aaac'):
+            self.client.get('/dashboard/', {'api': api})
+        body = self.client.get('/metrics').content.decode()
+        self.assertIn('akul_request_duration_seconds_count{view="admin_dashboard",tab="",api="recommendation_cache_stats"} 1', body)
+        self.assertIn('akul_request_duration_seconds_count{view="admin_dashboard",tab="",api="other"} 3', body)
+        self.assertNotIn('api="aaaa"', body)
+
+    @override_settings(METRICS_SLOW_REQUEST_MS=0)
+    def test_slow_requests_are_logged(self):
+        with self.assertLogs('akul.metrics', 'WARNING') as logs:
+            self.client.get('/dashboard/api/books/')
+            body = self.client.get('/metrics').content.decode()
+        self.assertIn('view=dashboard_api tab=books', logs.output[0])
+        self.assertIn('akul_slow_requests_total{view="dashboard_api",tab="books",api=""} 1', body)
@@ -4,6 +4,9 @@ from . import views
 urlpatterns = [
     path('', views.admin_login, name='admin_login'),
     path('dashboard/', views.admin_dashboard, name='admin_dashboard'),
+    path('dashboard/api/<str:tab>/', views.dashboard_api, name='dashboard_api'),
+    path('metrics', views.metrics_view, name='metrics'),
+    path('autocomplete/<str:kind>/', views.autocomplete_api, name='autocomplete_api'),
     path('register/', views.admin_register, name='admin_register'),
     path('logout/', views.admin_logout, name='admin_logout'),
     path('add_book/', views.add_book, name='add_book'),
@@ -32,5 +35,8 @@ urlpatterns = [
     path('import_books_csv/', views.import_books_csv, name='import_books_csv'),
     path('export_students_csv/', views.export_students_csv, name='export_students_csv'),
     path('import_students_csv/', views.import_students_csv, name='import_students_csv'),
+    path('export/<str:kind>/', views.export_csv, name='export_csv'),
+    path('reports/<int:job_id>/', views.report_status, name='report_status'),
+    path('reports/<int:job_id>/download/', views.report_download, name='report_download'),
     path('pay-penalty/<int:penalty_id>/', views.student_payment_page, name='student_payment_page'),
 ]
\ No newline at end of file
@@ -0,0 +1,32 @@
+from django.db import transaction
+from django.db.models import F
+
+from .models import SharedCounter
+
+
+def current(name):
+    """
+    The stored version of ``name``, 0 until it is first bumped. Processes
+    compare it with the version their in-memory copy was built from.
+    """
+    return SharedCounter.objects.filter(name=name).values_list('value', flat=True).first() or 0
+
+
+def changed(instance, *fields):
+    """
+    Whether a save touched any of ``fields``. The pre_save receivers in
+    akul.signals record the stored row; new rows always count as changed.
+    """
+    stored = getattr(instance, '_stored_fields', None)
+    return stored is None or any(stored[field] != getattr(instance, field) for field in fields)
+
+
+def _increment(names):
+    if SharedCounter.objects.filter(name__in=names).update(value=F('value') + 1) < len(names):
+        # First bump of a name; existing rows were already incremented above.
+        SharedCounter.objects.bulk_create([SharedCounter(name=name, value=1) for name in names], ignore_conflicts=True)
+
+
+def bump(*names):
+    """Moves the versions of ``names`` once the surrounding transaction commits."""
+    transaction.on_commit(lambda: _increment(names))
@@ -15,10 +15,13 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'akul'
 ]
 
 MIDDLEWARE = [
+    # First, so its timings cover the rest of the stack.
+    'akul.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -30,9 +33,13 @@ MIDDLEWARE = [
 
 ROOT_URLCONF = 'akul_library.urls'
 
+# Requests slower than this are logged by akul.metrics.MetricsMiddleware.
+METRICS_SLOW_REQUEST_MS = 1000
+
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates with render timing for akul.metrics.MetricsMiddleware.
+        'BACKEND': 'akul.metrics.TimedDjangoTemplates',
         'DIRS': [],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -58,6 +65,23 @@ DATABASES = {
     }
 }
 
+# Local-memory caches; point these at Redis or Memcached when running several workers.
+CACHES = {
+    # Library settings are cached here; with several worker processes use a shared
+    # backend (Redis or Memcached) so a settings change reaches every process.
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'akul-default',
+    },
+    'recommendations': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'akul-recommendations',
+        'TIMEOUT': 600,
+        # LocMemCache evicts least recently used entries beyond this bound.
+        'OPTIONS': {'MAX_ENTRIES': 5000},
+    },
+}
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',